@@ -1,20 +1,176 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 import cv2
 import numpy as np
 import base64
+import gzip
+import json
 import threading
 import time
 import os
-from detect_and_mark import FaceDetectionSystem
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from startup import WarmUp
+from inference_queue import InferenceQueue
+from result_cache import DetectionCache, content_hash, perceptual_hash
+from evidence import EvidenceStore
+from frame_bus import FrameBus, EncodedFrameCache
+from capture import ResilientCapture
+from tracing import tracer
+from scheduler import DetectionScheduler
+from duty_cycle import DutyCycle, SharedTriggerLog, TriggerSource, load_stops
+from shared_state import SharedState, AttendanceStore
+from enrollment import EnrollmentJobs, FINISHED_STATES
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Initialize face detection system
-system = FaceDetectionSystem(
-    encodings_file="face_encodings.pkl",
-    attendance_file="attendance.json"
+# Face detection system and its inference queue, created by the background warm-up task
+system = None
+inference_queue = None
+scheduler = None
+enrollment_jobs = None
+warm_up = WarmUp()
+
+# Micro-batching of detection requests
+BATCH_WINDOW = float(os.environ.get("BATCH_WINDOW", 0.015))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 8))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 1))
+DETECT_TIMEOUT = float(os.environ.get("DETECT_TIMEOUT", 30))
+
+# Camera frames go through the inference queue one by one ('per_thread') or are batched
+# across all cameras once per scheduler tick ('scheduled')
+DETECTION_MODE = os.environ.get("DETECTION_MODE", "per_thread")
+SCHEDULER_TICK = float(os.environ.get("SCHEDULER_TICK", 0.1))
+
+# Evidence snapshots (face crop + frame thumbnail) of every attendance mark
+EVIDENCE_DIR = os.environ.get("EVIDENCE_DIR", "evidence")
+EVIDENCE_QUOTA_MB = int(os.environ.get("EVIDENCE_QUOTA_MB", 500))
+evidence_store = None
+
+# Camera reconnects: seconds without frames before a stream counts as stalled, longest retry delay
+CAPTURE_STALL_TIMEOUT = float(os.environ.get("CAPTURE_STALL_TIMEOUT", 5))
+CAPTURE_BACKOFF_MAX = float(os.environ.get("CAPTURE_BACKOFF_MAX", 30))
+
+# Camera frames are captured once into shared-memory rings and read as views
+FRAME_SLOTS = int(os.environ.get("FRAME_SLOTS", 4))
+frame_bus = FrameBus(prefix=f"frames_{os.getpid()}", slots=FRAME_SLOTS)
+
+# Annotation and JPEG encoding happen once per processed frame, shared by all viewers
+encoded_frames = EncodedFrameCache(jpeg_quality=int(os.environ.get("STREAM_JPEG_QUALITY", 80)))
+
+# Duty cycling: full-rate recognition only around stops, signalled by door/GPS triggers from
+# TRIGGER_SOURCES (comma-separated file:<path>, udp://<host>:<port> or HTTP URLs) or POST /api/trigger.
+# The duty cycle is only used by the worker owning the cameras (see trigger_log below)
+TRIGGER_SOURCES = [spec for spec in os.environ.get("TRIGGER_SOURCES", "").split(",") if spec]
+duty_cycle = None
+if os.environ.get("DUTY_CYCLE") == "1" or TRIGGER_SOURCES:
+    duty_cycle = DutyCycle(
+        linger=float(os.environ.get("DUTY_LINGER", 30)),
+        idle_interval=float(os.environ.get("DUTY_IDLE_INTERVAL", 2)),
+        stops=load_stops(os.environ["DUTY_STOPS"]) if os.environ.get("DUTY_STOPS") else None
+    )
+# Trigger sources run in the camera owner only (started when it acquires the lease)
+trigger_sources = []
+
+# Detection settings tuned for this host by autotune.py (defaults if the file doesn't exist)
+HOST_CONFIG = os.environ.get("HOST_CONFIG", "host_config.json")
+
+# Opt-in pipeline tracing, switched on and off through /api/trace (any worker); the worker
+# owning the cameras traces its pipeline and writes the files
+TRACE_DIR = os.environ.get("TRACE_DIR", "traces")
+# ID of the last trace request applied by this worker, and the files written when it stopped
+applied_trace_request = None
+trace_files = None
+
+# State shared by all worker processes (e.g. gunicorn -w 4): attendance, the requested cameras,
+# and the latest results and frames of the one worker holding the camera lease
+shared_state = SharedState(
+    os.environ.get("SHARED_STATE_DB", "api_state.db"),
+    lease_ttl=float(os.environ.get("CAMERA_LEASE_TTL", 10))
 )
+CAMERA_LEASE = "cameras"
+# Triggers received by any worker, applied to its duty cycle by the camera owner
+trigger_log = SharedTriggerLog(shared_state, duty_cycle) if duty_cycle else None
+# Results published by the camera owner are ignored when older than this (seconds)
+SHARED_RESULT_MAX_AGE = float(os.environ.get("SHARED_RESULT_MAX_AGE", 30))
+# Local time until which this worker's camera lease is valid; camera threads stop after it
+lease_valid_until = 0.0
+ownership_lock = threading.Lock()
+# Latest shared stream JPEG per camera (version, bytes) and when this worker last asked for frames
+shared_jpegs = {}
+stream_requests = {}
+
+# Bulk enrollment: uploads and results per job, pool processes per job, largest accepted upload
+ENROLL_DIR = os.environ.get("ENROLL_DIR", "enrollment")
+ENROLL_WORKERS = int(os.environ.get("ENROLL_WORKERS", 2))
+ENROLL_MAX_UPLOAD_MB = int(os.environ.get("ENROLL_MAX_UPLOAD_MB", 500))
+app.config["MAX_CONTENT_LENGTH"] = ENROLL_MAX_UPLOAD_MB * 1024 * 1024
+
+# Cache of /api/detect results for repeated frames (perceptual near-match is opt-in)
+phash_distance = os.environ.get("DETECT_CACHE_PHASH_DISTANCE")
+detection_cache = DetectionCache(
+    max_entries=int(os.environ.get("DETECT_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("DETECT_CACHE_TTL", 5)),
+    max_phash_distance=int(phash_distance) if phash_distance else None
+)
+
+def load_system(warm_up):
+    """Import the recognition stack, load the gallery and warm up the models"""
+    global system, inference_queue, scheduler, evidence_store, enrollment_jobs
+    
+    with warm_up.phase("import"):
+        import face_recognition
+        from detect_and_mark import FaceDetectionSystem
+        from utils import load_host_config
+    
+    with warm_up.phase("load_gallery"):
+        evidence_store = EvidenceStore(EVIDENCE_DIR, quota_bytes=EVIDENCE_QUOTA_MB * 1024 * 1024)
+        loaded = FaceDetectionSystem(
+            encodings_file="face_encodings.pkl",
+            attendance_file="attendance.json",
+            evidence_store=evidence_store,
+            frame_bus=frame_bus,
+            check_quality=os.environ.get("QUALITY_GATE", "1") == "1",
+            gallery_mode=os.environ.get("GALLERY_QUANTIZATION") or None,
+            attendance_store=AttendanceStore(shared_state),
+            **load_host_config(HOST_CONFIG)
+        )
+    
+    with warm_up.phase("warm_up_models"):
+        # Run detection and encoding once so the first request isn't slow
+        blank = np.zeros((160, 160, 3), dtype=np.uint8)
+        face_recognition.face_locations(blank, model=loaded.detection_method)
+        face_recognition.face_encodings(blank, [(20, 140, 140, 20)])
+    
+    system = loaded
+    inference_queue = InferenceQueue(
+        system,
+        batch_window=BATCH_WINDOW,
+        max_batch_size=MAX_BATCH_SIZE,
+        workers=INFERENCE_WORKERS
+    )
+    if DETECTION_MODE == "scheduled":
+        scheduler = DetectionScheduler(system, tick=SCHEDULER_TICK)
+        scheduler.start()
+    enrollment_jobs = EnrollmentJobs(
+        system,
+        shared_state,
+        jobs_dir=ENROLL_DIR,
+        workers=ENROLL_WORKERS,
+        max_upload_bytes=ENROLL_MAX_UPLOAD_MB * 1024 * 1024
+    )
+
+# Results of recently ingested uploads from edge nodes are kept in the shared state under
+# ingest/<batch_id> (re-sent batches are acknowledged as-is, whichever worker receives them)
+INGEST_RESULT_MAX_AGE = 24 * 3600
+ingest_lock = threading.Lock()
+
+def not_ready():
+    """Payload and status for endpoints that need the detection system before warm-up finished"""
+    return {
+        "error": "System is starting up",
+        "startup": warm_up.report()
+    }, 503
 
 # Global variables for camera streams
 cameras = {
@@ -37,121 +193,689 @@ def decode_image(encoded_data):
         print(f"Error decoding image: {e}")
         return None
 
-def camera_thread(camera_id, camera_type):
-    """Thread function for continuous camera processing"""
-    global cameras
+def owns_cameras():
+    """True while this worker holds the camera lease"""
+    return time.time() < lease_valid_until
+
+def camera_thread(camera_id, camera_type, camera):
+    """
+    Thread function for continuous camera processing.
+    
+    Runs while this worker owns the cameras and until the camera is stopped
+    or requested with another ID (camera["stop"]).
+    """
+    # Stop as soon as the lease can't be renewed, so two workers never run the same camera
+    def should_stop():
+        return camera["stop"].is_set() or not owns_cameras()
     
-    # Open camera
-    cap = cv2.VideoCapture(camera_id)
+    # Open camera; if it is unreachable, reads keep reconnecting with backoff until should_stop()
+    cap = ResilientCapture(
+        camera_id,
+        name=camera_type,
+        stall_timeout=CAPTURE_STALL_TIMEOUT,
+        backoff_max=CAPTURE_BACKOFF_MAX,
+        should_stop=should_stop
+    )
     if not cap.isOpened():
-        print(f"[ERROR] Could not open camera {camera_id}")
-        return
+        print(f"[WARNING] Could not open camera {camera_id}, will keep retrying")
     
-    cameras[camera_type] = {"cap": cap, "last_frame": None, "last_result": None}
+    camera["cap"] = cap
     
-    while True:
-        # Read frame
-        ret, frame = cap.read()
-        if not ret:
-            print(f"[ERROR] Failed to read frame from {camera_type} camera")
-            break
-        
-        # Process frame
-        processed_frame, _ = system.process_frame(frame, camera_type)
-        
-        # Update last frame and result
-        cameras[camera_type]["last_frame"] = processed_frame
-        cameras[camera_type]["last_result"] = system.get_api_detection_result(frame, camera_type)
+    # Frames are batched with the other cameras' per tick, or queued one by one
+    if scheduler:
+        scheduler.add_camera(camera_type)
+    detector = scheduler or inference_queue
+    frame_count = 0
+    
+    try:
+        while not should_stop():
+            # Read frame straight into the camera's frame ring (reads are paced by the camera)
+            ret, seq = frame_bus.capture(camera_type, cap)
+            if not ret:
+                time.sleep(0.1)
+                continue
+            
+            # Between stops only the occasional idle frame is captured, and each one is processed
+            if trigger_log:
+                trigger_log.poll()
+            idle = duty_cycle is not None and not duty_cycle.is_active()
+            if idle:
+                frame_count = 0
+            
+            # Only process every n-th frame (frame_stride, tuned for this host by autotune.py)
+            frame_count += 1
+            if (frame_count - 1) % system.frame_stride != 0:
+                continue
+            
+            # Process a view of the frame; this thread is the ring's only writer, so
+            # the slot is normally intact when the result is back
+            with frame_bus.hold(camera_type, seq) as held:
+                if held.frame is None:
+                    continue
+                with tracer.span("camera_detect", camera=camera_type, seq=seq):
+                    result = detector.detect(held.frame, camera_type)
+                if not held.is_valid():
+                    print(f"[WARNING] Frame {seq} of {camera_type} was overwritten during detection, dropping result")
+                    continue
+            
+            # Update last frame and result, and publish them for the other workers
+            camera.update(last_seq=seq, last_result=result)
+            publish_detection(camera_type, result)
+            
+            if idle:
+                # Idle between stops; a trigger (received by any worker) wakes the camera up
+                trigger_log.wait_idle()
+    finally:
+        print(f"[INFO] Stopped {camera_type} camera")
+        if scheduler:
+            scheduler.remove_camera(camera_type)
+        cap.release()
+        # Unless a newer thread already took over this camera
+        if cameras.get(camera_type) is camera:
+            cameras[camera_type] = None
+
+def publish_detection(camera_type, result):
+    """Share a camera's latest result, and its annotated frame while a viewer on another worker wants it"""
+    shared_state.set(f"detection/{camera_type}", result)
+    if shared_state.get(f"stream_wanted/{camera_type}", max_age=5) is not None:
+        jpeg = annotated_jpeg(camera_type)
+        if jpeg is not None:
+            shared_state.set_blob(f"stream/{camera_type}", jpeg)
+
+def camera_status():
+    """Running cameras and their capture statistics (of this worker)"""
+    return {
+        "cameras": {
+            camera_type: camera is not None
+            for camera_type, camera in cameras.items()
+        },
+        "capture": {
+            camera_type: camera["cap"].get_stats()
+            for camera_type, camera in cameras.items() if camera is not None and camera["cap"] is not None
+        },
+        "duty_cycle": duty_cycle.get_stats() if duty_cycle else None
+    }
+
+def reconcile_cameras():
+    """
+    Match this (owning) worker's camera threads to the requested cameras.
+    
+    Threads of cameras that were stopped or requested with another ID are
+    asked to stop (this also ends a pending reconnect of an unreachable
+    camera); a camera gets its new thread once the old one has exited.
+    """
+    desired = shared_state.get("cameras/desired") or {}
+    for camera_type, camera in list(cameras.items()):
+        if camera is not None and desired.get(camera_type) != camera["camera_id"]:
+            camera["stop"].set()
+    
+    for camera_type, camera_id in desired.items():
+        if cameras.get(camera_type) is None:
+            camera = {"camera_id": camera_id, "cap": None, "last_seq": -1, "last_result": None,
+                      "stop": threading.Event()}
+            cameras[camera_type] = camera
+            threading.Thread(target=camera_thread, args=(camera_id, camera_type, camera), daemon=True).start()
+
+def refresh_ownership():
+    """
+    Acquire or renew the camera lease, and run the requested cameras if this worker holds it.
+    
+    Exactly one worker process owns the cameras. When it dies, its lease
+    expires after CAMERA_LEASE_TTL seconds and another worker takes over.
+    """
+    global lease_valid_until
+    
+    with ownership_lock:
+        if not warm_up.is_ready:
+            return
         
-        # Sleep to reduce CPU usage
-        time.sleep(0.1)
+        attempt = time.time()
+        had_lease = owns_cameras()
+        if shared_state.try_acquire(CAMERA_LEASE):
+            lease_valid_until = attempt + shared_state.lease_ttl
+            if not had_lease:
+                print(f"[INFO] Worker {shared_state.worker_id} now owns the cameras")
+                start_trigger_sources()
+            reconcile_cameras()
+            apply_trace_request()
+            shared_state.set("status/cameras", dict(camera_status(), owner=shared_state.worker_id))
+            shared_state.set("status/trace", trace_state())
+        elif had_lease:
+            # Camera threads stop on their own once lease_valid_until has passed
+            print(f"[WARNING] Worker {shared_state.worker_id} lost the camera lease")
+            stop_trigger_sources()
+            if tracer.enabled:
+                # Keep what was recorded; the new owner starts its own trace
+                write_trace()
 
-@app.route('/api/status', methods=['GET'])
-def status():
-    """Check if the API is running"""
-    return jsonify({
+def start_trigger_sources():
+    """Listen on TRIGGER_SOURCES (camera owner only, so a UDP port is bound by one worker)"""
+    for spec in TRIGGER_SOURCES:
+        source = TriggerSource(spec, trigger_log)
+        source.start()
+        trigger_sources.append(source)
+
+def stop_trigger_sources():
+    """Stop listening on TRIGGER_SOURCES after losing the camera lease"""
+    while trigger_sources:
+        trigger_sources.pop().stop()
+
+def ownership_loop():
+    """Renew the camera lease well before it expires, and pick up galleries merged by other workers"""
+    while True:
+        try:
+            refresh_ownership()
+            if enrollment_jobs:
+                enrollment_jobs.sync_gallery()
+        except Exception as e:
+            print(f"[ERROR] Shared state: {e}")
+        time.sleep(shared_state.lease_ttl / 3)
+
+def encoded_frame(camera_type):
+    """(annotated frame, JPEG bytes) of a camera's last processed frame, rendered once per frame"""
+    from detect_and_mark import annotate_frame
+    
+    camera = cameras.get(camera_type)
+    if camera is None:
+        return None, None
+    seq, result = camera["last_seq"], camera["last_result"]
+    
+    def render():
+        with frame_bus.hold(camera_type, seq) as held:
+            frame = held.copy()
+        if frame is None:
+            # The slot was reused since; fall back to the newest frame
+            with frame_bus.hold(camera_type) as held:
+                frame = held.copy()
+        if frame is None:
+            return None
+        return annotate_frame(frame, result, camera_type)
+    
+    return encoded_frames.get(camera_type, seq, render)
+
+def annotated_jpeg(camera_type):
+    """JPEG bytes of a camera's annotated last processed frame, or None"""
+    if owns_cameras() or cameras.get(camera_type) is not None:
+        return encoded_frame(camera_type)[1]
+    return shared_jpeg(camera_type)
+
+def shared_jpeg(camera_type):
+    """Latest JPEG the camera owner published for viewers on this worker (same bytes object until it changes)"""
+    # Ask the owner to publish frames; it stops a few seconds after the last viewer leaves
+    now = time.time()
+    if now - stream_requests.get(camera_type, 0.0) > 1.0:
+        stream_requests[camera_type] = now
+        shared_state.set(f"stream_wanted/{camera_type}", shared_state.worker_id)
+    
+    version, jpeg = shared_jpegs.get(camera_type, (0, None))
+    newer_version, newer_jpeg = shared_state.get_blob(f"stream/{camera_type}", newer_than=version)
+    if newer_jpeg is not None:
+        shared_jpegs[camera_type] = (newer_version, newer_jpeg)
+        return newer_jpeg
+    return jpeg
+
+def status_payload():
+    """Build the /api/status response"""
+    # Camera state comes from the worker owning the cameras
+    if owns_cameras():
+        shared_cameras = camera_status()
+    else:
+        shared_cameras = shared_state.get("status/cameras", max_age=SHARED_RESULT_MAX_AGE) or {}
+    return {
         "status": "online",
+        "worker": shared_state.worker_id,
+        "camera_owner": shared_state.owner(CAMERA_LEASE),
+        "ready": warm_up.is_ready,
+        "startup": warm_up.report(),
+        "inference": inference_queue.get_stats() if inference_queue else None,
+        "scheduler": scheduler.get_stats() if scheduler else None,
+        "detect_cache": detection_cache.get_stats(),
+        "quality": system.get_quality_stats() if system else None,
+        "evidence": evidence_store.get_stats() if evidence_store else None,
+        "stream_frames": encoded_frames.get_stats(),
+        "trace": trace_state(),
+        "duty_cycle": shared_cameras.get("duty_cycle"),
+        "enrollment": enrollment_jobs.get_stats() if enrollment_jobs else None,
         "cameras": {
-            "entry": cameras["entry"] is not None,
-            "exit": cameras["exit"] is not None
-        }
-    })
+            camera_type: shared_cameras.get("cameras", {}).get(camera_type, False)
+            for camera_type in cameras
+        },
+        "capture": shared_cameras.get("capture", {})
+    }
 
-@app.route('/api/detect', methods=['POST'])
-def detect():
-    """Detect faces in an image"""
+def cached_response(result, camera_type, exact=True):
+    """
+    Build the response for a cached result.
+    
+    Only exact hits (the same image resent) mark attendance again. A near hit
+    only means the whole frame looks alike, which also holds when a different
+    child stands in a static doorway, so its result is returned without marking.
+    """
+    if exact:
+        system.handle_detection(result, camera_type)
+        return dict(result, cached=True), 200
+    return dict(result, cached=True, similar=True, marked=False), 200
+
+def parse_detect_request(data):
+    """
+    Validate a /api/detect request body, check the result cache and decode the image.
+    
+    Returns:
+        tuple: (request dict, None) when detection must run, or
+               (None, (response payload, HTTP status code)) for errors and cache hits
+    """
+    if not warm_up.is_ready:
+        return None, not_ready()
+    
     # Check if JSON data is present
-    if not request.json or 'image' not in request.json:
-        return jsonify({"error": "No image data provided"}), 400
+    if not data or 'image' not in data:
+        return None, ({"error": "No image data provided"}, 400)
     
     # Get parameters
-    camera_type = request.json.get('camera_type', 'entry')
+    camera_type = data.get('camera_type', 'entry')
     if camera_type not in ['entry', 'exit']:
-        return jsonify({"error": "Invalid camera type. Must be 'entry' or 'exit'"}), 400
+        return None, ({"error": "Invalid camera type. Must be 'entry' or 'exit'"}, 400)
+    
+    # Identical frames (retried uploads) are served without decoding
+    cache_key = content_hash(data['image'])
+    cached = detection_cache.get(cache_key, camera_type)
+    if cached is not None:
+        return None, cached_response(cached, camera_type)
     
     # Decode image
-    img = decode_image(request.json['image'])
+    img = decode_image(data['image'])
     if img is None:
-        return jsonify({"error": "Invalid image data"}), 400
+        return None, ({"error": "Invalid image data"}, 400)
+    
+    # Near-identical frames (static scene, re-encoded JPEG)
+    phash = None
+    if detection_cache.uses_perceptual_hash:
+        phash = perceptual_hash(img)
+        cached = detection_cache.get_similar(phash, camera_type)
+        if cached is not None:
+            return None, cached_response(cached, camera_type, exact=False)
     
-    # Process image
-    result = system.get_api_detection_result(img, camera_type)
+    return {
+        "image": img,
+        "camera_type": camera_type,
+        "cache_key": cache_key,
+        "phash": phash
+    }, None
+
+def store_detection(detect_request, result):
+    """Cache a fresh detection result for later identical or similar frames"""
+    detection_cache.put(
+        detect_request["cache_key"],
+        detect_request["camera_type"],
+        result,
+        detect_request["phash"]
+    )
+
+def detect_payload(data):
+    """
+    Validate a /api/detect request body and run detection through the inference queue.
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    detect_request, response = parse_detect_request(data)
+    if response:
+        return response
+    
+    # Process image (batched with other pending requests)
+    try:
+        result = inference_queue.detect(
+            detect_request["image"], detect_request["camera_type"], timeout=DETECT_TIMEOUT
+        )
+    except FutureTimeoutError:
+        return {"error": "Detection timed out"}, 504
     
-    return jsonify(result)
+    store_detection(detect_request, result)
+    return result, 200
+
+def attendance_payload(date_filter=None, person_filter=None):
+    """
+    Get attendance records from the shared store, one per date and person.
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    if not warm_up.is_ready:
+        return not_ready()
+    
+    records = [
+        {
+            "date": record["date"],
+            "person_id": record["person_id"],
+            "entry": {"timestamp": f"{record['date']} {record['entry_time']}"} if record["entry_time"] else None,
+            "exit": {"timestamp": f"{record['date']} {record['exit_time']}"} if record["exit_time"] else None
+        }
+        for record in system.attendance_store.records(date_filter, person_filter)
+    ]
+    
+    return {
+        "count": len(records),
+        "records": records
+    }, 200
+
+def bulk_ingest_payload(body, content_encoding=None):
+    """Merge a (possibly gzip-compressed) batch of marks uploaded by an edge node"""
+    if not warm_up.is_ready:
+        return not_ready()
+    
+    try:
+        if content_encoding == "gzip":
+            body = gzip.decompress(body)
+        batch = json.loads(body)
+        marks = [
+            {"person_id": str(m["person_id"]), "date": str(m["date"]),
+             "direction": m["direction"], "time": str(m["time"])}
+            for m in batch["marks"]
+        ]
+    except (OSError, ValueError, KeyError, TypeError):
+        return {"error": "Invalid batch"}, 400
+    if any(m["direction"] not in ("entry", "exit") for m in marks):
+        return {"error": "direction must be 'entry' or 'exit'"}, 400
+    
+    batch_id = batch.get("batch_id")
+    with ingest_lock:
+        # Merging is idempotent, so a batch re-sent to two workers at once is still counted once
+        previous = shared_state.get(f"ingest/{batch_id}", max_age=INGEST_RESULT_MAX_AGE) if batch_id else None
+        if previous is not None:
+            return dict(previous, duplicate=True), 200
+        
+        result = {
+            "batch_id": batch_id,
+            "node_id": batch.get("node_id"),
+            "received": len(marks),
+            "changed": system.merge_attendance(marks),
+            "duplicate": False
+        }
+        if batch_id:
+            shared_state.set(f"ingest/{batch_id}", result)
+            shared_state.prune("ingest/", INGEST_RESULT_MAX_AGE)
+    
+    return result, 200
+
+def write_trace():
+    """Stop tracing and write the files to TRACE_DIR"""
+    global trace_files
+    
+    tracer.stop()
+    trace_files = tracer.export(TRACE_DIR)
+    print(f"[INFO] Trace written to {', '.join(trace_files.values())}")
+    return trace_files
+
+def apply_trace_request():
+    """Start or stop tracing as last requested through /api/trace (camera owner only)"""
+    global applied_trace_request
+    
+    requested = shared_state.get("trace/requested")
+    if requested is None or requested["id"] == applied_trace_request:
+        return
+    applied_trace_request = requested["id"]
+    
+    if requested["enabled"]:
+        tracer.start(sample_interval=requested.get("sample_interval"))
+    elif tracer.enabled:
+        write_trace()
+
+def trace_state():
+    """Tracing state of the worker owning the cameras, and the files of its last trace"""
+    if owns_cameras():
+        return dict(tracer.get_stats(), files=trace_files, worker=shared_state.worker_id)
+    return shared_state.get("status/trace", max_age=SHARED_RESULT_MAX_AGE) or dict(
+        tracer.get_stats(), files=None, worker=None)
+
+def trace_payload(data):
+    """
+    Start or stop pipeline tracing in the worker owning the cameras.
+    
+    Starting discards the previous recording; stopping writes the Chrome trace
+    (and collapsed stacks if sampling was on) to TRACE_DIR. The request is
+    shared with all workers: the camera owner applies it at once if it served
+    the request, otherwise with its next lease renewal (the response is then
+    202 and GET /api/trace shows when it took effect).
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("enabled"), bool):
+        return {"error": "'enabled' (true/false) is required"}, 400
+    
+    request = {"id": uuid.uuid4().hex, "enabled": data["enabled"]}
+    if data["enabled"]:
+        try:
+            sample_interval_ms = float(data.get("sample_interval_ms") or 0)
+        except (TypeError, ValueError):
+            return {"error": "sample_interval_ms must be a number"}, 400
+        if sample_interval_ms < 0:
+            return {"error": "sample_interval_ms must not be negative"}, 400
+        request["sample_interval"] = sample_interval_ms / 1000.0 or None
+    else:
+        requested = shared_state.get("trace/requested")
+        if not requested or not requested["enabled"]:
+            return {"error": "Tracing is not running"}, 409
+    
+    shared_state.set("trace/requested", request)
+    if not owns_cameras():
+        return dict(trace_state(), pending=request), 202
+    
+    apply_trace_request()
+    return trace_state(), 200
+
+def trigger_payload(data):
+    """
+    Apply a door/GPS trigger message to the duty cycle of the camera owner.
+    
+    The message is logged in the shared state; if this worker owns the
+    cameras it is applied at once, otherwise the owner picks it up within
+    a fraction of a second and the response is 202.
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    if duty_cycle is None:
+        return {"error": "Duty cycling is disabled (set DUTY_CYCLE=1 or TRIGGER_SOURCES)"}, 409
+    if not isinstance(data, (dict, str)):
+        return {"error": "Expected {\"event\": ...}, {\"at_stop\": ...} or {\"lat\": ..., \"lon\": ...}"}, 400
+    
+    try:
+        trigger_log.handle(data)
+    except (ValueError, TypeError, KeyError) as e:
+        return {"error": str(e)}, 400
+    
+    if not owns_cameras():
+        return {"queued": True, "camera_owner": shared_state.owner(CAMERA_LEASE)}, 202
+    events = trigger_log.poll(force=True)
+    return dict(duty_cycle.get_stats(), events=events), 200
+
+def enroll_payload(files):
+    """
+    Start a bulk enrollment job for uploaded photos or a zip file.
+    
+    Args:
+        files (list): (file name, binary stream) pairs
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    if not warm_up.is_ready:
+        return not_ready()
+    if not files:
+        return {"error": "Upload a zip file as 'file' or photos as 'files'"}, 400
+    
+    try:
+        job = enrollment_jobs.create(files)
+    except (ValueError, OSError) as e:
+        return {"error": str(e)}, 400
+    
+    return job, 202
+
+def enroll_status_payload(job_id=None):
+    """
+    Get the progress and partial results of one enrollment job, or of all jobs.
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    if not warm_up.is_ready:
+        return not_ready()
+    if job_id is None:
+        return {"jobs": enrollment_jobs.list()}, 200
+    
+    job = enrollment_jobs.get(job_id)
+    if job is None:
+        return {"error": "Enrollment job not found"}, 404
+    return job, 200
+
+def enroll_cancel_payload(job_id):
+    """
+    Cancel a running enrollment job (whichever worker runs it).
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    if not warm_up.is_ready:
+        return not_ready()
+    
+    job = enrollment_jobs.cancel(job_id)
+    if job is None:
+        return {"error": "Enrollment job not found"}, 404
+    if job["state"] in FINISHED_STATES:
+        return {"error": f"Enrollment job already {job['state']}"}, 409
+    return dict(job, cancel_requested=True), 202
+
+def latest_detection_payload(camera_type):
+    """
+    Get the latest detection result of a running camera.
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    if camera_type not in ['entry', 'exit']:
+        return {"error": "Invalid camera type"}, 400
+    
+    # Served locally by the camera owner, from the shared state by the other workers
+    camera = cameras[camera_type]
+    if camera is not None and camera["last_result"] is not None:
+        return camera["last_result"], 200
+    
+    result = shared_state.get(f"detection/{camera_type}", max_age=SHARED_RESULT_MAX_AGE)
+    if result is None:
+        return {"error": f"{camera_type.capitalize()} camera not active"}, 404
+    
+    return result, 200
+
+@app.route('/api/status', methods=['GET'])
+def status():
+    """Check if the API is running"""
+    return jsonify(status_payload())
+
+@app.route('/api/detect', methods=['POST'])
+def detect():
+    """Detect faces in an image"""
+    payload, code = detect_payload(request.json)
+    return jsonify(payload), code
 
 @app.route('/api/attendance', methods=['GET'])
 def get_attendance():
     """Get attendance records"""
-    date_filter = request.args.get('date')
-    person_filter = request.args.get('person_id')
-    
-    # Load attendance data
-    system.load_attendance()
-    records = system.attendance.get("records", [])
-    
-    # Apply filters
-    if date_filter:
-        records = [r for r in records if r["date"] == date_filter]
-    if person_filter:
-        records = [r for r in records if r["person_id"] == person_filter]
-    
-    # Group records by date and person
-    grouped = {}
-    for record in records:
-        date = record["date"]
-        person_id = record["person_id"]
-        key = f"{date}_{person_id}"
-        
-        if key not in grouped:
-            grouped[key] = {
-                "date": date,
-                "person_id": person_id,
-                "entry": None,
-                "exit": None
-            }
-        
-        if record["type"] == "entry":
-            grouped[key]["entry"] = {
-                "timestamp": record["timestamp"],
-                "confidence": record["confidence"]
-            }
-        elif record["type"] == "exit":
-            grouped[key]["exit"] = {
-                "timestamp": record["timestamp"],
-                "confidence": record["confidence"]
-            }
+    payload, code = attendance_payload(request.args.get('date'), request.args.get('person_id'))
+    return jsonify(payload), code
+
+@app.route('/api/attendance/bulk', methods=['POST'])
+def bulk_ingest():
+    """Ingest a batch of attendance marks uploaded by an edge node"""
+    payload, code = bulk_ingest_payload(request.get_data(), request.headers.get('Content-Encoding'))
+    return jsonify(payload), code
+
+@app.route('/api/trace', methods=['GET'])
+def trace_status():
+    """Get the pipeline tracing state"""
+    return jsonify(trace_state())
+
+@app.route('/api/trace', methods=['POST'])
+def trace():
+    """Start or stop pipeline tracing"""
+    payload, code = trace_payload(request.get_json(silent=True))
+    return jsonify(payload), code
+
+@app.route('/api/trigger', methods=['POST'])
+def trigger():
+    """Apply a door/GPS trigger (switches between full-rate and idle recognition)"""
+    payload, code = trigger_payload(request.get_json(silent=True))
+    return jsonify(payload), code
+
+@app.route('/api/enroll', methods=['POST'])
+def enroll():
+    """Start a bulk enrollment job (multipart: a zip as 'file', or photos as 'files')"""
+    files = request.files.getlist('file') + request.files.getlist('files')
+    payload, code = enroll_payload([(f.filename or "", f.stream) for f in files])
+    return jsonify(payload), code
+
+@app.route('/api/enroll', methods=['GET'])
+def enroll_jobs():
+    """List enrollment jobs"""
+    payload, code = enroll_status_payload()
+    return jsonify(payload), code
+
+@app.route('/api/enroll/<job_id>', methods=['GET'])
+def enroll_status(job_id):
+    """Get the progress and partial results of an enrollment job"""
+    payload, code = enroll_status_payload(job_id)
+    return jsonify(payload), code
+
+@app.route('/api/enroll/<job_id>/cancel', methods=['POST'])
+def enroll_cancel(job_id):
+    """Cancel an enrollment job"""
+    payload, code = enroll_cancel_payload(job_id)
+    return jsonify(payload), code
+
+@app.route('/api/evidence', methods=['GET'])
+def get_evidence():
+    """Get the evidence snapshots stored for an attendance mark"""
+    if not warm_up.is_ready:
+        payload, code = not_ready()
+        return jsonify(payload), code
+    
+    person_id = request.args.get('person_id')
+    date = request.args.get('date')
+    camera_type = request.args.get('camera_type', 'entry')
+    if not person_id or not date:
+        return jsonify({"error": "person_id and date are required"}), 400
+    
+    key = evidence_store.record_key(person_id, date, camera_type)
+    entry = evidence_store.get(key)
+    if entry is None:
+        return jsonify({"error": "No evidence stored for this record"}), 404
     
     return jsonify({
-        "count": len(grouped),
-        "records": list(grouped.values())
+        "key": key,
+        "timestamp": entry["timestamp"],
+        "face_url": f"/api/evidence/{key}/face" if entry["face"] else None,
+        "frame_url": f"/api/evidence/{key}/frame"
     })
 
+@app.route('/api/evidence/<key>/<kind>', methods=['GET'])
+def get_evidence_image(key, kind):
+    """Get an evidence JPEG ('face' or 'frame')"""
+    if not warm_up.is_ready:
+        payload, code = not_ready()
+        return jsonify(payload), code
+    
+    path = evidence_store.path(key, kind)
+    if path is None or not os.path.exists(path):
+        return jsonify({"error": "Evidence not found"}), 404
+    
+    return send_file(os.path.abspath(path), mimetype="image/jpeg")
+
 @app.route('/api/start_cameras', methods=['POST'])
 def start_cameras():
-    """Start camera threads"""
-    # Check if already running
-    if cameras["entry"] is not None or cameras["exit"] is not None:
-        return jsonify({"error": "Cameras already running"}), 400
+    """Start camera threads (or switch the running cameras to other IDs)"""
+    if not warm_up.is_ready:
+        payload, code = not_ready()
+        return jsonify(payload), code
     
     # Get camera IDs
     try:
@@ -160,29 +884,41 @@ def start_cameras():
     except:
         return jsonify({"error": "Invalid request format"}), 400
     
-    # Start camera threads
-    threading.Thread(target=camera_thread, args=(entry_camera, "entry"), daemon=True).start()
-    threading.Thread(target=camera_thread, args=(exit_camera, "exit"), daemon=True).start()
+    # Check if already running with these cameras (in any worker)
+    desired = {"entry": entry_camera, "exit": exit_camera}
+    if shared_state.get("cameras/desired") == desired:
+        return jsonify({"error": "Cameras already running"}), 400
+    
+    # Request the cameras; the worker holding the camera lease (re)starts their threads
+    shared_state.set("cameras/desired", desired)
+    refresh_ownership()
     
-    return jsonify({"status": "Cameras started"})
+    return jsonify({"status": "Cameras started", "owner": shared_state.owner(CAMERA_LEASE)})
+
+@app.route('/api/stop_cameras', methods=['POST'])
+def stop_cameras():
+    """Stop camera threads"""
+    if not shared_state.get("cameras/desired"):
+        return jsonify({"error": "Cameras not running"}), 400
+    
+    # The owner's threads stop at their next frame; restarts no longer resume them
+    shared_state.set("cameras/desired", None)
+    refresh_ownership()
+    
+    return jsonify({"status": "Cameras stopping", "owner": shared_state.owner(CAMERA_LEASE)})
 
 @app.route('/api/latest_detection', methods=['GET'])
 def latest_detection():
     """Get latest detection results"""
-    camera_type = request.args.get('camera', 'entry')
-    if camera_type not in ['entry', 'exit']:
-        return jsonify({"error": "Invalid camera type"}), 400
-    
-    if cameras[camera_type] is None or cameras[camera_type]["last_result"] is None:
-        return jsonify({"error": f"{camera_type.capitalize()} camera not active"}), 404
-    
-    return jsonify(cameras[camera_type]["last_result"])
+    payload, code = latest_detection_payload(request.args.get('camera', 'entry'))
+    return jsonify(payload), code
+
+# Load models and gallery in the background so /api/status answers immediately
+warm_up.start(load_system)
+
+# Compete for the camera lease with the other workers (only once this one is warmed up)
+threading.Thread(target=ownership_loop, name="camera-lease", daemon=True).start()
 
 if __name__ == '__main__':
-    # Check if encodings file exists
-    if not os.path.exists(system.attendance_file):
-        print("[INFO] Creating new attendance file")
-        system.save_attendance()
-    
-    # Start the Flask app
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # Start the Flask app (use asgi.py for the async serving mode)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG") == "1") 
\ No newline at end of file
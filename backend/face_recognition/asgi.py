@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Async (ASGI) serving mode for the face recognition API.
+#
+# Read endpoints (status, latest detection, attendance, MJPEG streams) are served
+# by async handlers that run their file and shared-state (SQLite) reads in the
+# default executor, so a slow read never stalls the event loop; /api/detect
+# decodes images in a bounded thread pool and awaits the shared inference
+# queue. Other routes fall through to the Flask app.
+#
+# Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+import api
+
+# Threads decoding uploaded images, and how many detections may be pending
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", 2))
+MAX_PENDING_DETECTIONS = int(os.environ.get("MAX_PENDING_DETECTIONS", 16))
+
+# Interval between frames pushed to stream viewers (seconds)
+STREAM_INTERVAL = float(os.environ.get("STREAM_INTERVAL", 0.1))
+
+decode_executor = ThreadPoolExecutor(
+    max_workers=DECODE_WORKERS, thread_name_prefix="decode"
+)
+pending_detections = 0
+
+async def status(request):
+    """Check if the API is running (shared-state reads happen off the event loop)"""
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(None, api.status_payload)
+    return JSONResponse(payload)
+
+async def latest_detection(request):
+    """Get latest detection results (shared-state reads happen off the event loop)"""
+    loop = asyncio.get_running_loop()
+    payload, code = await loop.run_in_executor(
+        None, api.latest_detection_payload, request.query_params.get('camera', 'entry')
+    )
+    return JSONResponse(payload, status_code=code)
+
+async def attendance(request):
+    """Get attendance records (file read happens off the event loop)"""
+    loop = asyncio.get_running_loop()
+    payload, code = await loop.run_in_executor(
+        None,
+        api.attendance_payload,
+        request.query_params.get('date'),
+        request.query_params.get('person_id')
+    )
+    return JSONResponse(payload, status_code=code)
+
+async def detect(request):
+    """Detect faces in an image: decode in the executor, then await the inference queue"""
+    global pending_detections
+
+    if pending_detections >= MAX_PENDING_DETECTIONS:
+        return JSONResponse({"error": "Detection queue is full, retry later"}, status_code=503)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Invalid request format"}, status_code=400)
+
+    pending_detections += 1
+    try:
+        loop = asyncio.get_running_loop()
+        detect_request, response = await loop.run_in_executor(
+            decode_executor, api.parse_detect_request, data
+        )
+        if response:
+            payload, code = response
+            return JSONResponse(payload, status_code=code)
+
+        # Batched with other pending requests by the inference workers
+        future = api.inference_queue.submit(detect_request["image"], detect_request["camera_type"])
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=api.DETECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return JSONResponse({"error": "Detection timed out"}, status_code=504)
+
+        api.store_detection(detect_request, result)
+    finally:
+        pending_detections -= 1
+
+    return JSONResponse(result)
+
+async def stream(request):
+    """MJPEG stream of a camera's latest frame"""
+    camera_type = request.path_params['camera']
+    if camera_type not in api.cameras:
+        return JSONResponse({"error": "Invalid camera type"}, status_code=400)
+
+    async def frames():
+        loop = asyncio.get_running_loop()
+        last_sent = None
+        while True:
+            # Encoded once per processed frame and shared by all viewers
+            jpeg = await loop.run_in_executor(None, api.annotated_jpeg, camera_type)
+            if jpeg is not None and jpeg is not last_sent:
+                last_sent = jpeg
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+                       + jpeg + b"\r\n")
+            await asyncio.sleep(STREAM_INTERVAL)
+
+    return StreamingResponse(frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+app = Starlette(routes=[
+    Route('/api/status', status, methods=['GET']),
+    Route('/api/latest_detection', latest_detection, methods=['GET']),
+    Route('/api/attendance', attendance, methods=['GET']),
+    Route('/api/detect', detect, methods=['POST']),
+    Route('/api/stream/{camera}', stream, methods=['GET']),
+    # Everything else (e.g. /api/start_cameras) is served by the Flask app
+    Mount('/', app=WSGIMiddleware(api.app))
+])
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import socket
+import tempfile
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from capture import read_labeled_sample
+from detect_and_mark import FaceDetectionSystem
+from face_quality import FaceTracker
+from utils import TUNED_SETTINGS
+
+def read_clip(clip_file, max_frames=100):
+    """
+    Read the first frames of a sample clip.
+
+    Args:
+        clip_file (str): Video file recorded by one of the cameras
+        max_frames (int): Maximum number of frames to read
+
+    Returns:
+        list: BGR frames
+    """
+    cap = cv2.VideoCapture(clip_file)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def configure(system, detection_method, max_frame_size, upsample):
+    """Apply detection settings to a system and start with fresh face tracks."""
+    system.detection_method = detection_method
+    system.max_frame_size = max_frame_size
+    system.upsample = upsample
+    if system.quality_gate:
+        system.tracker = FaceTracker()
+
+def measure_latency(system, frames, slo_ms, warm_up_frames=2):
+    """
+    Measure per-frame processing latency on consecutive clip frames.
+
+    Measuring stops early once the mean is far above the SLO, since the
+    setting can't be chosen anyway.
+
+    Args:
+        system (FaceDetectionSystem): Configured system
+        frames (list): Clip frames
+        slo_ms (float): Target per-frame latency in milliseconds
+        warm_up_frames (int): Frames processed before timing starts
+
+    Returns:
+        numpy.ndarray: Latency of each timed frame in milliseconds
+    """
+    for frame in frames[:warm_up_frames]:
+        system.process_frames([frame], ["autotune"])
+
+    latencies = []
+    for frame in frames[warm_up_frames:]:
+        start = time.perf_counter()
+        system.process_frames([frame], ["autotune"])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+        if len(latencies) >= 5 and np.mean(latencies) > 3 * slo_ms:
+            break
+
+    return np.array(latencies)
+
+def measure_recall(system, sample):
+    """
+    Fraction of labeled images recognized as the right person.
+
+    Args:
+        system (FaceDetectionSystem): Configured system
+        sample (list): (BGR image, person ID) pairs
+
+    Returns:
+        float: Recall on the labeled sample
+    """
+    hits = 0
+    for i, (image, person_id) in enumerate(sample):
+        # A camera name per image, so unrelated images never share a face track
+        result = system.process_frames([image], [f"sample_{i}"])[0]
+        if result and result["name"] == person_id and result["confidence"] >= system.confidence_threshold:
+            hits += 1
+    return hits / max(1, len(sample))
+
+def smallest_stride(mean_ms, cameras, camera_fps, workers, max_utilization, max_stride):
+    """
+    Smallest frame stride at which all cameras fit into the inference capacity.
+
+    Args:
+        mean_ms (float): Mean per-frame latency in milliseconds
+        cameras (int): Cameras served by this host
+        camera_fps (float): Frame rate of each camera
+        workers (int): Frames that can be processed in parallel
+        max_utilization (float): Fraction of the capacity that may be used
+        max_stride (int): Largest acceptable stride
+
+    Returns:
+        int: Stride, or None if even max_stride doesn't fit
+    """
+    stride = max(1, math.ceil(cameras * camera_fps * mean_ms / 1000.0 / (workers * max_utilization)))
+    return stride if stride <= max_stride else None
+
+def auto_tune(system, frames, sample, slo_ms=200, cameras=2, camera_fps=15, workers=1, max_utilization=0.8,
+              methods=("hog", "cnn"), frame_sizes=(320, 480, 640, 800), upsamples=(0, 1, 2), max_stride=10):
+    """
+    Search detection settings that meet the latency SLO with the highest recall.
+
+    Every combination of detection method, resize target and upsampling is
+    benchmarked on the clip. It is feasible if its p95 per-frame latency is
+    within the SLO and all cameras can be served at some frame stride up to
+    max_stride; that stride is the smallest one that keeps inference below
+    max_utilization. Feasible settings are ranked by recall on the labeled
+    sample, then by stride (more chances to see each face), then by latency.
+    Larger frames and more upsampling are never faster, so once a setting is
+    far too slow the larger ones of the same method are skipped.
+
+    Args:
+        system (FaceDetectionSystem): System used for benchmarking (its settings are changed)
+        frames (list): Clip frames for latency
+        sample (list): (BGR image, person ID) pairs for recall
+        slo_ms (float): Target p95 per-frame latency in milliseconds
+        cameras (int): Cameras served by this host
+        camera_fps (float): Frame rate of each camera
+        workers (int): Frames that can be processed in parallel
+        max_utilization (float): Fraction of the inference capacity that may be used
+        methods (tuple): Detection methods to try
+        frame_sizes (tuple): Resize targets to try
+        upsamples (tuple): Upsampling settings to try
+        max_stride (int): Largest acceptable frame stride
+
+    Returns:
+        tuple: (best candidate or None, all candidates)
+    """
+    candidates = []
+    for method in methods:
+        too_slow = None
+        for max_frame_size in sorted(frame_sizes):
+            for upsample in sorted(upsamples):
+                candidate = {
+                    "detection_method": method,
+                    "max_frame_size": max_frame_size,
+                    "upsample": upsample
+                }
+                candidates.append(candidate)
+
+                if too_slow and max_frame_size >= too_slow[0] and upsample >= too_slow[1]:
+                    candidate.update(feasible=False, reason="slower than a setting over the SLO")
+                    continue
+
+                configure(system, method, max_frame_size, upsample)
+                latencies = measure_latency(system, frames, slo_ms)
+                candidate.update(
+                    latency_ms_mean=float(np.mean(latencies)),
+                    latency_ms_p95=float(np.percentile(latencies, 95))
+                )
+                stride = smallest_stride(candidate["latency_ms_mean"], cameras, camera_fps,
+                                         workers, max_utilization, max_stride)
+
+                if candidate["latency_ms_p95"] > slo_ms or stride is None:
+                    reason = "p95 latency over the SLO" if candidate["latency_ms_p95"] > slo_ms else \
+                        f"cameras don't fit at stride {max_stride}"
+                    candidate.update(feasible=False, reason=reason)
+                    if candidate["latency_ms_mean"] > 3 * slo_ms:
+                        too_slow = (max_frame_size, upsample)
+                else:
+                    candidate.update(
+                        feasible=True,
+                        frame_stride=stride,
+                        utilization=cameras * camera_fps / stride * candidate["latency_ms_mean"] / 1000.0 / workers,
+                        recall=measure_recall(system, sample)
+                    )
+
+                print(f"[INFO] {method} {max_frame_size}px upsample={upsample}: "
+                      + (f"p95 {candidate['latency_ms_p95']:.1f} ms, " if "latency_ms_p95" in candidate else "")
+                      + (f"stride {candidate['frame_stride']}, recall {candidate['recall']:.3f}"
+                         if candidate["feasible"] else candidate["reason"]))
+
+    feasible = [c for c in candidates if c["feasible"]]
+    best = min(feasible, key=lambda c: (-c["recall"], c["frame_stride"], c["latency_ms_mean"]), default=None)
+    return best, candidates
+
+def write_host_config(config_file, best, candidates, targets):
+    """
+    Write the per-host config.
+
+    Args:
+        config_file (str): Output path
+        best (dict): Chosen candidate
+        candidates (list): All benchmarked candidates
+        targets (dict): SLO and load the settings were tuned for
+    """
+    config = {
+        "host": socket.gethostname(),
+        "created": datetime.now().isoformat(),
+        "settings": {key: best[key] for key in TUNED_SETTINGS},
+        "targets": targets,
+        "measured": {
+            key: best[key] for key in ("latency_ms_mean", "latency_ms_p95", "utilization", "recall")
+        },
+        "candidates": candidates
+    }
+    with open(config_file, "w") as f:
+        json.dump(config, f, indent=4)
+
+def main():
+    """Main function to tune detection settings for this host."""
+    parser = argparse.ArgumentParser(description="Tune detection settings for this host")
+    parser.add_argument("-e", "--encodings", required=True,
+                        help="Path to the face encodings file")
+    parser.add_argument("--clip", required=True,
+                        help="Sample video recorded by one of the cameras (used for latency)")
+    parser.add_argument("--labels", required=True,
+                        help="Labeled sample: one directory per person ID with images (used for recall)")
+    parser.add_argument("-o", "--output", default="host_config.json",
+                        help="Where to write the host config")
+    parser.add_argument("--slo_ms", type=float, default=200,
+                        help="Target p95 per-frame latency in milliseconds")
+    parser.add_argument("--cameras", type=int, default=2,
+                        help="Cameras served by this host")
+    parser.add_argument("--camera_fps", type=float, default=15,
+                        help="Frame rate of each camera")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Frames processed in parallel (inference workers)")
+    parser.add_argument("--max_utilization", type=float, default=0.8,
+                        help="Fraction of the inference capacity that may be used")
+    parser.add_argument("--max_stride", type=int, default=10,
+                        help="Largest acceptable frame stride")
+    parser.add_argument("--methods", type=str, default="hog,cnn",
+                        help="Comma-separated detection methods to try")
+    parser.add_argument("--frame_sizes", type=str, default="320,480,640,800",
+                        help="Comma-separated resize targets to try")
+    parser.add_argument("--upsamples", type=str, default="0,1,2",
+                        help="Comma-separated upsampling settings to try")
+    parser.add_argument("--frames", type=int, default=100,
+                        help="Clip frames to benchmark")
+    args = parser.parse_args()
+
+    for path in (args.encodings, args.clip, args.labels):
+        if not os.path.exists(path):
+            print(f"[ERROR] Not found: {path}")
+            return
+
+    frames = read_clip(args.clip, args.frames)
+    sample = read_labeled_sample(args.labels)
+    if len(frames) < 10 or not sample:
+        print(f"[ERROR] Need at least 10 clip frames and one labeled image "
+              f"(got {len(frames)} frames, {len(sample)} images)")
+        return
+    print(f"[INFO] Benchmarking on {len(frames)} clip frames and {len(sample)} labeled images")
+
+    # Attendance is never marked while tuning; the file only satisfies the constructor
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        system = FaceDetectionSystem(
+            encodings_file=args.encodings,
+            attendance_file=os.path.join(tmp_dir, "attendance.json"),
+            mark_attendance=False
+        )
+
+        targets = {
+            "slo_ms": args.slo_ms,
+            "cameras": args.cameras,
+            "camera_fps": args.camera_fps,
+            "workers": args.workers,
+            "max_utilization": args.max_utilization
+        }
+        best, candidates = auto_tune(
+            system, frames, sample,
+            slo_ms=args.slo_ms,
+            cameras=args.cameras,
+            camera_fps=args.camera_fps,
+            workers=args.workers,
+            max_utilization=args.max_utilization,
+            methods=tuple(args.methods.split(",")),
+            frame_sizes=tuple(int(size) for size in args.frame_sizes.split(",")),
+            upsamples=tuple(int(upsample) for upsample in args.upsamples.split(",")),
+            max_stride=args.max_stride
+        )
+
+    if best is None:
+        print(f"[ERROR] No setting meets a p95 of {args.slo_ms:.0f} ms for {args.cameras} cameras; "
+              f"raise --slo_ms or --max_stride, or serve fewer cameras")
+        return
+
+    write_host_config(args.output, best, candidates, targets)
+    print(f"[INFO] Best: {best['detection_method']} {best['max_frame_size']}px upsample={best['upsample']} "
+          f"stride={best['frame_stride']} (p95 {best['latency_ms_p95']:.1f} ms, recall {best['recall']:.3f}, "
+          f"{best['utilization'] * 100:.0f}% utilization)")
+    print(f"[INFO] Host config written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
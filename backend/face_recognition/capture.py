@@ -0,0 +1,283 @@
+import os
+import threading
+import time
+import cv2
+
+# Low-latency FFmpeg options for network streams: no input buffering, RTSP over TCP
+FFMPEG_LOW_LATENCY_OPTIONS = "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay"
+NETWORK_SCHEMES = ("rtsp://", "http://", "https://")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+def parse_source(camera_id):
+    """
+    Turn a camera ID into a cv2.VideoCapture source.
+
+    Args:
+        camera_id (int or str): Camera index, RTSP/HTTP URL or path of a video file
+
+    Returns:
+        int or str: Device index, URL or file path
+    """
+    if isinstance(camera_id, str) and (camera_id.startswith(NETWORK_SCHEMES) or os.path.exists(camera_id)):
+        return camera_id
+    return int(camera_id)
+
+class ResilientCapture:
+    """
+    cv2.VideoCapture wrapper that reconnects by itself.
+
+    read() behaves like cv2.VideoCapture.read(), but a failed or stalled stream
+    is released and reopened with exponential backoff until it comes back or
+    the capture is released. Internal buffering is kept to a minimum and frames
+    that queued up while the caller was busy are skipped, so read() returns the
+    newest frame. Uptime, reconnects and reconnect latency are tracked per camera.
+    """
+
+    def __init__(self, camera_id, name="camera", width=640, height=480, stall_timeout=5.0,
+                 backoff_initial=0.5, backoff_max=30.0, max_failed_reads=3, should_stop=None):
+        """
+        Initialize the capture and try to open the camera once.
+
+        Args:
+            camera_id (int or str): Camera index or RTSP/HTTP URL
+            name (str): Camera name used in logs and stats
+            width (int): Requested frame width
+            height (int): Requested frame height
+            stall_timeout (float): Seconds without a frame before the stream is considered stalled
+            backoff_initial (float): First delay between reconnect attempts in seconds
+            backoff_max (float): Maximum delay between reconnect attempts in seconds
+            max_failed_reads (int): Consecutive failed reads that trigger a reconnect
+            should_stop (callable, optional): Returns True when the caller no longer wants
+                frames (e.g. the camera was stopped); ends a pending reconnect like release()
+        """
+        self.source = parse_source(camera_id)
+        self.name = name
+        self.width = width
+        self.height = height
+        self.stall_timeout = stall_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_failed_reads = max_failed_reads
+        self.should_stop = should_stop
+
+        self.cap = None
+        self.closed = threading.Event()
+        self.failed_reads = 0
+        self.last_frame_time = None
+
+        # Statistics
+        self.created_at = time.monotonic()
+        self.connected_since = None
+        self.uptime = 0.0
+        self.connects = 0
+        self.reconnects = 0
+        self.reconnect_latencies = []
+        self.stalls = 0
+        self.read_failures = 0
+        self.skipped_frames = 0
+        self.last_error = None
+
+        self.open()
+
+    @property
+    def is_network(self):
+        return isinstance(self.source, str) and self.source.startswith(NETWORK_SCHEMES)
+
+    def open(self):
+        """
+        Open the camera with low-latency settings.
+
+        Returns:
+            bool: True if the camera is open
+        """
+        self._release_cap()
+
+        if self.is_network:
+            os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", FFMPEG_LOW_LATENCY_OPTIONS)
+            # Bound blocking opens/reads so a dead link is noticed instead of hanging
+            timeout_ms = int(self.stall_timeout * 1000)
+            params = []
+            if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+                params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms]
+            cap = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG, params)
+        else:
+            cap = cv2.VideoCapture(self.source)
+
+        if not cap.isOpened():
+            cap.release()
+            self.last_error = "open failed"
+            return False
+
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+
+        self.cap = cap
+        self.connects += 1
+        self.failed_reads = 0
+        self.connected_since = self.last_frame_time = time.monotonic()
+        return True
+
+    def _release_cap(self):
+        """Release the underlying capture and account its uptime."""
+        if self.connected_since is not None:
+            self.uptime += time.monotonic() - self.connected_since
+            self.connected_since = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def _stopping(self):
+        """Whether the capture was released or the caller asked to stop."""
+        return self.closed.is_set() or (self.should_stop is not None and self.should_stop())
+
+    def isOpened(self):
+        """Whether the camera is currently connected."""
+        return self.cap is not None
+
+    def _grab_latest(self, max_skip=10):
+        """
+        Grab the newest frame, skipping frames that queued up since the last read.
+
+        A grab that returns almost immediately came from a buffer rather than
+        the camera, so keep grabbing until one has to wait for a new frame.
+        """
+        for _ in range(max_skip):
+            start = time.monotonic()
+            if not self.cap.grab():
+                return False
+            if time.monotonic() - start > 0.005:
+                return True
+            self.skipped_frames += 1
+        return True
+
+    def read(self, image=None):
+        """
+        Read the newest frame, reconnecting if the stream failed or stalled.
+
+        Args:
+            image (numpy.ndarray, optional): Buffer to decode the frame into
+
+        Returns:
+            tuple: (success, frame) like cv2.VideoCapture.read()
+        """
+        if self._stopping():
+            return False, None
+        if self.cap is None and not self.reconnect():
+            return False, None
+
+        if self._grab_latest():
+            ret, frame = self.cap.retrieve(image)
+            if ret and frame is not None:
+                self.failed_reads = 0
+                self.last_frame_time = time.monotonic()
+                return True, frame
+
+        self.read_failures += 1
+        self.failed_reads += 1
+        stalled = time.monotonic() - self.last_frame_time > self.stall_timeout
+        if stalled:
+            self.stalls += 1
+        if stalled or self.failed_reads >= self.max_failed_reads:
+            self.last_error = "stalled" if stalled else "read failed"
+            print(f"[WARNING] {self.name} camera {self.last_error}, reconnecting")
+            self.reconnect()
+        return False, None
+
+    def reconnect(self):
+        """
+        Reopen the camera, retrying with exponential backoff until it works, the capture
+        is released or should_stop() returns True.
+
+        Returns:
+            bool: True once reconnected
+        """
+        self._release_cap()
+        started = time.monotonic()
+        delay = self.backoff_initial
+
+        while not self._stopping():
+            if self.open():
+                latency = time.monotonic() - started
+                self.reconnects += 1
+                self.reconnect_latencies = (self.reconnect_latencies + [latency])[-50:]
+                print(f"[INFO] {self.name} camera reconnected after {latency:.1f}s")
+                return True
+
+            # Wait, but wake up immediately if the capture is released and soon if asked to stop
+            deadline = time.monotonic() + delay
+            while not self._stopping() and time.monotonic() < deadline:
+                self.closed.wait(min(0.5, deadline - time.monotonic()))
+            delay = min(delay * 2, self.backoff_max)
+
+        return False
+
+    def release(self):
+        """Release the camera and stop any pending reconnect."""
+        self.closed.set()
+        self._release_cap()
+
+    def get_stats(self):
+        """
+        Get capture statistics.
+
+        Returns:
+            dict: Connection state, uptime, reconnects and reconnect latency, stalls and failures
+        """
+        now = time.monotonic()
+        uptime = self.uptime + (now - self.connected_since if self.connected_since is not None else 0.0)
+        latencies = self.reconnect_latencies
+        return {
+            "connected": self.cap is not None,
+            "uptime_seconds": round(uptime, 1),
+            "availability": round(uptime / max(now - self.created_at, 1e-6), 3),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "last_reconnect_seconds": round(latencies[-1], 2) if latencies else None,
+            "mean_reconnect_seconds": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "stalls": self.stalls,
+            "read_failures": self.read_failures,
+            "skipped_frames": self.skipped_frames,
+            "last_error": self.last_error
+        }
+
+def read_labeled_sample(labels_dir, video_stride=10, max_video_frames=30):
+    """
+    Read a labeled sample: one sub-directory per person ID with images or videos of that person.
+
+    Args:
+        labels_dir (str): Directory laid out as <labels_dir>/<person_id>/<image or video>
+        video_stride (int): Use every n-th frame of a video
+        max_video_frames (int): Maximum frames used per video
+
+    Returns:
+        list: (BGR image, person ID) pairs
+    """
+    sample = []
+    for person_id in sorted(os.listdir(labels_dir)):
+        person_dir = os.path.join(labels_dir, person_id)
+        if not os.path.isdir(person_dir):
+            continue
+
+        for file_name in sorted(os.listdir(person_dir)):
+            path = os.path.join(person_dir, file_name)
+            extension = os.path.splitext(file_name)[1].lower()
+            if extension in IMAGE_EXTENSIONS:
+                image = cv2.imread(path)
+                if image is not None:
+                    sample.append((image, person_id))
+            elif extension in VIDEO_EXTENSIONS:
+                cap = cv2.VideoCapture(path)
+                index = used = 0
+                while used < max_video_frames:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if index % video_stride == 0:
+                        sample.append((frame, person_id))
+                        used += 1
+                    index += 1
+                cap.release()
+    return sample
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+import numpy as np
+from utils import load_encodings, save_encodings
+
+def pairwise_distances(a, b):
+    """
+    Compute Euclidean distances between every row of two matrices.
+
+    Args:
+        a (numpy.ndarray): Matrix of shape (n, d)
+        b (numpy.ndarray): Matrix of shape (m, d)
+
+    Returns:
+        numpy.ndarray: Distance matrix of shape (n, m)
+    """
+    sq = (
+        np.sum(a * a, axis=1)[:, None]
+        + np.sum(b * b, axis=1)[None, :]
+        - 2.0 * a @ b.T
+    )
+    return np.sqrt(np.maximum(sq, 0.0))
+
+def remove_near_duplicates(templates, threshold=0.1):
+    """
+    Drop templates that lie within a small distance of an earlier template.
+
+    Args:
+        templates (numpy.ndarray): Templates of one person, shape (n, d)
+        threshold (float): Distance below which two templates are duplicates
+
+    Returns:
+        numpy.ndarray: The retained templates
+    """
+    if len(templates) < 2:
+        return templates
+
+    distances = pairwise_distances(templates, templates)
+
+    # Template i is a duplicate if any earlier kept template is close to it
+    keep = np.ones(len(templates), dtype=bool)
+    for i in range(1, len(templates)):
+        earlier = keep[:i] & (distances[i, :i] < threshold)
+        if earlier.any():
+            keep[i] = False
+
+    return templates[keep]
+
+def cluster_templates(templates, k=3, max_iterations=20):
+    """
+    Cluster one person's templates into at most k representatives (k-means).
+
+    Centroids are seeded with farthest-point initialisation so the result is
+    deterministic and covers distinct poses/lighting conditions. The
+    src/server stack has a copy of remove_near_duplicates + cluster_templates
+    (utils.cluster_embeddings) because the two servers share no importable
+    package; change both together (both have tests).
+
+    Args:
+        templates (numpy.ndarray): Templates of one person, shape (n, d)
+        k (int): Maximum number of representatives to keep
+        max_iterations (int): Maximum number of k-means iterations
+
+    Returns:
+        numpy.ndarray: Representative templates, shape (min(n, k), d)
+    """
+    if len(templates) <= k:
+        return templates
+
+    # Seed with the template closest to the mean, then the farthest points
+    mean = templates.mean(axis=0, keepdims=True)
+    seeds = [int(np.argmin(pairwise_distances(templates, mean)[:, 0]))]
+    nearest = pairwise_distances(templates, templates[seeds])[:, 0]
+    while len(seeds) < k:
+        seeds.append(int(np.argmax(nearest)))
+        nearest = np.minimum(nearest, pairwise_distances(templates, templates[seeds[-1:]])[:, 0])
+    centroids = templates[seeds].copy()
+
+    assignment = None
+    for _ in range(max_iterations):
+        new_assignment = np.argmin(pairwise_distances(templates, centroids), axis=1)
+        if assignment is not None and np.array_equal(assignment, new_assignment):
+            break
+        assignment = new_assignment
+
+        for c in range(k):
+            members = templates[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+
+    return centroids
+
+def compact_gallery(data, k=3, dedupe_threshold=0.1):
+    """
+    Compact a gallery to at most k representative templates per person.
+
+    Args:
+        data (dict): Dictionary with keys 'encodings' and 'names'
+        k (int): Maximum number of representatives per person
+        dedupe_threshold (float): Distance below which templates are duplicates
+
+    Returns:
+        dict: Compacted dictionary with keys 'encodings' and 'names'
+    """
+    if len(data["encodings"]) == 0:
+        return {"encodings": [], "names": []}
+
+    encodings = np.asarray(data["encodings"], dtype=np.float64)
+    names = np.asarray(data["names"])
+
+    compacted_encodings = []
+    compacted_names = []
+
+    # Keep first-seen ordering of people stable
+    _, first_index = np.unique(names, return_index=True)
+    for name in names[np.sort(first_index)]:
+        templates = encodings[names == name]
+        templates = remove_near_duplicates(templates, dedupe_threshold)
+        representatives = cluster_templates(templates, k)
+
+        for representative in representatives:
+            compacted_encodings.append(representative)
+            compacted_names.append(str(name))
+
+    return {
+        "encodings": compacted_encodings,
+        "names": compacted_names
+    }
+
+def evaluate_recall(probe_data, gallery_data, tolerance=0.6):
+    """
+    Measure how many probe templates match the correct person in a gallery.
+
+    Args:
+        probe_data (dict): Probe templates with keys 'encodings' and 'names'
+        gallery_data (dict): Gallery templates with keys 'encodings' and 'names'
+        tolerance (float): Maximum distance for a valid match
+
+    Returns:
+        float: Fraction of probes whose nearest gallery entry is correct
+    """
+    if len(probe_data["encodings"]) == 0 or len(gallery_data["encodings"]) == 0:
+        return 0.0
+
+    probes = np.asarray(probe_data["encodings"], dtype=np.float64)
+    gallery = np.asarray(gallery_data["encodings"], dtype=np.float64)
+    probe_names = np.asarray(probe_data["names"])
+    gallery_names = np.asarray(gallery_data["names"])
+
+    distances = pairwise_distances(probes, gallery)
+    best = np.argmin(distances, axis=1)
+    best_distance = distances[np.arange(len(probes)), best]
+    correct = (gallery_names[best] == probe_names) & (best_distance <= tolerance)
+
+    return float(np.mean(correct))
+
+def split_probes(data, every=5):
+    """
+    Hold out templates as probes for measuring recall.
+
+    Every n-th template (starting with the second) of each person with more
+    than one template becomes a probe, so every such person keeps at least
+    one gallery template and contributes at least one probe.
+
+    Args:
+        data (dict): Gallery with keys 'encodings' and 'names'
+        every (int): Hold out one template in this many
+
+    Returns:
+        tuple: (gallery without the probes, held-out probes), both dicts
+            with keys 'encodings' and 'names'
+    """
+    names = np.asarray(data["names"])
+    probe = np.zeros(len(names), dtype=bool)
+    for name in np.unique(names):
+        indices = np.flatnonzero(names == name)
+        probe[indices[1::every]] = True
+
+    def subset(mask):
+        return {
+            "encodings": [data["encodings"][i] for i in np.flatnonzero(mask)],
+            "names": [str(names[i]) for i in np.flatnonzero(mask)]
+        }
+
+    return subset(~probe), subset(probe)
+
+def compaction_report(original, compacted, tolerance=0.6, k=3, dedupe_threshold=0.1, probe_every=5):
+    """
+    Summarise the size and recall change caused by compaction.
+
+    Recall is measured on held-out probes (see split_probes) that neither
+    gallery has seen: against the remaining templates as they are, and
+    against the same templates compacted with the same settings. Both sides
+    answer the same probes, so the difference is what compaction costs.
+
+    Args:
+        original (dict): Gallery before compaction
+        compacted (dict): Gallery after compaction
+        tolerance (float): Maximum distance for a valid match
+        k (int): Maximum number of representatives per person used for compacted
+        dedupe_threshold (float): Duplicate distance used for compacted
+        probe_every (int): Hold out one template in this many as a probe
+
+    Returns:
+        dict: Size, shrink ratio and recall figures (recall is None when
+            nobody has more than one template)
+    """
+    before = len(original["encodings"])
+    after = len(compacted["encodings"])
+
+    gallery, probes = split_probes(original, probe_every)
+    if probes["encodings"]:
+        recall_before = evaluate_recall(probes, gallery, tolerance)
+        recall_after = evaluate_recall(probes, compact_gallery(gallery, k, dedupe_threshold), tolerance)
+    else:
+        recall_before = recall_after = None
+
+    return {
+        "people": len(set(original["names"])),
+        "templates_before": before,
+        "templates_after": after,
+        "shrink_ratio": 1.0 - (after / before) if before else 0.0,
+        "probes": len(probes["encodings"]),
+        "recall_before": recall_before,
+        "recall_after": recall_after
+    }
+
+
+def main():
+    """Main function to compact a face encodings file."""
+    parser = argparse.ArgumentParser(description="Compact a face encodings gallery")
+    parser.add_argument("-e", "--encodings", required=True,
+                        help="Path to the face encodings file")
+    parser.add_argument("-o", "--output", type=str,
+                        help="Path to save the compacted encodings (default: overwrite input)")
+    parser.add_argument("-k", "--representatives", type=int, default=3,
+                        help="Maximum number of templates kept per person")
+    parser.add_argument("--dedupe", type=float, default=0.1,
+                        help="Distance below which two templates are duplicates")
+    parser.add_argument("--tolerance", type=float, default=0.6,
+                        help="Matching tolerance used for the recall report")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only print the report, do not write the output file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.encodings):
+        print(f"[ERROR] Encodings file not found: {args.encodings}")
+        return
+
+    original = load_encodings(args.encodings)
+
+    start_time = time.time()
+    compacted = compact_gallery(original, args.representatives, args.dedupe)
+    elapsed = time.time() - start_time
+
+    report = compaction_report(original, compacted, args.tolerance, args.representatives, args.dedupe)
+    print(f"[INFO] Compacted gallery of {report['people']} people in {elapsed:.3f}s")
+    print(f"[INFO] Templates: {report['templates_before']} -> {report['templates_after']} "
+          f"({report['shrink_ratio'] * 100:.1f}% smaller)")
+    if report["probes"]:
+        print(f"[INFO] Recall on {report['probes']} held-out templates: "
+              f"{report['recall_before']:.3f} -> {report['recall_after']:.3f}")
+    else:
+        print("[INFO] Recall not measured: nobody has more than one template")
+
+    if args.dry_run:
+        return
+
+    output = args.output or args.encodings
+    save_encodings(compacted, output)
+    print(f"[INFO] Saved compacted encodings to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Each engine is benchmarked by embedding_benchmark.py in its own stack, in a separate
+# process (both stacks use the same module names, and memory is measured per process)
+ENGINES = {
+    "dlib": os.path.join(HERE, "embedding_benchmark.py"),
+    "facenet": os.path.join(HERE, "..", "..", "src", "server", "face_recognition", "embedding_benchmark.py")
+}
+
+def run_engine(engine, labels_dir, extra_args=()):
+    """
+    Benchmark one engine on the labeled set in a separate process.
+
+    Args:
+        engine (str): 'dlib' or 'facenet'
+        labels_dir (str): Labeled set directory
+        extra_args (tuple): Extra arguments for the engine's embedding_benchmark.py
+
+    Returns:
+        dict: Results written by the engine, or None if it failed
+    """
+    script = os.path.abspath(ENGINES[engine])
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        output = tmp.name
+    try:
+        completed = subprocess.run(
+            [sys.executable, script, "--labels", os.path.abspath(labels_dir), "--output", output, *extra_args],
+            cwd=os.path.dirname(script)
+        )
+        if completed.returncode != 0 or os.path.getsize(output) == 0:
+            print(f"[ERROR] {engine} benchmark failed (exit code {completed.returncode})")
+            return None
+        with open(output, "r") as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+def verification_metrics(labels, embeddings, fars=(0.001, 0.01), match_threshold=None):
+    """
+    Verification accuracy from all pairs of embedded samples.
+
+    Pairs of the same person are genuine, pairs of different people are
+    impostors. For each false accept rate, the distance threshold is the
+    FAR-quantile of impostor distances, and TAR is the fraction of genuine
+    pairs within it. Samples without a detected face don't form pairs; they
+    are reported as the failure-to-detect rate.
+
+    Args:
+        labels (list): Person ID per sample
+        embeddings (list): Embedding per sample (None if no face was found)
+        fars (tuple): False accept rates to report TAR at
+        match_threshold (float, optional): The engine's production distance threshold to also report
+
+    Returns:
+        dict: Failure-to-detect rate, pair counts, TAR per FAR, operating point and rank-1 accuracy
+    """
+    kept = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+    metrics = {"failure_to_detect": 1.0 - len(kept) / max(1, len(embeddings))}
+    if len(kept) < 2:
+        return metrics
+
+    vectors = np.asarray([embeddings[i] for i in kept], dtype=np.float64)
+    names = np.asarray([labels[i] for i in kept])
+    sq = np.sum(vectors ** 2, axis=1)
+    distances = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * vectors @ vectors.T, 0.0))
+
+    upper = np.triu_indices(len(kept), k=1)
+    same = (names[:, None] == names[None, :])[upper]
+    pair_distances = distances[upper]
+    genuine = pair_distances[same]
+    impostor = np.sort(pair_distances[~same])
+    metrics.update(genuine_pairs=int(len(genuine)), impostor_pairs=int(len(impostor)))
+
+    if len(genuine) and len(impostor):
+        metrics["tar_at_far"] = {}
+        for far in fars:
+            # Accept d < threshold: at most FAR of the impostor pairs are accepted
+            threshold = impostor[int(np.floor(far * len(impostor)))]
+            metrics["tar_at_far"][str(far)] = {
+                "tar": float(np.mean(genuine < threshold)),
+                "threshold": float(threshold),
+                # Too few impostor pairs to resolve this FAR
+                "reliable": len(impostor) * far >= 10
+            }
+        if match_threshold is not None:
+            metrics["at_match_threshold"] = {
+                "threshold": match_threshold,
+                "tar": float(np.mean(genuine <= match_threshold)),
+                "far": float(np.mean(impostor <= match_threshold))
+            }
+
+    # Closed-set identification: nearest other sample has the same person ID
+    np.fill_diagonal(distances, np.inf)
+    has_mate = np.array([np.sum(names == name) > 1 for name in names])
+    if has_mate.any():
+        nearest = np.argmin(distances, axis=1)
+        metrics["rank1_accuracy"] = float(np.mean(names[nearest][has_mate] == names[has_mate]))
+
+    return metrics
+
+def print_report(reports, fars):
+    """Print the comparison of all engines side by side."""
+    engines = list(reports)
+    rows = [
+        ("samples", lambda r: f"{r['samples']}"),
+        ("failure to detect", lambda r: f"{r['accuracy']['failure_to_detect'] * 100:.1f}%"),
+        ("throughput (fps)", lambda r: f"{r['throughput_fps']:.2f}" if r["throughput_fps"] else "-"),
+    ]
+    for stage in ("prepare", "detect", "embed", "total"):
+        rows.append((f"{stage} mean/p95 ms", lambda r, s=stage: (
+            f"{r['stages'][s]['mean_ms']:.1f}/{r['stages'][s]['p95_ms']:.1f}"
+            if r["stages"].get(s, {}).get("mean_ms") is not None else "-"
+        )))
+    rows += [
+        ("model load (s)", lambda r: f"{r['load_seconds']:.1f}"),
+        ("peak RSS (MB)", lambda r: f"{r['peak_rss_mb']:.0f}"),
+        ("model RSS (MB)", lambda r: f"{r['model_rss_mb']:.0f}"),
+    ]
+    for far in fars:
+        rows.append((f"TAR @ FAR={far}", lambda r, f=str(far): (
+            f"{r['accuracy']['tar_at_far'][f]['tar'] * 100:.1f}%"
+            + ("" if r["accuracy"]["tar_at_far"][f]["reliable"] else " (*)")
+            if "tar_at_far" in r["accuracy"] else "-"
+        )))
+    rows += [
+        ("TAR/FAR at threshold", lambda r: (
+            f"{r['accuracy']['at_match_threshold']['tar'] * 100:.1f}%/"
+            f"{r['accuracy']['at_match_threshold']['far'] * 100:.2f}%"
+            if "at_match_threshold" in r["accuracy"] else "-"
+        )),
+        ("rank-1 accuracy", lambda r: (
+            f"{r['accuracy']['rank1_accuracy'] * 100:.1f}%" if "rank1_accuracy" in r["accuracy"] else "-"
+        )),
+    ]
+
+    print(f"{'':<24}" + "".join(f"{engine:>16}" for engine in engines))
+    for label, cell in rows:
+        print(f"{label:<24}" + "".join(f"{cell(reports[engine]):>16}" for engine in engines))
+    if any(not point["reliable"] for r in reports.values() for point in r["accuracy"].get("tar_at_far", {}).values()):
+        print("(*) fewer than 10 impostor pairs at this FAR; use a larger labeled set")
+
+def main():
+    """Main function to compare the dlib and Facenet stacks on the same labeled set."""
+    parser = argparse.ArgumentParser(description="Compare the dlib and Facenet recognition engines")
+    parser.add_argument("--labels", required=True,
+                        help="Labeled set: one directory per person ID with images or videos")
+    parser.add_argument("--engines", type=str, default="dlib,facenet",
+                        help="Comma-separated engines to compare")
+    parser.add_argument("--fars", type=str, default="0.001,0.01",
+                        help="Comma-separated false accept rates to report TAR at")
+    parser.add_argument("--video_stride", type=int, default=10,
+                        help="Use every n-th frame of videos")
+    parser.add_argument("-o", "--output", type=str,
+                        help="Write the full report (JSON) to this file")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.labels):
+        print(f"[ERROR] Labeled set not found: {args.labels}")
+        return
+
+    fars = [float(far) for far in args.fars.split(",")]
+    reports = {}
+    for engine in args.engines.split(","):
+        if engine not in ENGINES:
+            print(f"[ERROR] Unknown engine '{engine}'. Choose from {list(ENGINES)}")
+            return
+        results = run_engine(engine, args.labels, ("--video_stride", str(args.video_stride)))
+        if results is None:
+            continue
+        results["accuracy"] = verification_metrics(
+            results["labels"], results["embeddings"], fars, results.get("match_threshold")
+        )
+        del results["embeddings"]
+        reports[engine] = results
+
+    if not reports:
+        return
+    print_report(reports, fars)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=4)
+        print(f"[INFO] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,22 @@ import argparse
 import time
 from datetime import datetime
 import threading
-from utils import load_encodings, find_matching_face
+from utils import load_encodings, save_encodings, encodings_lock, find_matching_faces, load_host_config
+from evidence import EvidenceStore
+from frame_bus import FrameBus, EncodedFrameCache
+from capture import ResilientCapture
+from face_quality import QualityGate, FaceTracker
+from quantized_gallery import QuantizedGallery
+from outbox import AttendanceOutbox
+from duty_cycle import DutyCycle, TriggerSource, load_stops
+from tracing import tracer
 
 class FaceDetectionSystem:
     def __init__(self, encodings_file, attendance_file, camera_id=0, camera_name="entry", 
-                 detection_method="hog", confidence_threshold=0.5, mark_attendance=True):
+                 detection_method="hog", confidence_threshold=0.5, mark_attendance=True,
+                 evidence_store=None, frame_bus=None, check_quality=True, gallery_mode=None, rerank=8,
+                 outbox=None, max_frame_size=640, frame_stride=5, upsample=1, duty_cycle=None,
+                 attendance_store=None):
         """
         Initialize the face detection system.
         
@@ -24,24 +35,71 @@ class FaceDetectionSystem:
             detection_method (str): Face detection method ('hog' or 'cnn')
             confidence_threshold (float): Minimum confidence for a valid match
             mark_attendance (bool): Whether to mark attendance or just detect
+            evidence_store (EvidenceStore, optional): Where to keep snapshots of each mark
+            frame_bus (FrameBus, optional): Shared frame ring to capture into (a private one if omitted)
+            check_quality (bool): Skip encoding blurry, tiny, badly exposed or side-on faces
+            gallery_mode (str, optional): Scan the gallery as 'float16' or 'int8' and re-rank
+                the best candidates exactly (exact float64 matching if omitted)
+            rerank (int): Candidates re-ranked with full precision in a quantized gallery
+            outbox (AttendanceOutbox, optional): Queue forwarding marks to the central server
+            max_frame_size (int): Longest side frames are downscaled to before detection
+            frame_stride (int): Process every n-th captured frame in the detection loop
+            upsample (int): How many times the detector upsamples the image to find smaller faces
+            duty_cycle (DutyCycle, optional): Door/GPS triggers switching between full rate around
+                stops and a low-rate idle mode (always full rate if omitted)
+            attendance_store (AttendanceStore, optional): Database shared by API worker processes;
+                replaces the attendance file (which is imported once if the store is empty)
         """
         self.encodings_file = encodings_file
         self.attendance_file = attendance_file
         self.camera_id = camera_id
         self.camera_name = camera_name
         self.detection_method = detection_method
+        self.max_frame_size = max_frame_size
+        self.frame_stride = frame_stride
+        self.upsample = upsample
         self.confidence_threshold = confidence_threshold
         self.mark_attendance = mark_attendance
+        self.evidence_store = evidence_store
+        self.outbox = outbox
+        self.duty_cycle = duty_cycle
+        self.attendance_store = attendance_store
         
         # Load known face encodings
-        self.data = load_encodings(encodings_file)
+        self.gallery_mode = gallery_mode
+        self.rerank = rerank
+        self.gallery_lock = threading.Lock()
+        self.data = None
+        self.known_encodings = None
+        self.gallery = None
+        self._set_gallery(load_encodings(encodings_file))
+        num_encodings = len(self.data["names"])
+        
+        # Load existing attendance records (the shared store keeps its own)
+        if attendance_store is not None:
+            attendance_store.import_file(attendance_file)
+            self.attendance_records = None
+        else:
+            self.attendance_records = self._load_attendance()
+        
+        # Captured frames live in a shared ring; readers get views instead of copies
+        self.owns_frame_bus = frame_bus is None
+        self.frame_bus = frame_bus or FrameBus(prefix=f"frames_{os.getpid()}")
+        
+        # Quality gate before encoding, and tracks keeping each person's best frame
+        self.quality_gate = QualityGate() if check_quality else None
+        self.tracker = FaceTracker() if check_quality else None
+        self.quality_stats = {"encoded": 0, "skipped": 0, "reused": 0}
+        # Inference workers (INFERENCE_WORKERS > 1) update the counters concurrently
+        self.quality_stats_lock = threading.Lock()
         
-        # Load existing attendance records
-        self.attendance_records = self._load_attendance()
+        # Annotated frame/JPEG rendered once per frame for all viewers
+        self.encoded_frames = EncodedFrameCache()
         
         # Properties for frame processing
-        self.last_frame = None
         self.last_detection_result = None
+        # Frame bus sequence number of the frame the last result came from
+        self.last_detection_seq = None
         self.is_running = False
         self.detection_thread = None
         
@@ -49,8 +107,78 @@ class FaceDetectionSystem:
         self.process_times = []
         self.last_attendance_time = {}
         
-        print(f"[INFO] Loaded {len(self.data['encodings'])} face encodings")
+        # Serialises attendance updates from concurrent inference workers
+        self.attendance_lock = threading.Lock()
+        
+        print(f"[INFO] Loaded {num_encodings} face encodings"
+              + (f" ({gallery_mode} gallery, {self.gallery.memory_bytes() / 1024:.1f} KB)" if self.gallery else ""))
+        
+    def _set_gallery(self, data):
+        """
+        Build the matching structures for a gallery and swap them in.
+        
+        Args:
+            data (dict): Dictionary with keys 'encodings' and 'names'
+        """
+        gallery = known_encodings = None
+        if self.gallery_mode and data["names"]:
+            # Compact vectors in RAM; full precision is memory-mapped from disk for re-ranking
+            gallery = QuantizedGallery(
+                data["encodings"],
+                data["names"],
+                mode=self.gallery_mode,
+                rerank=self.rerank,
+                full_precision_file=os.path.splitext(self.encodings_file)[0] + ".f32.npy",
+                source_file=self.encodings_file
+            )
+            data = {"encodings": [], "names": data["names"]}
+        else:
+            known_encodings = np.asarray(data["encodings"], dtype=np.float64)
+        
+        # Matching reads the encodings before the names, and merged templates are
+        # appended, so swapping the names first never pairs an encoding with a wrong name
+        self.data = data
+        self.known_encodings = known_encodings
+        self.gallery = gallery
+    
+    def add_templates(self, encodings, names):
+        """
+        Merge new face templates into the live gallery and the encodings file.
+        
+        The merge starts from a fresh read of the encodings file under an
+        inter-process lock, so jobs finishing at the same time in different
+        API workers don't overwrite each other's templates.
+        
+        Args:
+            encodings (list): New face encodings
+            names (list): Person ID of each encoding
+            
+        Returns:
+            int: Number of templates in the gallery afterwards
+        """
+        with self.gallery_lock, encodings_lock(self.encodings_file):
+            current = load_encodings(self.encodings_file)
+            data = {
+                "encodings": list(current["encodings"]) + [np.asarray(e, dtype=np.float64) for e in encodings],
+                "names": list(current["names"]) + list(names)
+            }
+            
+            # Write atomically so other processes never load a half-written file
+            tmp_file = self.encodings_file + ".tmp"
+            save_encodings(data, tmp_file)
+            os.replace(tmp_file, self.encodings_file)
+            
+            self._set_gallery(data)
         
+        print(f"[INFO] Merged {len(names)} templates into the gallery ({len(data['names'])} total)")
+        return len(data["names"])
+    
+    def reload_gallery(self):
+        """Reload the gallery from the encodings file (e.g. after another process merged templates)."""
+        with self.gallery_lock, encodings_lock(self.encodings_file):
+            self._set_gallery(load_encodings(self.encodings_file))
+        print(f"[INFO] Reloaded {len(self.data['names'])} face encodings")
+    
     def _load_attendance(self):
         """Load attendance records from file if exists, otherwise create empty records."""
         if os.path.exists(self.attendance_file):
@@ -69,59 +197,124 @@ class FaceDetectionSystem:
         with open(self.attendance_file, "w") as f:
             json.dump(self.attendance_records, f, indent=4)
     
-    def mark_entry_exit(self, person_id, camera_type):
+    def mark_entry_exit(self, person_id, camera_type, frame=None, face_location=None):
         """
         Mark entry or exit for a person.
         
         Args:
             person_id (str): ID of the person
             camera_type (str): Type of camera ('entry' or 'exit')
+            frame (numpy.ndarray, optional): Frame to keep as evidence of the mark
+            face_location (tuple, optional): (top, right, bottom, left) of the face in the frame
+            
+        Returns:
+            bool: True if an entry or exit time was recorded
         """
         # Don't mark attendance if disabled
         if not self.mark_attendance:
-            return
+            return False
         
-        # Get current date and time
-        now = datetime.now()
-        date_str = now.strftime("%Y-%m-%d")
-        time_str = now.strftime("%H:%M:%S")
-        
-        # Check cooldown for the same person (prevent multiple entries within short time)
-        person_key = f"{person_id}_{camera_type}"
-        if person_key in self.last_attendance_time:
-            last_time = self.last_attendance_time[person_key]
-            if (now - last_time).total_seconds() < 60:  # 60 seconds cooldown
-                return
-        
-        # Update last attendance time
-        self.last_attendance_time[person_key] = now
-        
-        # Find or create record for today
-        today_record = None
-        for record in self.attendance_records["records"]:
-            if record["date"] == date_str and record["person_id"] == person_id:
-                today_record = record
-                break
-        
-        if today_record is None:
-            today_record = {
-                "person_id": person_id,
-                "date": date_str,
-                "entry_time": None,
-                "exit_time": None
-            }
-            self.attendance_records["records"].append(today_record)
+        with self.attendance_lock:
+            # Get current date and time
+            now = datetime.now()
+            date_str = now.strftime("%Y-%m-%d")
+            time_str = now.strftime("%H:%M:%S")
+            
+            # Check cooldown for the same person (prevent multiple entries within short time)
+            person_key = f"{person_id}_{camera_type}"
+            if person_key in self.last_attendance_time:
+                last_time = self.last_attendance_time[person_key]
+                if (now - last_time).total_seconds() < 60:  # 60 seconds cooldown
+                    return False
+            
+            # Update last attendance time
+            self.last_attendance_time[person_key] = now
+            
+            if self.attendance_store is not None:
+                # One atomic statement, safe against marks from other worker processes
+                marked = self.attendance_store.mark(person_id, date_str, camera_type, time_str)
+                if marked:
+                    print(f"[INFO] Marked {camera_type} for {person_id} at {time_str}")
+            else:
+                # Find or create record for today
+                today_record = None
+                for record in self.attendance_records["records"]:
+                    if record["date"] == date_str and record["person_id"] == person_id:
+                        today_record = record
+                        break
+            
+                if today_record is None:
+                    today_record = {
+                        "person_id": person_id,
+                        "date": date_str,
+                        "entry_time": None,
+                        "exit_time": None
+                    }
+                    self.attendance_records["records"].append(today_record)
+            
+                # Update entry or exit time
+                marked = False
+                if camera_type == "entry" and not today_record["entry_time"]:
+                    today_record["entry_time"] = time_str
+                    marked = True
+                    print(f"[INFO] Marked entry for {person_id} at {time_str}")
+                elif camera_type == "exit" and today_record["entry_time"]:
+                    today_record["exit_time"] = time_str
+                    marked = True
+                    print(f"[INFO] Marked exit for {person_id} at {time_str}")
+            
+                # Save attendance records
+                self._save_attendance()
+        
+        # Queue the mark for upload; the outbox survives being offline
+        if marked and self.outbox is not None:
+            self.outbox.record(person_id, date_str, camera_type, time_str)
         
-        # Update entry or exit time
-        if camera_type == "entry" and not today_record["entry_time"]:
-            today_record["entry_time"] = time_str
-            print(f"[INFO] Marked entry for {person_id} at {time_str}")
-        elif camera_type == "exit" and today_record["entry_time"]:
-            today_record["exit_time"] = time_str
-            print(f"[INFO] Marked exit for {person_id} at {time_str}")
+        # Store evidence of the mark off the hot path
+        if marked and self.evidence_store is not None and frame is not None:
+            key = self.evidence_store.record_key(person_id, date_str, camera_type)
+            self.evidence_store.capture(key, frame, face_location)
         
-        # Save attendance records
-        self._save_attendance()
+        return marked
+    
+    def merge_attendance(self, marks):
+        """
+        Merge marks uploaded by edge nodes into the attendance records.
+        
+        Merging is idempotent: the earliest entry and the latest exit of each
+        person and day win, so re-sent batches don't change anything.
+        
+        Args:
+            marks (list): Dicts with person_id, date, direction ('entry'/'exit') and time
+            
+        Returns:
+            int: Number of records that changed
+        """
+        if self.attendance_store is not None:
+            return self.attendance_store.merge(marks)
+        
+        with self.attendance_lock:
+            records = {(r["person_id"], r["date"]): r for r in self.attendance_records["records"]}
+            changed = 0
+            for mark in marks:
+                key = (mark["person_id"], mark["date"])
+                record = records.get(key)
+                if record is None:
+                    record = {"person_id": key[0], "date": key[1], "entry_time": None, "exit_time": None}
+                    self.attendance_records["records"].append(record)
+                    records[key] = record
+                
+                field = "exit_time" if mark["direction"] == "exit" else "entry_time"
+                current = record[field]
+                if current is None or (mark["time"] > current if field == "exit_time" else mark["time"] < current):
+                    record[field] = mark["time"]
+                    changed += 1
+            
+            # One write per batch instead of one per mark
+            if changed:
+                self._save_attendance()
+        
+        return changed
     
     def start_detection(self):
         """Start face detection in a separate thread."""
@@ -131,9 +324,11 @@ class FaceDetectionSystem:
         
         # Initialize camera
         self.camera = self._initialize_camera()
-        if not self.camera or not self.camera.isOpened():
+        if not self.camera:
             print(f"[ERROR] Failed to open camera {self.camera_id}")
             return
+        if not self.camera.isOpened():
+            print(f"[WARNING] Camera {self.camera_id} is not reachable yet, will keep retrying")
         
         # Start detection thread
         self.is_running = True
@@ -150,177 +345,411 @@ class FaceDetectionSystem:
             self.detection_thread.join(timeout=1.0)
         if hasattr(self, 'camera') and self.camera:
             self.camera.release()
+        if self.owns_frame_bus:
+            self.frame_bus.close()
         
         print("[INFO] Detection stopped")
     
     def _initialize_camera(self):
-        """Initialize the camera."""
+        """Initialize the camera with automatic reconnects."""
         try:
-            # Check if camera_id is a URL (string) or a device index (integer)
-            if isinstance(self.camera_id, str) and (
-                self.camera_id.startswith("rtsp://") or 
-                self.camera_id.startswith("http://") or
-                self.camera_id.startswith("https://")
-            ):
-                camera = cv2.VideoCapture(self.camera_id)
-            else:
-                camera = cv2.VideoCapture(int(self.camera_id))
-            
-            # Set camera properties
-            camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            
-            return camera
+            return ResilientCapture(self.camera_id, name=self.camera_name, width=640, height=480)
         except Exception as e:
             print(f"[ERROR] Failed to initialize camera: {e}")
             return None
     
+    def get_capture_stats(self):
+        """Get uptime and reconnect statistics of the camera (None if not started)."""
+        camera = getattr(self, "camera", None)
+        return camera.get_stats() if camera else None
+    
     def _detection_loop(self):
         """Main detection loop running in a separate thread."""
         frame_count = 0
         processing_time = 0
         
         while self.is_running:
-            # Capture frame
-            ret, frame = self.camera.read()
+            # Capture frame straight into the next slot of the frame ring
+            with tracer.span("capture", camera=self.camera_name):
+                ret, seq = self.frame_bus.capture(self.camera_name, self.camera)
             if not ret:
-                print("[WARNING] Failed to capture frame")
-                time.sleep(1)
+                # The capture reconnects by itself; just try again shortly
+                time.sleep(0.1)
                 continue
             
-            # Store the last frame
-            self.last_frame = frame.copy()
+            # Between stops only the occasional idle frame is captured, and each one is processed
+            idle = self.duty_cycle is not None and not self.duty_cycle.is_active()
+            if idle:
+                frame_count = 0
             
-            # Only process every 5th frame to save CPU
-            if frame_count % 5 == 0:
-                start_time = time.time()
-                detection_result = self.process_frame(frame)
-                end_time = time.time()
-                
-                processing_time = end_time - start_time
-                self.process_times.append(processing_time)
-                if len(self.process_times) > 30:
-                    self.process_times.pop(0)
-                
-                # Update detection result
-                self.last_detection_result = detection_result
-                
-                # If a face is detected with sufficient confidence, mark attendance
-                if detection_result and detection_result["name"] and detection_result["confidence"] >= self.confidence_threshold:
-                    self.mark_entry_exit(detection_result["name"], self.camera_name)
+            # Only process every n-th frame to save CPU
+            if frame_count % self.frame_stride == 0:
+                with self.frame_bus.hold(self.camera_name, seq) as held:
+                    start_time = time.time()
+                    with tracer.span("process_frame", camera=self.camera_name, seq=seq):
+                        detection_result = self.process_frame(held.frame) if held.frame is not None else None
+                    end_time = time.time()
+                    
+                    processing_time = end_time - start_time
+                    self.process_times.append(processing_time)
+                    if len(self.process_times) > 30:
+                        self.process_times.pop(0)
+                    
+                    # A result from a frame overwritten meanwhile may mix two frames; drop it
+                    if detection_result is not None and held.is_valid():
+                        # Update detection result (result first: readers take the seq first)
+                        self.last_detection_result = detection_result
+                        self.last_detection_seq = seq
+                        
+                        # If a face is detected with sufficient confidence, mark attendance
+                        with tracer.span("handle_detection", camera=self.camera_name):
+                            self.handle_detection(detection_result, self.camera_name, held.frame)
             
             frame_count += 1
             
+            if idle:
+                # Low-rate idle mode; a trigger wakes the loop up immediately
+                with tracer.span("idle", camera=self.camera_name):
+                    self.duty_cycle.wait_idle()
+                continue
+            
             # Calculate average processing time and adjust sleep to maintain target frame rate
             avg_processing = sum(self.process_times) / max(1, len(self.process_times))
             sleep_time = max(0.05, 0.2 - avg_processing)  # Target ~5 FPS
-            time.sleep(sleep_time)
+            with tracer.span("sleep", camera=self.camera_name):
+                time.sleep(sleep_time)
     
-    def process_frame(self, frame):
+    def _prepare_frame(self, frame):
         """
-        Process a frame to detect and recognize faces.
+        Resize a frame for faster processing and convert it to RGB.
         
         Args:
-            frame (numpy.ndarray): Frame to process
+            frame (numpy.ndarray): BGR frame
             
         Returns:
-            dict: Detection result with name, confidence, and face location
+            tuple: (RGB frame, resize ratio <= 1)
         """
         # Resize frame for faster processing (keep aspect ratio)
         height, width = frame.shape[:2]
-        ratio = 640 / max(width, height)
+        ratio = self.max_frame_size / max(width, height)
         if ratio < 1:
             small_frame = cv2.resize(frame, (0, 0), fx=ratio, fy=ratio)
         else:
             small_frame = frame
+            ratio = 1.0
         
         # Convert to RGB (face_recognition uses RGB)
-        rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB), ratio
+    
+    def _detect_batch(self, rgb_frames):
+        """
+        Detect face locations in several frames.
         
-        # Detect faces
-        face_locations = face_recognition.face_locations(rgb_frame, model=self.detection_method)
+        The CNN detector runs frames of the same size as one batch on the GPU;
+        HOG has no batch mode so frames are processed one by one.
         
-        # If no faces found, return None
-        if not face_locations:
-            return None
+        Args:
+            rgb_frames (list): RGB frames
+            
+        Returns:
+            list: Face locations per frame
+        """
+        if self.detection_method != "cnn" or len(rgb_frames) < 2:
+            return [
+                face_recognition.face_locations(
+                    rgb, number_of_times_to_upsample=self.upsample, model=self.detection_method
+                )
+                for rgb in rgb_frames
+            ]
+        
+        # batch_face_locations needs equally sized images
+        groups = {}
+        for i, rgb in enumerate(rgb_frames):
+            groups.setdefault(rgb.shape, []).append(i)
+        
+        locations = [None] * len(rgb_frames)
+        for indices in groups.values():
+            batch = face_recognition.batch_face_locations(
+                [rgb_frames[i] for i in indices],
+                number_of_times_to_upsample=self.upsample,
+                batch_size=len(indices)
+            )
+            for i, face_locations in zip(indices, batch):
+                locations[i] = face_locations
+        
+        return locations
+    
+    def process_frames(self, frames, camera_types=None):
+        """
+        Process several frames in one batch to detect and recognize faces.
         
-        # Get face encodings
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-        
-        # Process each detected face (usually just take the first/largest one)
-        largest_face_idx = 0
-        largest_face_area = 0
-        
-        # Find the largest face if multiple faces are detected
-        for i, (top, right, bottom, left) in enumerate(face_locations):
-            face_area = (bottom - top) * (right - left)
-            if face_area > largest_face_area:
-                largest_face_area = face_area
-                largest_face_idx = i
-        
-        # Get the largest face's encoding and location
-        face_encoding = face_encodings[largest_face_idx]
-        face_location = face_locations[largest_face_idx]
-        
-        # Find matching face
-        name, confidence = find_matching_face(
-            face_encoding, 
-            self.data["encodings"], 
-            self.data["names"],
-            tolerance=0.6
-        )
+        Detection is batched where the model supports it, only the largest
+        face of each frame is encoded, and all encodings are matched against
+        the gallery in a single vectorized computation. With the quality gate
+        on, faces that are too blurry, small, badly exposed or side-on are not
+        encoded and get no match, and a tracked face is only encoded again when
+        its quality improves; otherwise the result of its best frame so far is
+        reused (marked as such, and never used to mark attendance).
         
-        # Adjust the face location coordinates for original frame size
-        if ratio < 1:
+        Args:
+            frames (list): Frames to process (BGR numpy arrays)
+            camera_types (list, optional): Camera of each frame, used for tracking
+            
+        Returns:
+            list: Detection result per frame (dict or None if no face)
+        """
+        with tracer.span("prepare", frames=len(frames)):
+            prepared = [self._prepare_frame(frame) for frame in frames]
+        with tracer.span("detect", frames=len(frames), model=self.detection_method):
+            locations = self._detect_batch([rgb for rgb, _ in prepared])
+        
+        # Encode the largest face of every frame that has one and is worth encoding
+        to_encode = []
+        face_encodings = []
+        not_encoded = []
+        for i, ((rgb, ratio), frame_locations) in enumerate(zip(prepared, locations)):
+            if not frame_locations:
+                continue
+            
+            largest = max(
+                frame_locations,
+                key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3])
+            )
+            
+            quality = track = None
+            if self.quality_gate:
+                with tracer.span("quality"):
+                    quality = self.quality_gate.assess(rgb, largest)
+                    camera_type = camera_types[i] if camera_types else self.camera_name
+                    track = self.tracker.update(camera_type, largest)
+                if not quality["passed"]:
+                    # Failed the gate: no match, whatever the track matched before
+                    not_encoded.append((i, largest, quality, None))
+                    continue
+                if not self.tracker.needs_encoding(track, quality):
+                    not_encoded.append((i, largest, quality, track["result"]))
+                    continue
+            
+            to_encode.append((i, largest, quality, track))
+            with tracer.span("encode"):
+                face_encodings.append(face_recognition.face_encodings(rgb, [largest])[0])
+        
+        # Match all faces at once
+        with tracer.span("match", faces=len(face_encodings)):
+            if self.gallery:
+                matches = self.gallery.match(face_encodings, tolerance=0.6)
+            else:
+                matches = find_matching_faces(
+                    face_encodings,
+                    self.known_encodings,
+                    self.data["names"],
+                    tolerance=0.6
+                )
+        
+        results = [None] * len(frames)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        def build_result(i, face_location, name, confidence, quality, best_frame=False, reused=False):
+            # Adjust the face location coordinates for original frame size
+            ratio = prepared[i][1]
             top, right, bottom, left = face_location
-            top = int(top / ratio)
-            right = int(right / ratio)
-            bottom = int(bottom / ratio)
-            left = int(left / ratio)
-            face_location = (top, right, bottom, left)
+            return {
+                "name": name,
+                "confidence": float(confidence),
+                "location": (int(top / ratio), int(right / ratio), int(bottom / ratio), int(left / ratio)),
+                "quality": quality["score"] if quality else None,
+                "best_frame": best_frame,
+                "reused": reused,
+                "timestamp": timestamp
+            }
+        
+        for (i, face_location, quality, track), (name, confidence) in zip(to_encode, matches):
+            best_frame = self.tracker.remember(track, (name, confidence), quality) if track else False
+            results[i] = build_result(i, face_location, name, confidence, quality, best_frame)
+        
+        # Unchanged faces reuse their track's best result; faces failing the gate get none
+        for i, face_location, quality, best in not_encoded:
+            name, confidence = best if best else (None, 0.0)
+            results[i] = build_result(i, face_location, name, confidence, quality, reused=best is not None)
+        
+        reused = sum(1 for *_, best in not_encoded if best)
+        with self.quality_stats_lock:
+            self.quality_stats["encoded"] += len(to_encode)
+            self.quality_stats["reused"] += reused
+            self.quality_stats["skipped"] += len(not_encoded) - reused
+        
+        return results
+    
+    def process_frame(self, frame):
+        """
+        Process a frame to detect and recognize faces.
+        
+        Args:
+            frame (numpy.ndarray): Frame to process
+            
+        Returns:
+            dict: Detection result with name, confidence, and face location
+        """
+        return self.process_frames([frame])[0]
+    
+    def handle_detection(self, detection_result, camera_type, frame=None):
+        """
+        Mark attendance for a detection result if it is confident enough.
+        
+        Results reused from a face track are never marked: the track follows a
+        box, and a different child stepping into the same spot would inherit
+        the previous child's identity until the track is re-verified.
+        
+        Args:
+            detection_result (dict): Result of process_frame (may be None)
+            camera_type (str): Type of camera ('entry' or 'exit')
+            frame (numpy.ndarray, optional): Frame the result came from, kept as evidence
+        """
+        if (detection_result and detection_result["name"] and not detection_result.get("reused")
+                and detection_result["confidence"] >= self.confidence_threshold):
+            marked = self.mark_entry_exit(
+                detection_result["name"],
+                camera_type,
+                frame=frame,
+                face_location=detection_result.get("location")
+            )
+            
+            # Replace today's evidence when a better frame of an already marked person arrives
+            if not marked and detection_result.get("best_frame") and self.evidence_store and frame is not None:
+                key = self.evidence_store.record_key(
+                    detection_result["name"], datetime.now().strftime("%Y-%m-%d"), camera_type
+                )
+                if self.evidence_store.get(key):
+                    self.evidence_store.capture(key, frame, detection_result["location"])
+    
+    def to_api_result(self, detection_result, camera_type):
+        """
+        Convert a detection result to the JSON structure returned by the API.
+        
+        Args:
+            detection_result (dict): Result of process_frame (may be None)
+            camera_type (str): Type of camera ('entry' or 'exit')
+            
+        Returns:
+            dict: API detection result
+        """
+        if detection_result is None:
+            return {
+                "camera_type": camera_type,
+                "face_detected": False,
+                "name": None,
+                "confidence": 0.0,
+                "location": None,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
         
-        # Return detection result
         return {
-            "name": name,
-            "confidence": float(confidence),
-            "location": face_location,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "camera_type": camera_type,
+            "face_detected": True,
+            "name": detection_result["name"],
+            "confidence": detection_result["confidence"],
+            "location": list(detection_result["location"]),
+            "quality": detection_result.get("quality"),
+            "timestamp": detection_result["timestamp"]
         }
     
+    def get_api_detection_result(self, frame, camera_type):
+        """
+        Detect faces in a frame, mark attendance and build the API result.
+        
+        Args:
+            frame (numpy.ndarray): Frame to process
+            camera_type (str): Type of camera ('entry' or 'exit')
+            
+        Returns:
+            dict: API detection result
+        """
+        detection_result = self.process_frames([frame], [camera_type])[0]
+        self.handle_detection(detection_result, camera_type, frame)
+        return self.to_api_result(detection_result, camera_type)
+    
+    def get_quality_stats(self):
+        """Get how many faces were encoded, skipped for low quality or reused from a track."""
+        with self.quality_stats_lock:
+            return dict(self.quality_stats)
+    
     def get_last_detection(self):
         """Get the last detection result."""
         return self.last_detection_result
     
-    def get_annotated_frame(self):
-        """Get the last frame with annotation overlays."""
-        if self.last_frame is None:
-            return None
-        
-        frame = self.last_frame.copy()
-        
-        # If we have a detection result, draw it on the frame
-        if self.last_detection_result and "location" in self.last_detection_result:
-            top, right, bottom, left = self.last_detection_result["location"]
-            name = self.last_detection_result["name"] or "Unknown"
-            confidence = self.last_detection_result["confidence"]
+    @property
+    def last_frame(self):
+        """Copy of the last captured frame (None before the first frame)."""
+        with self.frame_bus.hold(self.camera_name) as held:
+            return held.copy()
+    
+    def _get_encoded_frame(self):
+        """Get the (annotated frame, JPEG) of the last frame, rendered once per frame."""
+        with self.frame_bus.hold(self.camera_name) as held:
+            if held.frame is None:
+                return None, None
             
-            # Draw face rectangle
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+            # Read the seq before the result, so a key never comes with an older result
+            detection_seq = self.last_detection_seq
+            detection_result = self.last_detection_result
             
-            # Draw name label
-            label = f"{name} ({confidence:.2f})"
-            cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
-            cv2.putText(frame, label, (left + 6, bottom - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        # Draw camera information
-        camera_info = f"Camera: {self.camera_name}"
-        cv2.putText(frame, camera_info, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-        
-        # Draw timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cv2.putText(frame, timestamp, (10, frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            def render():
+                # Drawing needs a private copy; the ring slot is shared with other readers
+                frame = held.copy()
+                return annotate_frame(frame, detection_result, self.camera_name) if frame is not None else None
+            
+            with tracer.span("encode_jpeg", camera=self.camera_name):
+                # Sequence numbers are never reused, unlike id() of a collected result
+                return self.encoded_frames.get(self.camera_name, (held.seq, detection_seq), render)
+    
+    def get_annotated_frame(self):
+        """
+        Get the last frame with annotation overlays.
         
-        return frame
+        The frame is shared with other callers until the next frame and must not be modified.
+        """
+        return self._get_encoded_frame()[0]
+    
+    def get_annotated_jpeg(self):
+        """Get the last annotated frame as JPEG bytes, encoded once for all callers."""
+        return self._get_encoded_frame()[1]
+
+
+def annotate_frame(frame, detection_result, camera_name):
+    """
+    Draw a detection result and camera information onto a frame (in place).
+    
+    Args:
+        frame (numpy.ndarray): Frame to draw on
+        detection_result (dict): Detection result with name, confidence and location
+        camera_name (str): Name of the camera
+        
+    Returns:
+        numpy.ndarray: The annotated frame
+    """
+    # If we have a detection result, draw it on the frame
+    if detection_result and detection_result.get("location"):
+        top, right, bottom, left = detection_result["location"]
+        name = detection_result["name"] or "Unknown"
+        confidence = detection_result["confidence"]
+        
+        # Draw face rectangle
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+        
+        # Draw name label
+        label = f"{name} ({confidence:.2f})"
+        cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
+        cv2.putText(frame, label, (left + 6, bottom - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    
+    # Draw camera information
+    camera_info = f"Camera: {camera_name}"
+    cv2.putText(frame, camera_info, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    
+    # Draw timestamp
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cv2.putText(frame, timestamp, (10, frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+    
+    return frame
 
 
 def main():
@@ -339,15 +768,69 @@ def main():
     parser.add_argument("-d", "--detection", type=str, default="hog",
                         choices=["hog", "cnn"],
                         help="Face detection model to use")
+    parser.add_argument("--host_config", type=str,
+                        help="Detection settings tuned for this host by autotune.py (overrides --detection)")
+    parser.add_argument("--no_quality_check", action="store_true",
+                        help="Encode every detected face, skipping the quality gate")
+    parser.add_argument("--gallery_mode", type=str, choices=["float16", "int8"],
+                        help="Scan a quantized gallery and re-rank the best candidates exactly")
+    parser.add_argument("--upload_url", type=str,
+                        help="Central bulk ingest endpoint for attendance marks (e.g. http://depot:5000/api/attendance/bulk)")
+    parser.add_argument("--outbox", type=str, default="attendance_outbox.db",
+                        help="Local database queuing marks until they are uploaded")
+    parser.add_argument("--trigger", type=str, action="append",
+                        help="Door/GPS trigger source enabling idle mode between stops "
+                             "(file:<path>, udp://<host>:<port> or an HTTP URL; repeatable)")
+    parser.add_argument("--stops", type=str,
+                        help="JSON list of stops {name, lat, lon} for GPS position triggers")
+    parser.add_argument("--idle_interval", type=float, default=2.0,
+                        help="Seconds between processed frames while idle between stops")
+    parser.add_argument("--linger", type=float, default=30.0,
+                        help="Seconds of full-rate recognition after doors close / the bus departs")
+    parser.add_argument("--evidence", type=str,
+                        help="Directory for evidence snapshots of each mark (disabled if omitted)")
+    parser.add_argument("--evidence_quota", type=int, default=500,
+                        help="Disk quota for evidence snapshots in MB")
     args = parser.parse_args()
     
-    # Create face detection system
+    # Optional evidence snapshots
+    evidence_store = None
+    if args.evidence:
+        evidence_store = EvidenceStore(args.evidence, quota_bytes=args.evidence_quota * 1024 * 1024)
+    
+    # Durable queue of marks, uploaded whenever the central server is reachable
+    outbox = None
+    if args.upload_url:
+        outbox = AttendanceOutbox(args.outbox, endpoint=args.upload_url)
+        outbox.start()
+    
+    # Full-rate recognition only around stops when door/GPS triggers are available
+    duty_cycle = None
+    trigger_sources = []
+    if args.trigger:
+        duty_cycle = DutyCycle(
+            linger=args.linger,
+            idle_interval=args.idle_interval,
+            stops=load_stops(args.stops) if args.stops else None
+        )
+        trigger_sources = [TriggerSource(spec, duty_cycle) for spec in args.trigger]
+        for source in trigger_sources:
+            source.start()
+    
+    # Create face detection system; settings tuned for this host override the defaults
+    settings = {"detection_method": args.detection}
+    settings.update(load_host_config(args.host_config))
     system = FaceDetectionSystem(
         encodings_file=args.encodings,
         attendance_file=args.attendance,
         camera_id=args.camera,
         camera_name=args.type,
-        detection_method=args.detection
+        evidence_store=evidence_store,
+        check_quality=not args.no_quality_check,
+        gallery_mode=args.gallery_mode,
+        outbox=outbox,
+        duty_cycle=duty_cycle,
+        **settings
     )
     
     # Start detection
@@ -373,6 +856,10 @@ def main():
     finally:
         # Stop detection and clean up
         system.stop_detection()
+        for source in trigger_sources:
+            source.stop()
+        if outbox:
+            outbox.stop()
         cv2.destroyAllWindows()
 
 
@@ -0,0 +1,440 @@
+import json
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+# Events that start full-rate recognition until the matching release event
+HOLD_EVENTS = {"door_open": "door", "arrive": "stop"}
+RELEASE_EVENTS = {"door_close": "door", "depart": "stop"}
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two GPS positions.
+
+    Args:
+        lat1, lon1 (float): First position in degrees
+        lat2, lon2 (float): Second position in degrees
+
+    Returns:
+        float: Distance in meters
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(a))
+
+def load_stops(stops_file):
+    """
+    Load bus stops for GPS geofencing.
+
+    Args:
+        stops_file (str): JSON list of {"name", "lat", "lon"}
+
+    Returns:
+        list: Stops
+    """
+    with open(stops_file, "r") as f:
+        return json.load(f)
+
+def parse_message(message):
+    """
+    Validate a trigger message.
+
+    Args:
+        message (dict or str): {"event": name}, {"at_stop": bool}, {"lat", "lon"} or a bare event name
+
+    Returns:
+        dict: The message as a dict
+
+    Raises:
+        ValueError: If the message is none of these
+    """
+    if isinstance(message, str):
+        message = {"event": message.strip()}
+    if not isinstance(message, dict) or not (
+            message.get("event") or "at_stop" in message or ("lat" in message and "lon" in message)):
+        raise ValueError(f"Unrecognized trigger message: {message}")
+    if not message.get("event") and "at_stop" not in message:
+        # Raises ValueError/TypeError for positions that aren't numbers
+        message = dict(message, lat=float(message["lat"]), lon=float(message["lon"]))
+    return message
+
+class DutyCycle:
+    """
+    Switches recognition between full rate around stops and a low-rate idle mode.
+
+    Trigger events come from the bus: "door_open"/"door_close" from the door
+    sensor, "arrive"/"depart" at stops, or raw GPS positions that are turned
+    into arrive/depart with a geofence around each stop. Recognition runs at
+    full rate while a door is open or the bus is at a stop, and for `linger`
+    seconds after the last one ends. Any other event (e.g. "motion") gives
+    `pulse` seconds of full rate. Otherwise the detection loop is idle and
+    processes one frame every `idle_interval` seconds, waking up immediately
+    when a trigger arrives.
+    """
+
+    def __init__(self, linger=30.0, pulse=60.0, idle_interval=2.0, stops=None, stop_radius=75.0):
+        """
+        Initialize the duty cycle (idle until the first trigger).
+
+        Args:
+            linger (float): Seconds of full rate after doors close / the bus departs
+            pulse (float): Seconds of full rate after any other event
+            idle_interval (float): Seconds between processed frames while idle
+            stops (list, optional): Stops {"name", "lat", "lon"} for GPS position events
+            stop_radius (float): Distance in meters within which the bus is at a stop
+        """
+        self.linger = linger
+        self.pulse = pulse
+        self.idle_interval = idle_interval
+        self.stops = stops or []
+        self.stop_radius = stop_radius
+
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.holds = set()
+        self.active_until = 0.0
+        self.current_stop = None
+
+        # Statistics
+        self.active = False
+        self.mode_since = time.time()
+        self.seconds = {"active": 0.0, "idle": 0.0}
+        self.triggers = 0
+        self.last_event = None
+
+    def handle(self, message, at=None):
+        """
+        Apply one trigger message.
+
+        Args:
+            message (dict or str): {"event": name}, {"at_stop": bool}, {"lat", "lon"}
+                or a bare event name
+            at (float, optional): Time the message was received (default: now)
+
+        Returns:
+            list: Events derived from the message
+        """
+        message = parse_message(message)
+        if message.get("event"):
+            events = [message["event"]]
+        elif "at_stop" in message:
+            events = self._stop_transition(bool(message["at_stop"]), message.get("stop"))
+        else:
+            stop = self._nearest_stop(float(message["lat"]), float(message["lon"]))
+            events = self._stop_transition(stop is not None, stop)
+
+        for event in events:
+            self.trigger(event, at)
+        return events
+
+    def _nearest_stop(self, lat, lon):
+        """Name of the stop within stop_radius of a position, or None."""
+        for stop in self.stops:
+            if distance_m(lat, lon, stop["lat"], stop["lon"]) <= self.stop_radius:
+                return stop.get("name", f"{stop['lat']},{stop['lon']}")
+        return None
+
+    def _stop_transition(self, at_stop, stop=None):
+        """Turn an at-stop state into arrive/depart events when it changes."""
+        with self.lock:
+            was_at_stop = "stop" in self.holds
+            self.current_stop = stop if at_stop else None
+        if at_stop and not was_at_stop:
+            return ["arrive"]
+        if not at_stop and was_at_stop:
+            return ["depart"]
+        return []
+
+    def trigger(self, event, at=None):
+        """
+        Apply a trigger event.
+
+        Args:
+            event (str): 'door_open', 'door_close', 'arrive', 'depart' or any other event for a pulse
+            at (float, optional): Time of the event (default: now)
+        """
+        now = time.time() if at is None else at
+        with self.lock:
+            if event in HOLD_EVENTS:
+                self.holds.add(HOLD_EVENTS[event])
+            elif event in RELEASE_EVENTS:
+                self.holds.discard(RELEASE_EVENTS[event])
+                self.active_until = max(self.active_until, now + self.linger)
+            else:
+                self.active_until = max(self.active_until, now + self.pulse)
+            self.triggers += 1
+            self.last_event = {"event": event, "time": now}
+        self.wake_event.set()
+
+    def is_active(self):
+        """
+        Check whether recognition should run at full rate.
+
+        Returns:
+            bool: True around stops, False while idle
+        """
+        now = time.time()
+        with self.lock:
+            active = bool(self.holds) or now < self.active_until
+            if active != self.active:
+                self.seconds["active" if self.active else "idle"] += now - self.mode_since
+                self.active = active
+                self.mode_since = now
+                print(f"[INFO] Recognition {'at full rate' if active else 'idle'}"
+                      + (f" ({self.last_event['event']})" if self.last_event else ""))
+        return active
+
+    def wait_idle(self):
+        """Wait one idle interval, returning early when a trigger arrives."""
+        self.wake_event.clear()
+        self.wake_event.wait(self.idle_interval)
+
+    def get_stats(self):
+        """
+        Get duty cycle statistics.
+
+        Returns:
+            dict: Current mode, time spent per mode, active fraction and triggers
+        """
+        active = self.is_active()
+        with self.lock:
+            seconds = dict(self.seconds)
+            seconds["active" if active else "idle"] += time.time() - self.mode_since
+            total = seconds["active"] + seconds["idle"]
+            return {
+                "mode": "active" if active else "idle",
+                "holds": sorted(self.holds),
+                "current_stop": self.current_stop,
+                "active_seconds": seconds["active"],
+                "idle_seconds": seconds["idle"],
+                "active_fraction": seconds["active"] / total if total else 0.0,
+                "triggers": self.triggers,
+                "last_event": self.last_event
+            }
+
+class SharedTriggerLog:
+    """
+    Trigger messages shared by the worker processes of one API deployment.
+
+    Any worker may receive a trigger (POST /api/trigger), but only the worker
+    holding the camera lease runs the cameras and their duty cycle. Messages
+    are therefore appended to the shared state, and the camera owner applies
+    the ones it has not seen yet to its duty cycle, in the order they arrived.
+    They are kept for `retention` seconds, so a worker taking over the
+    cameras rebuilds the door/stop state from them.
+    """
+
+    def __init__(self, state, duty_cycle, retention=3600.0, poll_interval=0.25):
+        """
+        Initialize the log.
+
+        Args:
+            state (SharedState): State shared by the workers
+            duty_cycle (DutyCycle): This worker's duty cycle (used while it owns the cameras)
+            retention (float): Seconds messages are kept
+            poll_interval (float): Minimum seconds between checks for new messages
+        """
+        self.state = state
+        self.duty_cycle = duty_cycle
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.applied = set()
+        self.last_poll = 0.0
+        self.last_prune = 0.0
+
+    def handle(self, message):
+        """
+        Append a trigger message for the camera owner (same interface as DutyCycle.handle).
+
+        Args:
+            message (dict or str): Trigger message
+
+        Returns:
+            list: Always empty; the owner derives the events when it applies the message
+
+        Raises:
+            ValueError: If the message is malformed
+        """
+        message = parse_message(message)
+        now = time.time()
+        # Fixed-width time first, so keys sort in arrival order
+        self.state.set(f"trigger/{now:017.6f}/{uuid.uuid4().hex[:8]}", {"message": message, "time": now})
+        return []
+
+    def poll(self, force=False):
+        """
+        Apply messages this worker has not applied yet (camera owner only).
+
+        Args:
+            force (bool): Check even if the last check was less than poll_interval ago
+
+        Returns:
+            list: Events derived from the applied messages
+        """
+        with self.lock:
+            now = time.time()
+            if not force and now - self.last_poll < self.poll_interval:
+                return []
+            self.last_poll = now
+
+            if now - self.last_prune > 60.0:
+                self.state.prune("trigger/", self.retention)
+                self.last_prune = now
+
+            logged = self.state.scan("trigger/")
+            events = []
+            for key in sorted(logged):
+                if key in self.applied:
+                    continue
+                self.applied.add(key)
+                try:
+                    events += self.duty_cycle.handle(logged[key]["message"], at=logged[key]["time"])
+                except (ValueError, TypeError, KeyError) as e:
+                    print(f"[WARNING] Ignoring trigger message {logged[key]!r}: {e}")
+            self.applied &= set(logged)
+            return events
+
+    def wait_idle(self):
+        """Wait one idle interval, returning early when a trigger arrives from any worker."""
+        self.duty_cycle.wake_event.clear()
+        deadline = time.time() + self.duty_cycle.idle_interval
+        while time.time() < deadline:
+            if self.poll() or self.duty_cycle.wake_event.wait(min(self.poll_interval, deadline - time.time())):
+                return
+
+class TriggerSource:
+    """
+    Background reader feeding trigger messages into a duty cycle.
+
+    Sources are given as a spec:
+    - "file:<path>": follow a file that another process appends messages to, one per line
+    - "udp://<host>:<port>": receive one message per datagram
+    - "http(s)://...": poll a URL that returns the current message (e.g. {"at_stop": true}
+      or a GPS position) every poll_interval seconds
+
+    Messages are JSON objects (see DutyCycle.handle) or bare event names.
+    The receiver is a DutyCycle or a SharedTriggerLog.
+    """
+
+    def __init__(self, spec, duty_cycle, poll_interval=1.0):
+        """
+        Initialize the source.
+
+        Args:
+            spec (str): Source spec (see class docstring)
+            duty_cycle (DutyCycle or SharedTriggerLog): Receiver of the messages
+            poll_interval (float): Seconds between file checks / HTTP polls
+        """
+        self.spec = spec
+        self.duty_cycle = duty_cycle
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.errors = 0
+
+        if spec.startswith("file:"):
+            self.target = self._follow_file
+        elif spec.startswith("udp://"):
+            self.target = self._receive_udp
+        elif spec.startswith(("http://", "https://")):
+            self.target = self._poll_http
+        else:
+            raise ValueError(f"Unknown trigger source '{spec}' (use file:<path>, udp://<host>:<port> or an HTTP URL)")
+
+    def _handle(self, raw):
+        """Parse and apply one raw message, counting malformed ones."""
+        raw = raw.strip()
+        if not raw:
+            return
+        try:
+            message = json.loads(raw) if raw.startswith("{") else raw
+            self.duty_cycle.handle(message)
+        except (ValueError, TypeError, KeyError) as e:
+            self.errors += 1
+            print(f"[WARNING] Ignoring trigger message {raw[:80]!r}: {e}")
+
+    def _follow_file(self):
+        """Follow a file like tail -f, starting at its current end (re-read from the start if rotated)."""
+        path = self.spec[len("file:"):]
+        f = None
+        while not self.stop_event.is_set():
+            try:
+                if f is None:
+                    f = open(path, "rb")
+                    f.seek(0, os.SEEK_END)
+                line = f.readline()
+                if line.endswith(b"\n"):
+                    self._handle(line.decode("utf-8", errors="replace"))
+                    continue
+
+                # Incomplete line: read it again once the writer finished it
+                f.seek(-len(line), os.SEEK_CUR)
+                stat = os.stat(path)
+                if stat.st_ino != os.fstat(f.fileno()).st_ino or stat.st_size < f.tell():
+                    f.close()
+                    f = open(path, "rb")
+            except OSError:
+                if f:
+                    f.close()
+                f = None
+            self.stop_event.wait(self.poll_interval)
+        if f:
+            f.close()
+
+    def _receive_udp(self):
+        """Receive messages as UDP datagrams."""
+        address = urlparse(self.spec)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        while True:
+            try:
+                sock.bind((address.hostname or "0.0.0.0", address.port))
+                break
+            except OSError as e:
+                # e.g. the port is still held by the previous owner of the cameras; try again
+                self.errors += 1
+                print(f"[WARNING] Could not listen on {self.spec}: {e}, retrying")
+                if self.stop_event.wait(5.0):
+                    sock.close()
+                    return
+        sock.settimeout(0.5)
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    data, _ = sock.recvfrom(65536)
+                except socket.timeout:
+                    continue
+                for line in data.decode("utf-8", errors="replace").splitlines():
+                    self._handle(line)
+        finally:
+            sock.close()
+
+    def _poll_http(self):
+        """Poll an HTTP endpoint for the current message."""
+        while not self.stop_event.is_set():
+            try:
+                with urllib.request.urlopen(self.spec, timeout=max(1.0, self.poll_interval)) as response:
+                    self._handle(response.read().decode("utf-8"))
+            except (OSError, urllib.error.URLError):
+                self.errors += 1
+            self.stop_event.wait(self.poll_interval)
+
+    def start(self):
+        """Start reading in a background thread."""
+        self.thread = threading.Thread(target=self.target, name=f"trigger-{self.spec}", daemon=True)
+        self.thread.start()
+        print(f"[INFO] Listening for triggers on {self.spec}")
+
+    def stop(self):
+        """Stop reading."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=2.0)
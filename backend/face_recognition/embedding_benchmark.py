@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import resource
+import time
+import cv2
+import numpy as np
+# capture doesn't import face_recognition, so model loading is still measured in run_benchmark
+from capture import read_labeled_sample
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def stage_summary(times):
+    """Mean and p95 of stage latencies in milliseconds."""
+    if not times:
+        return {"mean_ms": None, "p95_ms": None}
+    return {"mean_ms": float(np.mean(times)), "p95_ms": float(np.percentile(times, 95))}
+
+def run_benchmark(samples, detection_method="hog", max_frame_size=640, upsample=1):
+    """
+    Run the dlib pipeline (resize, detect, encode the largest face) over labeled samples.
+
+    Args:
+        samples (list): (BGR image, person ID) pairs
+        detection_method (str): Face detection method ('hog' or 'cnn')
+        max_frame_size (int): Longest side frames are downscaled to before detection
+        upsample (int): Detector upsampling
+
+    Returns:
+        dict: Timings per stage, throughput, memory and one embedding (or None) per sample
+    """
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    import face_recognition
+
+    # Load the models with one dummy pass so load time isn't counted per image
+    blank = np.zeros((160, 160, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank, model=detection_method)
+    face_recognition.face_encodings(blank, [(20, 140, 140, 20)])
+    load_seconds = time.perf_counter() - start
+    model_rss_mb = peak_rss_mb() - rss_before
+
+    stages = {"prepare": [], "detect": [], "embed": [], "total": []}
+    embeddings = []
+    run_start = time.perf_counter()
+    for image, _ in samples:
+        t0 = time.perf_counter()
+        height, width = image.shape[:2]
+        ratio = max_frame_size / max(width, height)
+        small = cv2.resize(image, (0, 0), fx=ratio, fy=ratio) if ratio < 1 else image
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+
+        t1 = time.perf_counter()
+        locations = face_recognition.face_locations(
+            rgb, number_of_times_to_upsample=upsample, model=detection_method
+        )
+
+        t2 = time.perf_counter()
+        embedding = None
+        if locations:
+            largest = max(locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+            embedding = face_recognition.face_encodings(rgb, [largest])[0].tolist()
+        t3 = time.perf_counter()
+
+        stages["prepare"].append((t1 - t0) * 1000.0)
+        stages["detect"].append((t2 - t1) * 1000.0)
+        if embedding is not None:
+            stages["embed"].append((t3 - t2) * 1000.0)
+        stages["total"].append((t3 - t0) * 1000.0)
+        embeddings.append(embedding)
+    run_seconds = time.perf_counter() - run_start
+
+    return {
+        "engine": "dlib",
+        "settings": {"detection_method": detection_method, "max_frame_size": max_frame_size, "upsample": upsample},
+        "samples": len(samples),
+        "faces": sum(1 for embedding in embeddings if embedding is not None),
+        "load_seconds": load_seconds,
+        "stages": {name: stage_summary(times) for name, times in stages.items()},
+        "throughput_fps": len(samples) / run_seconds if run_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "model_rss_mb": model_rss_mb,
+        "match_threshold": 0.6,
+        "labels": [person_id for _, person_id in samples],
+        "embeddings": embeddings
+    }
+
+def main():
+    """Main function to benchmark the dlib stack on a labeled set (used by compare_engines.py)."""
+    parser = argparse.ArgumentParser(description="Benchmark the dlib face_recognition pipeline")
+    parser.add_argument("--labels", required=True,
+                        help="Labeled set: one directory per person ID with images or videos")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Where to write the results (JSON)")
+    parser.add_argument("-d", "--detection", type=str, default="hog", choices=["hog", "cnn"],
+                        help="Face detection model to use")
+    parser.add_argument("--max_frame_size", type=int, default=640,
+                        help="Longest side frames are downscaled to before detection")
+    parser.add_argument("--video_stride", type=int, default=10,
+                        help="Use every n-th frame of videos")
+    args = parser.parse_args()
+
+    samples = read_labeled_sample(args.labels, video_stride=args.video_stride)
+    print(f"[INFO] dlib: benchmarking {len(samples)} labeled samples")
+    results = run_benchmark(samples, args.detection, args.max_frame_size)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f)
+
+
+if __name__ == "__main__":
+    main()
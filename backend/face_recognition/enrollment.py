@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Job states after which nothing changes any more
+FINISHED_STATES = ("completed", "cancelled", "failed", "interrupted")
+
+def clean_relative_path(name):
+    """
+    Normalize the path of an uploaded file or zip member.
+
+    Args:
+        name (str): Path as sent by the client (e.g. 'class_3a/alice/1.jpg')
+
+    Returns:
+        str: Safe relative path, or None for non-images, hidden files and paths escaping the job directory
+    """
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or any(part == ".." or part.startswith(".") or part == "__MACOSX" for part in parts):
+        return None
+    if os.path.splitext(parts[-1])[1].lower() not in IMAGE_EXTENSIONS:
+        return None
+    return os.path.join(*parts)
+
+def extract_zip(zip_file, images_dir, max_bytes):
+    """
+    Extract the images of an uploaded zip file.
+
+    Args:
+        zip_file (str): Path to the zip file
+        images_dir (str): Directory to extract into
+        max_bytes (int): Maximum total uncompressed size
+
+    Returns:
+        int: Number of images extracted
+    """
+    with zipfile.ZipFile(zip_file) as archive:
+        members = [(member, clean_relative_path(member.filename))
+                   for member in archive.infolist() if not member.is_dir()]
+        members = [(member, path) for member, path in members if path]
+        if sum(member.file_size for member, _ in members) > max_bytes:
+            raise ValueError(f"Zip file expands to more than {max_bytes // (1024 * 1024)} MB")
+
+        for member, path in members:
+            target = os.path.join(images_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.open(member) as source, open(target, "wb") as f:
+                shutil.copyfileobj(source, f)
+    return len(members)
+
+def has_subdirectories(path):
+    """Whether a path is a directory containing directories."""
+    return os.path.isdir(path) and any(entry.is_dir() for entry in os.scandir(path))
+
+def list_images(images_dir):
+    """
+    List the images of an enrollment set with their person IDs.
+
+    Images in a sub-directory belong to the person the directory is named
+    after (<person_id>/<image>); images at the top level are named after the
+    person (<person_id>.jpg), as for utils.py. A single directory holding
+    the person directories (e.g. a zipped folder) is skipped.
+
+    Args:
+        images_dir (str): Directory with the images
+
+    Returns:
+        list: (image path, person ID) pairs
+    """
+    entries = sorted(os.listdir(images_dir))
+    if len(entries) == 1 and has_subdirectories(os.path.join(images_dir, entries[0])):
+        return list_images(os.path.join(images_dir, entries[0]))
+
+    images = []
+    for entry in entries:
+        path = os.path.join(images_dir, entry)
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                images.extend((os.path.join(root, f), entry) for f in sorted(files)
+                              if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+        elif os.path.splitext(entry)[1].lower() in IMAGE_EXTENSIONS:
+            images.append((path, os.path.splitext(entry)[0]))
+    return images
+
+def encode_image(path, detection_method="hog", max_image_size=1024):
+    """
+    Encode the largest face of an enrollment photo (runs in a pool process).
+
+    Args:
+        path (str): Image file
+        detection_method (str): Face detection method ('hog' or 'cnn')
+        max_image_size (int): Longest side photos are downscaled to before detection
+
+    Returns:
+        dict: Encoding (or None), number of faces found and error message (or None)
+    """
+    import face_recognition
+
+    image = cv2.imread(path)
+    if image is None:
+        return {"encoding": None, "faces": 0, "error": "Unreadable image"}
+
+    height, width = image.shape[:2]
+    ratio = max_image_size / max(width, height)
+    if ratio < 1:
+        image = cv2.resize(image, (0, 0), fx=ratio, fy=ratio)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    boxes = face_recognition.face_locations(rgb, model=detection_method)
+    if not boxes:
+        return {"encoding": None, "faces": 0, "error": "No face found"}
+
+    # Group photos: enroll the most prominent face
+    largest = max(boxes, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+    encoding = face_recognition.face_encodings(rgb, [largest])[0]
+    return {"encoding": encoding.tolist(), "faces": len(boxes), "error": None}
+
+def encode_directory(images_dir, results_file, workers=2, detection_method="hog", max_image_size=1024):
+    """
+    Encode an enrollment set with a process pool, writing one JSON line per image as it completes.
+
+    The first line holds the total number of images, so a reader of the
+    results file can report progress and use partial results.
+
+    Args:
+        images_dir (str): Directory with the images (see list_images)
+        results_file (str): JSON lines file to write
+        workers (int): Pool processes
+        detection_method (str): Face detection method ('hog' or 'cnn')
+        max_image_size (int): Longest side photos are downscaled to before detection
+    """
+    images = list_images(images_dir)
+    with open(results_file, "w", buffering=1) as f:
+        f.write(json.dumps({"total": len(images)}) + "\n")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(encode_image, path, detection_method, max_image_size): (path, person_id)
+                for path, person_id in images
+            }
+            for future in as_completed(futures):
+                path, person_id = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"encoding": None, "faces": 0, "error": str(e)}
+                result.update(file=os.path.relpath(path, images_dir), person_id=person_id)
+                f.write(json.dumps(result) + "\n")
+
+class EnrollmentJobs:
+    """
+    Bulk enrollment jobs running outside the HTTP request.
+
+    Each job stores its upload (a zip file or a set of photos) in its own
+    directory and encodes it in a child process running encode_directory, so
+    a large enrollment neither times out a request nor competes with the
+    server's threads for the GIL. The job thread follows the results file for
+    progress and partial results, and kills the child's process group on
+    cancel. When all photos are processed the new templates are merged into
+    the live gallery and the encodings file.
+
+    Job status and cancel requests live in the shared state, so any API
+    worker can report or cancel a job; other workers reload the gallery when
+    its version changes (see sync_gallery).
+    """
+
+    def __init__(self, system, state, jobs_dir="enrollment", workers=2, max_upload_bytes=500 * 1024 * 1024,
+                 max_image_size=1024):
+        """
+        Initialize the job manager.
+
+        Args:
+            system (FaceDetectionSystem): Detection system whose gallery receives the templates
+            state (SharedState): State shared with the other API workers
+            jobs_dir (str): Directory for uploads and results of each job
+            workers (int): Pool processes encoding the photos of a job
+            max_upload_bytes (int): Maximum uncompressed size of an uploaded zip file
+            max_image_size (int): Longest side photos are downscaled to before detection
+        """
+        self.system = system
+        self.state = state
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.max_upload_bytes = max_upload_bytes
+        self.max_image_size = max_image_size
+        self.gallery_version = state.get("gallery/version")
+
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def create(self, files):
+        """
+        Store an upload and start a job encoding it.
+
+        Args:
+            files (list): (file name, binary stream) pairs: one zip file, or photos whose
+                names may include a <person_id>/ directory
+
+        Returns:
+            dict: Job status
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.abspath(os.path.join(self.jobs_dir, job_id))
+        images_dir = os.path.join(job_dir, "images")
+        os.makedirs(images_dir)
+
+        zip_file = None
+        saved = 0
+        try:
+            for name, stream in files:
+                if len(files) == 1 and name.lower().endswith(".zip"):
+                    zip_file = os.path.join(job_dir, "upload.zip")
+                    target = zip_file
+                else:
+                    path = clean_relative_path(name)
+                    if path is None:
+                        continue
+                    target = os.path.join(images_dir, path)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    shutil.copyfileobj(stream, f)
+                saved += 1
+            if not saved:
+                raise ValueError("No photos or zip file in the upload")
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        job = {
+            "job_id": job_id,
+            "state": "queued",
+            "worker": self.state.worker_id,
+            "created": time.time(),
+            "total": None,
+            "processed": 0,
+            "templates": 0,
+            "people": {},
+            "failures": [],
+            "failed": 0,
+            "merged": False,
+            "error": None
+        }
+        self._publish(job)
+        self.state.prune("enroll/", 7 * 24 * 3600)
+        threading.Thread(target=self._run, args=(job, job_dir, zip_file), name=f"enroll-{job_id}", daemon=True).start()
+        return job
+
+    def _publish(self, job):
+        """Store a job's status in the shared state."""
+        job["updated"] = time.time()
+        self.state.set(f"enroll/{job['job_id']}", job)
+
+    def _run(self, job, job_dir, zip_file):
+        """Job thread: extract, encode in a child process, follow its results and merge them."""
+        images_dir = os.path.join(job_dir, "images")
+        results_file = os.path.join(job_dir, "results.jsonl")
+        encodings, names = [], []
+
+        try:
+            if zip_file:
+                job["state"] = "extracting"
+                self._publish(job)
+                extract_zip(zip_file, images_dir, self.max_upload_bytes)
+                os.remove(zip_file)
+
+            job["state"] = "running"
+            self._publish(job)
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(HERE, "enrollment.py"),
+                 "-i", images_dir, "-o", results_file, "-w", str(self.workers),
+                 "-d", self.system.detection_method, "--max_image_size", str(self.max_image_size)],
+                cwd=HERE,
+                # Own process group, so cancelling also stops the pool processes
+                start_new_session=True
+            )
+
+            offset = 0
+            last_publish = 0.0
+            while True:
+                finished = process.poll() is not None
+                offset = self._read_results(job, results_file, offset, encodings, names)
+
+                if not finished and self.state.get(f"enroll_cancel/{job['job_id']}"):
+                    os.killpg(process.pid, signal.SIGTERM)
+                    process.wait()
+                    job["state"] = "cancelled"
+                    break
+                if finished:
+                    if process.returncode != 0:
+                        raise RuntimeError(f"Encoding process exited with code {process.returncode}")
+                    job["state"] = "merging"
+                    break
+
+                # Progress at most twice a second, and a heartbeat showing the job is alive
+                if time.time() - last_publish > 0.5:
+                    self._publish(job)
+                    last_publish = time.time()
+                time.sleep(0.2)
+
+            if job["state"] == "merging":
+                self._publish(job)
+                if names:
+                    self.system.add_templates(encodings, names)
+                    self.gallery_version = uuid.uuid4().hex
+                    self.state.set("gallery/version", self.gallery_version)
+                job["merged"] = True
+                job["state"] = "completed"
+        except Exception as e:
+            print(f"[ERROR] Enrollment job {job['job_id']} failed: {e}")
+            job["state"] = "failed"
+            job["error"] = str(e)
+        finally:
+            # Keep the results (templates and failures), not the uploaded photos
+            shutil.rmtree(images_dir, ignore_errors=True)
+            if zip_file and os.path.exists(zip_file):
+                os.remove(zip_file)
+            self.state.set(f"enroll_cancel/{job['job_id']}", None)
+            self._publish(job)
+
+        print(f"[INFO] Enrollment job {job['job_id']} {job['state']}: {job['processed']}/{job['total']} photos, "
+              f"{job['templates']} templates, {job['failed']} failed")
+
+    @staticmethod
+    def _read_results(job, results_file, offset, encodings, names):
+        """Apply the complete lines written to the results file since offset; returns the new offset."""
+        if not os.path.exists(results_file):
+            return offset
+        with open(results_file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                # Stop at a partially written last line
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                result = json.loads(line)
+                if "total" in result:
+                    job["total"] = result["total"]
+                    continue
+
+                job["processed"] += 1
+                if result["encoding"] is None:
+                    job["failed"] += 1
+                    # Enough failures to fix the photos, without growing the status without bound
+                    if len(job["failures"]) < 100:
+                        job["failures"].append({"file": result["file"], "error": result["error"]})
+                    continue
+                encodings.append(result["encoding"])
+                names.append(result["person_id"])
+                job["templates"] += 1
+                job["people"][result["person_id"]] = job["people"].get(result["person_id"], 0) + 1
+        return offset
+
+    def get(self, job_id):
+        """
+        Get a job's status (from any worker).
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            dict: Job status, or None if the job doesn't exist
+        """
+        job = self.state.get(f"enroll/{job_id}")
+        if job is not None and job["state"] not in FINISHED_STATES and time.time() - job["updated"] > 30:
+            # The worker running the job died
+            job["state"] = "interrupted"
+        return job
+
+    def list(self):
+        """
+        Get the status of all jobs.
+
+        Returns:
+            list: Job statuses, most recently updated first
+        """
+        jobs = [self.get(key.split("/", 1)[1]) for key in self.state.scan("enroll/")]
+        return [job for job in jobs if job is not None]
+
+    def cancel(self, job_id):
+        """
+        Ask the worker running a job to cancel it; photos encoded so far are not merged.
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            dict: Job status, or None if the job doesn't exist
+        """
+        job = self.get(job_id)
+        if job is not None and job["state"] not in FINISHED_STATES:
+            self.state.set(f"enroll_cancel/{job_id}", True)
+        return job
+
+    def sync_gallery(self):
+        """Reload the gallery if a job in another worker merged templates since the last check."""
+        version = self.state.get("gallery/version")
+        if version is not None and version != self.gallery_version:
+            self.system.reload_gallery()
+            # Only after a successful reload, so a failed one is retried on the next check
+            self.gallery_version = version
+
+    def get_stats(self):
+        """
+        Get job statistics.
+
+        Returns:
+            dict: Number of jobs per state
+        """
+        states = {}
+        for job in self.list():
+            states[job["state"]] = states.get(job["state"], 0) + 1
+        return states
+
+def main():
+    """Main function to encode an enrollment set (run by EnrollmentJobs in a child process)."""
+    parser = argparse.ArgumentParser(description="Encode an enrollment set with a process pool")
+    parser.add_argument("-i", "--images_dir", required=True,
+                        help="Directory with <person_id>/<image> or <person_id>.jpg photos")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Results file (one JSON line per photo)")
+    parser.add_argument("-w", "--workers", type=int, default=2,
+                        help="Pool processes")
+    parser.add_argument("-d", "--detection_method", type=str, default="hog", choices=["hog", "cnn"],
+                        help="Face detection model to use")
+    parser.add_argument("--max_image_size", type=int, default=1024,
+                        help="Longest side photos are downscaled to before detection")
+    args = parser.parse_args()
+
+    encode_directory(args.images_dir, args.output, args.workers, args.detection_method, args.max_image_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import cv2
+
+class EvidenceStore:
+    """
+    Size-bounded on-disk ring buffer of evidence snapshots for attendance marks.
+
+    For every mark a face crop and a downscaled frame thumbnail are stored as
+    JPEGs, indexed by record key (date, person and camera). capture() only
+    slices and resizes on the caller's thread; JPEG encoding, file writes and
+    eviction run on a background thread. Once the total size exceeds the disk
+    quota, the oldest snapshots are deleted.
+    """
+
+    def __init__(self, directory="evidence", quota_bytes=500 * 1024 * 1024,
+                 thumbnail_width=320, jpeg_quality=85, max_pending=64):
+        """
+        Initialize the evidence store and start the writer thread.
+
+        Args:
+            directory (str): Directory for snapshots and the index
+            quota_bytes (int): Maximum total size of stored snapshots
+            thumbnail_width (int): Width of the frame thumbnail in pixels
+            jpeg_quality (int): JPEG quality (0-100)
+            max_pending (int): Snapshots waiting to be written before new ones are dropped
+        """
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        self.quota_bytes = quota_bytes
+        self.thumbnail_width = thumbnail_width
+        self.jpeg_quality = jpeg_quality
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.index = self._load_index()
+        self.total_bytes = sum(entry["bytes"] for entry in self.index.values())
+
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="evidence-writer", daemon=True)
+        self.writer_thread.start()
+
+    @staticmethod
+    def record_key(person_id, date_str, camera_type):
+        """
+        Build the key identifying the evidence of one attendance mark.
+
+        Args:
+            person_id (str): ID of the person
+            date_str (str): Date of the mark (YYYY-MM-DD)
+            camera_type (str): Type of camera ('entry' or 'exit')
+
+        Returns:
+            str: Record key
+        """
+        return f"{date_str}_{person_id}_{camera_type}"
+
+    def _load_index(self):
+        """Load the index, oldest entry first."""
+        if not os.path.exists(self.index_file):
+            return OrderedDict()
+        try:
+            with open(self.index_file, "r") as f:
+                entries = json.load(f)
+        except json.JSONDecodeError:
+            print(f"[WARNING] Evidence index {self.index_file} is corrupt, starting empty")
+            return OrderedDict()
+        return OrderedDict(sorted(entries.items(), key=lambda item: item[1]["timestamp"]))
+
+    def _save_index(self):
+        """Write the index atomically."""
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_file, self.index_file)
+
+    def capture(self, key, frame, face_location=None):
+        """
+        Queue evidence for an attendance mark without blocking on disk or encoding.
+
+        Args:
+            key (str): Record key (see record_key)
+            frame (numpy.ndarray): BGR frame in which the person was recognized
+            face_location (tuple, optional): (top, right, bottom, left) of the face
+
+        Returns:
+            bool: False if the writer is backlogged and the snapshot was dropped
+        """
+        # Slicing/resizing creates new arrays, so the caller may reuse the frame
+        face_crop = None
+        if face_location is not None:
+            top, right, bottom, left = face_location
+            top, left = max(0, top), max(0, left)
+            face_crop = frame[top:bottom, left:right].copy()
+
+        height, width = frame.shape[:2]
+        ratio = min(1.0, self.thumbnail_width / width)
+        thumbnail = cv2.resize(frame, (int(width * ratio), int(height * ratio)), interpolation=cv2.INTER_AREA)
+
+        try:
+            self.pending.put_nowait((key, face_crop, thumbnail, datetime.now().isoformat()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _write_jpeg(self, path, image):
+        """Encode an image as JPEG and write it, returning the number of bytes."""
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return 0
+        with open(path, "wb") as f:
+            f.write(buffer.tobytes())
+        return len(buffer)
+
+    def _delete_files(self, entry):
+        """Delete the snapshot files of an index entry."""
+        for name in ("face", "frame"):
+            path = entry.get(name)
+            if path and os.path.exists(os.path.join(self.directory, path)):
+                os.remove(os.path.join(self.directory, path))
+
+    def _writer_loop(self):
+        """Background thread: encode, write and evict."""
+        while True:
+            key, face_crop, thumbnail, timestamp = self.pending.get()
+            try:
+                entry = {"timestamp": timestamp, "face": None, "frame": None, "bytes": 0}
+
+                if face_crop is not None and face_crop.size > 0:
+                    entry["face"] = f"{key}_face.jpg"
+                    entry["bytes"] += self._write_jpeg(os.path.join(self.directory, entry["face"]), face_crop)
+
+                entry["frame"] = f"{key}_frame.jpg"
+                entry["bytes"] += self._write_jpeg(os.path.join(self.directory, entry["frame"]), thumbnail)
+
+                with self.lock:
+                    # Replace older evidence for the same record
+                    previous = self.index.pop(key, None)
+                    if previous:
+                        self.total_bytes -= previous["bytes"]
+
+                    self.index[key] = entry
+                    self.total_bytes += entry["bytes"]
+
+                    # Evict the oldest snapshots once the quota is exceeded
+                    while self.total_bytes > self.quota_bytes and len(self.index) > 1:
+                        old_key, old_entry = self.index.popitem(last=False)
+                        self._delete_files(old_entry)
+                        self.total_bytes -= old_entry["bytes"]
+
+                    self._save_index()
+            except Exception as e:
+                print(f"[ERROR] Failed to store evidence for {key}: {e}")
+
+    def get(self, key):
+        """
+        Get the index entry of a record.
+
+        Args:
+            key (str): Record key
+
+        Returns:
+            dict: Entry with file names and timestamp, or None
+        """
+        with self.lock:
+            entry = self.index.get(key)
+            return dict(entry) if entry else None
+
+    def path(self, key, kind):
+        """
+        Get the full path of a stored snapshot.
+
+        Args:
+            key (str): Record key
+            kind (str): 'face' or 'frame'
+
+        Returns:
+            str: Path of the JPEG, or None if not stored
+        """
+        entry = self.get(key)
+        if not entry or kind not in ("face", "frame") or not entry.get(kind):
+            return None
+        return os.path.join(self.directory, entry[kind])
+
+    def get_stats(self):
+        """
+        Get store statistics.
+
+        Returns:
+            dict: Number of records, bytes used, quota, pending and dropped snapshots
+        """
+        with self.lock:
+            return {
+                "records": len(self.index),
+                "bytes": self.total_bytes,
+                "quota_bytes": self.quota_bytes,
+                "pending": self.pending.qsize(),
+                "dropped": self.dropped
+            }
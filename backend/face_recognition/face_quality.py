@@ -0,0 +1,225 @@
+import itertools
+import threading
+import time
+import cv2
+import numpy as np
+
+class QualityGate:
+    """
+    Cheap face quality check run before the (expensive) face encoding.
+
+    A face is scored on size, sharpness (variance of the Laplacian), exposure
+    and pose (yaw estimated from the nose position between the eyes, using the
+    5-point landmark model). Faces failing any hard threshold are not encoded.
+    The combined score in [0, 1] is used to pick the best frame of a person.
+    """
+
+    def __init__(self, min_size=40, min_sharpness=30.0, min_brightness=40, max_brightness=215,
+                 max_yaw=0.5, use_landmarks=True):
+        """
+        Initialize the quality gate.
+
+        Args:
+            min_size (int): Minimum face height/width in pixels (of the processed frame)
+            min_sharpness (float): Minimum Laplacian variance of the normalized face crop
+            min_brightness (float): Minimum mean brightness of the face (0-255)
+            max_brightness (float): Maximum mean brightness of the face (0-255)
+            max_yaw (float): Maximum yaw estimate (0 = frontal, 1 = full profile)
+            use_landmarks (bool): Estimate pose from landmarks (slightly more CPU)
+        """
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_yaw = max_yaw
+        self.use_landmarks = use_landmarks
+
+    def _estimate_yaw(self, rgb_frame, face_location):
+        """Yaw from the horizontal nose offset between the eye centres (0 frontal, 1 profile)."""
+        import face_recognition
+
+        landmarks = face_recognition.face_landmarks(rgb_frame, [face_location], model="small")
+        if not landmarks:
+            return None
+        points = landmarks[0]
+        nose_x = np.mean([x for x, _ in points["nose_tip"]])
+        left_x = np.mean([x for x, _ in points["left_eye"]])
+        right_x = np.mean([x for x, _ in points["right_eye"]])
+
+        left_distance = abs(nose_x - left_x)
+        right_distance = abs(right_x - nose_x)
+        total = left_distance + right_distance
+        return abs(left_distance - right_distance) / total if total > 0 else 1.0
+
+    def assess(self, rgb_frame, face_location):
+        """
+        Score the quality of a detected face.
+
+        Args:
+            rgb_frame (numpy.ndarray): RGB frame the face was detected in
+            face_location (tuple): (top, right, bottom, left) of the face
+
+        Returns:
+            dict: Overall score, whether the face passed, the reasons it failed and the raw measurements
+        """
+        top, right, bottom, left = face_location
+        height, width = rgb_frame.shape[:2]
+        crop = rgb_frame[max(0, top):min(height, bottom), max(0, left):min(width, right)]
+        size = min(crop.shape[:2]) if crop.size else 0
+
+        quality = {"score": 0.0, "passed": False, "reasons": [], "size": int(size),
+                   "sharpness": 0.0, "brightness": 0.0, "yaw": None}
+        if size < self.min_size:
+            quality["reasons"].append("too_small")
+            return quality
+
+        # Measure sharpness on a fixed-size crop so it doesn't depend on face size
+        gray = cv2.cvtColor(cv2.resize(crop, (96, 96), interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        brightness = float(gray.mean())
+        quality["sharpness"] = round(sharpness, 1)
+        quality["brightness"] = round(brightness, 1)
+
+        if sharpness < self.min_sharpness:
+            quality["reasons"].append("blurry")
+        if brightness < self.min_brightness:
+            quality["reasons"].append("underexposed")
+        elif brightness > self.max_brightness:
+            quality["reasons"].append("overexposed")
+
+        # Landmarks only for faces that passed the cheaper checks
+        yaw = 0.0
+        if self.use_landmarks and not quality["reasons"]:
+            yaw = self._estimate_yaw(rgb_frame, face_location)
+            if yaw is None:
+                quality["reasons"].append("no_landmarks")
+                yaw = 1.0
+            elif yaw > self.max_yaw:
+                quality["reasons"].append("side_on")
+            quality["yaw"] = round(float(yaw), 3)
+
+        # Geometric mean of the normalized components
+        components = [
+            min(1.0, size / (2.0 * self.min_size)),
+            min(1.0, sharpness / (4.0 * self.min_sharpness)),
+            1.0 - min(1.0, abs(brightness - 128.0) / 128.0),
+            1.0 - min(1.0, yaw)
+        ]
+        quality["score"] = round(float(np.prod(components) ** (1.0 / len(components))), 3)
+        quality["passed"] = not quality["reasons"]
+        return quality
+
+def box_iou(a, b):
+    """
+    Intersection over union of two (top, right, bottom, left) boxes.
+
+    Args:
+        a (tuple): First box
+        b (tuple): Second box
+
+    Returns:
+        float: IoU in [0, 1]
+    """
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+class FaceTracker:
+    """
+    Follows faces across consecutive frames of a camera by box overlap.
+
+    Each track remembers the recognition result of its best-quality frame, so
+    a person standing in front of the camera is only re-encoded when a
+    noticeably better frame comes along (or the result gets old), and
+    low-quality frames reuse the best result instead of producing their own.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=1.0, min_gain=0.05, max_reuse=3.0, clock=time.monotonic):
+        """
+        Initialize the tracker.
+
+        Args:
+            iou_threshold (float): Minimum box overlap to continue a track
+            max_age (float): Seconds without a detection before a track is dropped
+            min_gain (float): Quality improvement needed to encode the person again
+            max_reuse (float): Seconds a track's result is reused before re-verifying
+            clock (callable): Time source in seconds
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_gain = min_gain
+        self.max_reuse = max_reuse
+        self.clock = clock
+        self.tracks = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def update(self, camera, face_location):
+        """
+        Find or start the track of a face detected on a camera.
+
+        Args:
+            camera (str): Camera name
+            face_location (tuple): (top, right, bottom, left) of the face
+
+        Returns:
+            dict: The track (id, box, best_score, result)
+        """
+        with self.lock:
+            now = self.clock()
+            tracks = [t for t in self.tracks.get(camera, []) if now - t["last_seen"] <= self.max_age]
+
+            track = max(tracks, key=lambda t: box_iou(t["box"], face_location), default=None)
+            if track is None or box_iou(track["box"], face_location) < self.iou_threshold:
+                track = {"id": next(self.ids), "best_score": -1.0, "result": None, "result_time": None}
+                tracks.append(track)
+
+            track["box"] = face_location
+            track["last_seen"] = now
+            self.tracks[camera] = tracks
+            return track
+
+    def needs_encoding(self, track, quality):
+        """
+        Decide whether a face should be encoded or reuse its track's best result.
+
+        A face that failed the quality gate is neither encoded nor given the
+        track's result; callers check quality["passed"] first.
+
+        Args:
+            track (dict): Track of the face
+            quality (dict): Quality of the current frame (see QualityGate.assess)
+
+        Returns:
+            bool: True if the face should be encoded
+        """
+        if not quality["passed"]:
+            return False
+        if track["result"] is None or self.clock() - track["result_time"] > self.max_reuse:
+            return True
+        return quality["score"] >= track["best_score"] + self.min_gain
+
+    def remember(self, track, result, quality):
+        """
+        Store the recognition result of a newly encoded frame on a track.
+
+        Args:
+            track (dict): Track of the face
+            result (dict): Recognition result of the frame
+            quality (dict): Quality of the frame
+
+        Returns:
+            bool: True if this frame is the best one seen for the track
+        """
+        with self.lock:
+            now = self.clock()
+            improved = (track["result"] is not None and now - track["result_time"] <= self.max_reuse
+                        and quality["score"] > track["best_score"])
+            track["best_score"] = quality["score"]
+            track["result"] = result
+            track["result_time"] = now
+            return improved
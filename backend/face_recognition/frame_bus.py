@@ -0,0 +1,404 @@
+import threading
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+class FrameRing:
+    """
+    Ring of preallocated frame slots in shared memory for one camera.
+
+    The capture thread reads each frame straight into the next slot (no extra
+    copy) and commits it with an increasing sequence number. Inference, the
+    annotator and stream endpoints get read-only numpy views of a slot instead
+    of copies. Each slot carries the sequence number of the frame it holds, so
+    a reader can check with is_valid() that the writer has not lapped it while
+    it was using the view. Other processes can attach to the same ring by name.
+
+    Views point straight into the mapping, so every user of the ring (readers
+    and the capture side alike) brackets its use with hold() and release().
+    close() only unmaps once the last holder has released the ring.
+    """
+
+    def __init__(self, name, shape, slots=4, create=True):
+        """
+        Create or attach to a frame ring.
+
+        Args:
+            name (str): Shared memory name of the ring
+            shape (tuple): Frame shape (height, width, channels)
+            slots (int): Number of frame slots
+            create (bool): Create the ring (capture side) or attach to an existing one
+        """
+        self.name = name
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.frame_bytes = int(np.prod(self.shape))
+
+        # Header: per-slot sequence numbers followed by the latest committed sequence
+        header_bytes = 8 * (slots + 1)
+        size = header_bytes + slots * self.frame_bytes
+
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left over from a crashed process: replace it
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = create
+
+        self.header = np.ndarray((slots + 1,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray(
+            (slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes
+        )
+        if create:
+            self.header[:] = -1
+
+        self.next_seq = 0
+        self.lock = threading.Lock()
+        self.holders = 0
+        self.closed = False
+
+    @property
+    def latest_seq(self):
+        """Sequence number of the newest committed frame (-1 if none)."""
+        return int(self.header[self.slots])
+
+    def acquire(self):
+        """
+        Reserve the next slot for writing.
+
+        Returns:
+            tuple: (sequence number, writable view of the slot)
+        """
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+
+        slot = seq % self.slots
+        # Mark the slot as being written so readers treat it as invalid
+        self.header[slot] = -1
+        return seq, self.frames[slot]
+
+    def commit(self, seq):
+        """
+        Publish a written slot.
+
+        Args:
+            seq (int): Sequence number returned by acquire()
+        """
+        self.header[seq % self.slots] = seq
+        if seq > self.header[self.slots]:
+            self.header[self.slots] = seq
+
+    def write(self, frame):
+        """
+        Copy a frame into the next slot and publish it.
+
+        Args:
+            frame (numpy.ndarray): Frame with the ring's shape
+
+        Returns:
+            int: Sequence number of the frame
+        """
+        seq, slot = self.acquire()
+        np.copyto(slot, frame)
+        self.commit(seq)
+        return seq
+
+    def get(self, seq):
+        """
+        Get a read-only view of a frame by sequence number.
+
+        Args:
+            seq (int): Sequence number
+
+        Returns:
+            numpy.ndarray: Read-only view, or None if the frame was overwritten
+        """
+        if seq is None or seq < 0 or self.header[seq % self.slots] != seq:
+            return None
+        view = self.frames[seq % self.slots].view()
+        view.flags.writeable = False
+        return view
+
+    def latest(self):
+        """
+        Get the newest frame.
+
+        Returns:
+            tuple: (sequence number, read-only view) or (-1, None)
+        """
+        seq = self.latest_seq
+        return seq, self.get(seq)
+
+    def is_valid(self, seq):
+        """
+        Check that a frame has not been overwritten since it was read.
+
+        Args:
+            seq (int): Sequence number
+
+        Returns:
+            bool: True if the slot still holds this frame
+        """
+        return seq >= 0 and self.header[seq % self.slots] == seq
+
+    def hold(self):
+        """
+        Keep the ring mapped while using it or views of its slots.
+
+        Returns:
+            bool: False if the ring is already closed (nothing may be read or written)
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            self.holders += 1
+            return True
+
+    def release(self):
+        """Release a hold(); unmaps the ring if it was closed meanwhile and this was the last holder."""
+        with self.lock:
+            self.holders -= 1
+            if self.closed and self.holders == 0:
+                self._unmap()
+
+    def close(self):
+        """
+        Detach from the ring and remove it if this process created it.
+
+        The name is removed at once, so a new ring can take it, but the mapping
+        stays until every holder has released the ring.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.owner:
+                self.shm.unlink()
+            if self.holders == 0:
+                self._unmap()
+
+    def _unmap(self):
+        """Drop the numpy views and unmap the shared memory (no holders are left)."""
+        del self.header, self.frames
+        self.shm.close()
+
+class HeldFrame:
+    """
+    Read-only view of one ring slot, keeping the ring mapped until released.
+
+    Use it as a context manager. The writer may lap the slot while the view is
+    in use, so check is_valid() after using the frame (or after copying it)
+    before trusting the result.
+    """
+
+    def __init__(self, ring=None, seq=None):
+        """
+        Hold a frame of a ring.
+
+        Args:
+            ring (FrameRing, optional): Ring to read from (no frame if omitted or closed)
+            seq (int, optional): Sequence number, the newest frame if omitted
+        """
+        self.ring = ring if ring is not None and ring.hold() else None
+        self.seq = -1
+        self.frame = None
+        if self.ring is not None:
+            self.seq = self.ring.latest_seq if seq is None else seq
+            self.frame = self.ring.get(self.seq)
+
+    def is_valid(self):
+        """True if there is a frame and its slot was not overwritten since it was read."""
+        return self.frame is not None and self.ring.is_valid(self.seq)
+
+    def copy(self):
+        """
+        Get a private copy of the frame.
+
+        Returns:
+            numpy.ndarray: Copy, or None if there is no frame or it was overwritten while copying
+        """
+        if self.frame is None:
+            return None
+        frame = self.frame.copy()
+        return frame if self.is_valid() else None
+
+    def release(self):
+        """Stop using the frame; the view must not be used afterwards."""
+        if self.ring is not None:
+            self.frame = None
+            ring, self.ring = self.ring, None
+            ring.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class FrameBus:
+    """Frame rings of all cameras, created on each camera's first frame."""
+
+    def __init__(self, prefix="frames", slots=4):
+        """
+        Initialize the frame bus.
+
+        Args:
+            prefix (str): Prefix of the shared memory names
+            slots (int): Number of slots per camera ring
+        """
+        self.prefix = prefix
+        self.slots = slots
+        self.rings = {}
+        self.lock = threading.Lock()
+
+    def ring_name(self, camera):
+        """Shared memory name of a camera's ring."""
+        return f"{self.prefix}_{camera}"
+
+    def capture(self, camera, cap):
+        """
+        Read the next frame of a camera into its ring.
+
+        Args:
+            camera (str): Camera name
+            cap (cv2.VideoCapture or ResilientCapture): Opened capture
+
+        Returns:
+            tuple: (success, sequence number or None)
+        """
+        ring = self.rings.get(camera)
+        if ring is None or not ring.hold():
+            # The first frame (or the first after close()) tells us the shape of the slots
+            ret, frame = cap.read()
+            if not ret:
+                return False, None
+            return True, self._replace_ring(camera, frame)
+
+        try:
+            # Decode straight into the next slot
+            seq, slot = ring.acquire()
+            ret, frame = cap.read(slot)
+            if not ret or frame is None:
+                return False, None
+
+            if frame.shape != ring.shape:
+                # Resolution changed (e.g. camera reconnected with other settings)
+                return True, self._replace_ring(camera, frame)
+
+            # Some backends ignore the output buffer; fall back to one copy
+            if frame.ctypes.data != slot.ctypes.data:
+                np.copyto(slot, frame)
+            ring.commit(seq)
+            return True, seq
+        finally:
+            ring.release()
+
+    def _replace_ring(self, camera, frame):
+        """Close a camera's ring (readers keep it until they release it) and start one shaped like frame."""
+        with self.lock:
+            old = self.rings.get(camera)
+            if old is not None:
+                old.close()
+            ring = FrameRing(self.ring_name(camera), frame.shape, self.slots)
+            self.rings[camera] = ring
+            return ring.write(frame)
+
+    def hold(self, camera, seq=None):
+        """
+        Hold a frame of a camera; the ring stays mapped until the frame is released.
+
+        Args:
+            camera (str): Camera name
+            seq (int, optional): Sequence number, the newest frame if omitted
+
+        Returns:
+            HeldFrame: Held frame (its frame is None if there is none or it was overwritten)
+        """
+        return HeldFrame(self.rings.get(camera), seq)
+
+    def close(self, camera=None):
+        """
+        Release the rings of one or all cameras.
+
+        Args:
+            camera (str, optional): Camera name, all cameras if omitted
+        """
+        with self.lock:
+            names = [camera] if camera else list(self.rings)
+            for name in names:
+                ring = self.rings.pop(name, None)
+                if ring:
+                    ring.close()
+
+class EncodedFrameCache:
+    """
+    Annotated frame and its JPEG, rendered once per processed frame.
+
+    Viewers ask for a camera's frame together with a key identifying the
+    processed frame (e.g. its sequence number). The first caller for a new key
+    renders and encodes it; everyone else gets the cached bytes until the key
+    changes, so additional viewers cost almost no CPU.
+    """
+
+    def __init__(self, jpeg_quality=80):
+        """
+        Initialize the cache.
+
+        Args:
+            jpeg_quality (int): JPEG quality (0-100)
+        """
+        self.jpeg_quality = jpeg_quality
+        self.entries = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.renders = 0
+        self.hits = 0
+
+    def _camera_lock(self, camera):
+        with self.lock:
+            return self.locks.setdefault(camera, threading.Lock())
+
+    def get(self, camera, key, render):
+        """
+        Get the annotated frame and JPEG of a camera, rendering them if the key changed.
+
+        Args:
+            camera (str): Camera name
+            key: Identifies the processed frame; a new key triggers a render
+            render (callable): Returns the annotated frame, or None if there is none
+
+        Returns:
+            tuple: (annotated frame, JPEG bytes) or (None, None)
+        """
+        # Concurrent viewers of a new frame wait for one render instead of each rendering it
+        with self._camera_lock(camera):
+            entry = self.entries.get(camera)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1], entry[2]
+
+            frame = render()
+            if frame is None:
+                return None, None
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            jpeg = buffer.tobytes() if ok else None
+
+            self.entries[camera] = (key, frame, jpeg)
+            self.renders += 1
+            return frame, jpeg
+
+    def get_stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Number of renders and cache hits
+        """
+        return {"renders": self.renders, "hits": self.hits}
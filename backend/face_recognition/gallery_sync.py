@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import time
+import urllib.request
+import numpy as np
+from utils import load_encodings, save_encodings
+
+MANIFEST = "manifest.json"
+
+def read_gallery(gallery_file):
+    """
+    Read a gallery file as {name: [template, ...]}.
+
+    Supports the pickle format of this system ({"encodings", "names"}) and the
+    encodings.json format of the Facenet server ({name: vector or list of vectors}).
+
+    Args:
+        gallery_file (str): Path to a .pkl or .json gallery
+
+    Returns:
+        dict: Templates per person as float32 arrays
+    """
+    gallery = {}
+    if gallery_file.endswith(".json"):
+        if os.path.exists(gallery_file):
+            with open(gallery_file, "r") as f:
+                for name, embedding in json.load(f).items():
+                    gallery[name] = list(np.atleast_2d(np.asarray(embedding, dtype=np.float32)))
+        return gallery
+
+    data = load_encodings(gallery_file)
+    for encoding, name in zip(data["encodings"], data["names"]):
+        gallery.setdefault(name, []).append(np.asarray(encoding, dtype=np.float32))
+    return gallery
+
+def write_gallery(gallery, gallery_file):
+    """
+    Atomically write a gallery in the format given by the file extension.
+
+    Args:
+        gallery (dict): Templates per person
+        gallery_file (str): Path to a .pkl or .json gallery
+    """
+    tmp_file = gallery_file + ".tmp"
+    if gallery_file.endswith(".json"):
+        data = {
+            name: [t.tolist() for t in templates] if len(templates) > 1 else templates[0].tolist()
+            for name, templates in gallery.items()
+        }
+        with open(tmp_file, "w") as f:
+            json.dump(data, f)
+    else:
+        names = [name for name in sorted(gallery) for _ in gallery[name]]
+        encodings = [t.astype(np.float64) for name in sorted(gallery) for t in gallery[name]]
+        save_encodings({"encodings": encodings, "names": names}, tmp_file)
+    os.replace(tmp_file, gallery_file)
+
+def gallery_digest(gallery):
+    """
+    Checksum of a gallery's content, independent of file format and order.
+
+    Args:
+        gallery (dict): Templates per person
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    for name in sorted(gallery):
+        digest.update(name.encode("utf-8") + b"\0")
+        for template in gallery[name]:
+            digest.update(np.asarray(template, dtype="<f4").tobytes())
+    return digest.hexdigest()
+
+def _encode_templates(templates):
+    """Pack templates as base64 little-endian float32 (much smaller than JSON floats)."""
+    return base64.b64encode(np.asarray(templates, dtype="<f4").tobytes()).decode("ascii")
+
+def _decode_templates(packed, dimension):
+    """Unpack templates written by _encode_templates."""
+    values = np.frombuffer(base64.b64decode(packed), dtype="<f4").reshape(-1, dimension)
+    return [row.astype(np.float32) for row in values]
+
+def _gallery_dimension(gallery):
+    for templates in gallery.values():
+        if templates:
+            return len(templates[0])
+    return 0
+
+def _pack(document):
+    """Serialize a snapshot/delta document as gzipped JSON."""
+    return gzip.compress(json.dumps(document, sort_keys=True).encode("utf-8"), mtime=0)
+
+def compute_delta(old, new):
+    """
+    Compute the changes turning one gallery into another.
+
+    Args:
+        old (dict): Previous gallery
+        new (dict): New gallery
+
+    Returns:
+        dict: Added people, removed names and people whose templates changed
+    """
+    def same(a, b):
+        return len(a) == len(b) and all(np.array_equal(x, y) for x, y in zip(a, b))
+
+    return {
+        "add": {name: templates for name, templates in new.items() if name not in old},
+        "remove": sorted(name for name in old if name not in new),
+        "update": {name: templates for name, templates in new.items()
+                   if name in old and not same(old[name], templates)}
+    }
+
+def apply_delta(gallery, delta):
+    """
+    Apply a delta to a gallery (returns a new dict, the input is unchanged).
+
+    Args:
+        gallery (dict): Gallery to update
+        delta (dict): Delta from compute_delta
+
+    Returns:
+        dict: Updated gallery
+    """
+    updated = dict(gallery)
+    for name in delta["remove"]:
+        updated.pop(name, None)
+    updated.update(delta["add"])
+    updated.update(delta["update"])
+    return updated
+
+class GalleryRepository:
+    """
+    Versioned gallery snapshots and deltas published by the depot server.
+
+    Layout of the repository directory:
+        manifest.json                latest version, snapshots and deltas with checksums
+        snapshots/v{N}.json.gz       full gallery of version N
+        deltas/v{N-1}-v{N}.json.gz   adds, removes and updates from N-1 to N
+
+    Files are never modified after being written and the manifest is replaced
+    atomically, so the directory can be served as-is by any static HTTP server.
+    """
+
+    def __init__(self, directory, keep_snapshots=3):
+        """
+        Initialize the repository.
+
+        Args:
+            directory (str): Repository directory
+            keep_snapshots (int): Number of most recent full snapshots to keep (deltas are kept)
+        """
+        self.directory = directory
+        self.keep_snapshots = keep_snapshots
+        os.makedirs(os.path.join(directory, "snapshots"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "deltas"), exist_ok=True)
+
+    def load_manifest(self):
+        """Load the manifest (empty if nothing was published yet)."""
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return {"latest": 0, "dimension": 0, "snapshots": {}, "deltas": {}}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _write(self, relative_path, payload):
+        """Write a file atomically and return its manifest entry."""
+        path = os.path.join(self.directory, relative_path)
+        with open(path + ".tmp", "wb") as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+        return {"file": relative_path, "sha256": hashlib.sha256(payload).hexdigest(), "bytes": len(payload)}
+
+    def _read_snapshot(self, manifest, version):
+        entry = manifest["snapshots"][str(version)]
+        with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+            document = json.loads(gzip.decompress(f.read()))
+        return {name: _decode_templates(packed, manifest["dimension"])
+                for name, packed in document["gallery"].items()}
+
+    def publish(self, gallery):
+        """
+        Publish a gallery as a new version if it differs from the latest one.
+
+        Args:
+            gallery (dict): Templates per person
+
+        Returns:
+            tuple: (version, delta manifest entry or None)
+        """
+        manifest = self.load_manifest()
+        digest = gallery_digest(gallery)
+        latest = manifest["latest"]
+        if latest and manifest["snapshots"][str(latest)]["digest"] == digest:
+            return latest, None
+
+        dimension = _gallery_dimension(gallery) or manifest["dimension"]
+        manifest["dimension"] = dimension
+        version = latest + 1
+
+        snapshot = {"version": version, "digest": digest,
+                    "gallery": {name: _encode_templates(t) for name, t in gallery.items()}}
+        entry = self._write(f"snapshots/v{version}.json.gz", _pack(snapshot))
+        entry["digest"] = digest
+        manifest["snapshots"][str(version)] = entry
+
+        delta_entry = None
+        if latest:
+            previous = self._read_snapshot(manifest, latest)
+            delta = compute_delta(previous, gallery)
+            document = {
+                "from": latest,
+                "to": version,
+                "base_digest": manifest["snapshots"][str(latest)]["digest"],
+                "target_digest": digest,
+                "add": {name: _encode_templates(t) for name, t in delta["add"].items()},
+                "remove": delta["remove"],
+                "update": {name: _encode_templates(t) for name, t in delta["update"].items()}
+            }
+            delta_entry = self._write(f"deltas/v{latest}-v{version}.json.gz", _pack(document))
+            delta_entry.update(base_digest=document["base_digest"], target_digest=digest)
+            manifest["deltas"][str(latest)] = delta_entry
+
+        # Drop old snapshots; nodes that far behind follow the delta chain
+        for old in sorted(manifest["snapshots"], key=int)[:-self.keep_snapshots]:
+            os.remove(os.path.join(self.directory, manifest["snapshots"].pop(old)["file"]))
+
+        manifest["latest"] = version
+        self._write(MANIFEST, json.dumps(manifest, indent=2).encode("utf-8"))
+        return version, delta_entry
+
+class GallerySource:
+    """Read-only access to a published repository, from a local directory or over HTTP."""
+
+    def __init__(self, location, timeout=30):
+        """
+        Initialize the source.
+
+        Args:
+            location (str): Repository directory or http(s):// URL
+            timeout (float): HTTP timeout in seconds
+        """
+        self.location = location.rstrip("/")
+        self.timeout = timeout
+        self.bytes_fetched = 0
+
+    def fetch(self, relative_path):
+        """
+        Fetch a file of the repository.
+
+        Args:
+            relative_path (str): Path inside the repository
+
+        Returns:
+            bytes: File content
+        """
+        if self.location.startswith(("http://", "https://")):
+            with urllib.request.urlopen(f"{self.location}/{relative_path}", timeout=self.timeout) as response:
+                payload = response.read()
+        else:
+            with open(os.path.join(self.location, relative_path), "rb") as f:
+                payload = f.read()
+        self.bytes_fetched += len(payload)
+        return payload
+
+    def fetch_verified(self, entry):
+        """
+        Fetch a snapshot or delta and check it against its manifest checksum.
+
+        Args:
+            entry (dict): Manifest entry with 'file' and 'sha256'
+
+        Returns:
+            dict: Decoded document
+        """
+        payload = self.fetch(entry["file"])
+        if hashlib.sha256(payload).hexdigest() != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {entry['file']}")
+        return json.loads(gzip.decompress(payload))
+
+def read_node_version(gallery_file):
+    """
+    Read the version a node's gallery is at.
+
+    Args:
+        gallery_file (str): Path to the node's gallery
+
+    Returns:
+        dict: {"version", "digest"} (version 0 if never synced)
+    """
+    state_file = gallery_file + ".version.json"
+    if not os.path.exists(state_file):
+        return {"version": 0, "digest": None}
+    with open(state_file, "r") as f:
+        return json.load(f)
+
+def _write_node_version(gallery_file, version, digest):
+    state_file = gallery_file + ".version.json"
+    with open(state_file + ".tmp", "w") as f:
+        json.dump({"version": version, "digest": digest, "synced_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+    os.replace(state_file + ".tmp", state_file)
+
+def sync_gallery(gallery_file, location):
+    """
+    Bring a node's gallery up to the latest published version.
+
+    The chain of deltas from the node's version is downloaded and applied in
+    memory; every file is checked against its manifest checksum and the
+    result against the target gallery digest. If the node's gallery does not
+    match the digest of the version it claims, or the delta chain is
+    incomplete, the latest full snapshot is downloaded instead. The gallery
+    file and then the version file are replaced atomically, so an interrupted
+    sync leaves the previous gallery in place.
+
+    Args:
+        gallery_file (str): Path to the node's gallery (.pkl or .json)
+        location (str): Repository directory or http(s):// URL
+
+    Returns:
+        dict: Old and new version, method ('up_to_date', 'delta' or 'snapshot') and bytes downloaded
+    """
+    source = GallerySource(location)
+    manifest = json.loads(source.fetch(MANIFEST))
+    latest = manifest["latest"]
+    dimension = manifest["dimension"]
+
+    state = read_node_version(gallery_file)
+    report = {"from": state["version"], "to": latest, "method": "up_to_date", "bytes": 0}
+    if state["version"] == latest:
+        report["bytes"] = source.bytes_fetched
+        return report
+
+    gallery = None
+    local = read_gallery(gallery_file)
+    if 0 < state["version"] < latest and gallery_digest(local) == state["digest"]:
+        try:
+            gallery = local
+            for version in range(state["version"], latest):
+                entry = manifest["deltas"][str(version)]
+                delta = source.fetch_verified(entry)
+                if delta["base_digest"] != gallery_digest(gallery):
+                    raise ValueError(f"Delta v{version} does not apply to the local gallery")
+                gallery = apply_delta(gallery, {
+                    "add": {n: _decode_templates(p, dimension) for n, p in delta["add"].items()},
+                    "remove": delta["remove"],
+                    "update": {n: _decode_templates(p, dimension) for n, p in delta["update"].items()}
+                })
+                if gallery_digest(gallery) != delta["target_digest"]:
+                    raise ValueError(f"Gallery digest mismatch after applying delta to v{delta['to']}")
+            report["method"] = "delta"
+        except (KeyError, ValueError) as e:
+            print(f"[WARNING] Delta sync failed ({e}), downloading full snapshot")
+            gallery = None
+
+    if gallery is None:
+        entry = manifest["snapshots"][str(latest)]
+        snapshot = source.fetch_verified(entry)
+        gallery = {n: _decode_templates(p, dimension) for n, p in snapshot["gallery"].items()}
+        if gallery_digest(gallery) != entry["digest"]:
+            raise ValueError(f"Gallery digest mismatch in snapshot v{latest}")
+        report["method"] = "snapshot"
+
+    write_gallery(gallery, gallery_file)
+    _write_node_version(gallery_file, latest, gallery_digest(gallery))
+    report["bytes"] = source.bytes_fetched
+    return report
+
+def main():
+    """Main function to publish or sync galleries."""
+    parser = argparse.ArgumentParser(description="Versioned gallery snapshots and delta sync")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = subparsers.add_parser("publish", help="Publish a gallery as a new version (depot)")
+    publish_parser.add_argument("-e", "--encodings", required=True,
+                                help="Gallery to publish (.pkl or .json)")
+    publish_parser.add_argument("-r", "--repository", required=True,
+                                help="Repository directory")
+    publish_parser.add_argument("--keep", type=int, default=3,
+                                help="Number of full snapshots to keep")
+
+    sync_parser = subparsers.add_parser("sync", help="Update a node's gallery to the latest version")
+    sync_parser.add_argument("-e", "--encodings", required=True,
+                             help="Node gallery to update (.pkl or .json)")
+    sync_parser.add_argument("-s", "--source", required=True,
+                             help="Repository directory or http(s):// URL")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        if not os.path.exists(args.encodings):
+            print(f"[ERROR] Encodings file not found: {args.encodings}")
+            return
+        repository = GalleryRepository(args.repository, keep_snapshots=args.keep)
+        previous = repository.load_manifest()["latest"]
+        version, delta = repository.publish(read_gallery(args.encodings))
+        if version == previous:
+            print(f"[INFO] Gallery unchanged, still at version {version}")
+        else:
+            size = f", delta {delta['bytes'] / 1024:.1f} KB" if delta else ""
+            print(f"[INFO] Published gallery version {version}{size}")
+    else:
+        report = sync_gallery(args.encodings, args.source)
+        if report["method"] == "up_to_date":
+            print(f"[INFO] Gallery already at version {report['to']}")
+        else:
+            print(f"[INFO] Synced gallery v{report['from']} -> v{report['to']} by {report['method']}, "
+                  f"{report['bytes'] / 1024:.1f} KB downloaded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from tracing import tracer
+
+class InferenceQueue:
+    """
+    Queue of pending detection requests served by dedicated inference workers.
+
+    Requests (API uploads and camera frames) are not processed on the caller's
+    thread. A worker takes the first pending request, waits up to batch_window
+    seconds for more to arrive, runs detection and encoding for the whole batch
+    and fans the results back out to each caller's Future. Shared
+    FaceDetectionSystem state is therefore only touched by the workers.
+    """
+
+    def __init__(self, system, batch_window=0.015, max_batch_size=8, workers=1):
+        """
+        Initialize the inference queue.
+
+        Args:
+            system (FaceDetectionSystem): Detection system used by the workers
+            batch_window (float): Time in seconds to wait for more requests to batch
+            max_batch_size (int): Maximum number of frames processed together
+            workers (int): Number of inference worker threads
+        """
+        self.system = system
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.pending = queue.Queue()
+        self.is_running = True
+
+        # Statistics
+        self.stats_lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"inference-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, frame, camera_type):
+        """
+        Queue a frame for detection.
+
+        Args:
+            frame (numpy.ndarray): BGR frame to process
+            camera_type (str): Type of camera ('entry' or 'exit')
+
+        Returns:
+            concurrent.futures.Future: Resolves to the API detection result
+        """
+        future = Future()
+        self.pending.put((frame, camera_type, future))
+        return future
+
+    def detect(self, frame, camera_type, timeout=None):
+        """
+        Queue a frame and wait for its detection result.
+
+        Args:
+            frame (numpy.ndarray): BGR frame to process
+            camera_type (str): Type of camera ('entry' or 'exit')
+            timeout (float, optional): Maximum time to wait in seconds
+
+        Returns:
+            dict: API detection result
+        """
+        return self.submit(frame, camera_type).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Block for one request, then gather more until the batch window closes."""
+        try:
+            batch = [self.pending.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _worker_loop(self):
+        """Worker thread: process pending requests in micro-batches."""
+        while self.is_running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            # Skip requests whose caller already gave up
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                with tracer.span("inference_batch", size=len(batch)):
+                    results = self.system.process_frames(
+                        [frame for frame, _, _ in batch],
+                        [camera_type for _, camera_type, _ in batch]
+                    )
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (frame, camera_type, future), detection_result in zip(batch, results):
+                try:
+                    with tracer.span("handle_detection", camera=camera_type):
+                        self.system.handle_detection(detection_result, camera_type, frame)
+                    future.set_result(self.system.to_api_result(detection_result, camera_type))
+                except Exception as e:
+                    future.set_exception(e)
+
+            with self.stats_lock:
+                self.batches += 1
+                self.frames += len(batch)
+
+    def get_stats(self):
+        """
+        Get queue statistics.
+
+        Returns:
+            dict: Pending requests, processed batches/frames and mean batch size
+        """
+        with self.stats_lock:
+            return {
+                "pending": self.pending.qsize(),
+                "batches": self.batches,
+                "frames": self.frames,
+                "mean_batch_size": self.frames / self.batches if self.batches else 0.0
+            }
+
+    def stop(self):
+        """Stop the worker threads."""
+        self.is_running = False
+        for worker in self.workers:
+            worker.join(timeout=1.0)
@@ -0,0 +1,266 @@
+import gzip
+import hashlib
+import json
+import socket
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+# Responses meaning the marks themselves are invalid; they are quarantined instead of retried.
+# Every other error (including 401/403/404, a misconfigured endpoint) is retried with backoff.
+REJECTED_PAYLOAD_ERRORS = (400, 422)
+
+class AttendanceOutbox:
+    """
+    Durable local queue of attendance marks, uploaded in batches when online.
+
+    Marks are stored in a SQLite database with one row per (person, date,
+    direction), so they survive restarts and connectivity loss and can't be
+    duplicated: a later entry never replaces an earlier one, a later exit
+    replaces an earlier exit. A background thread uploads pending marks as
+    gzip-compressed JSON batches to the central ingest endpoint and retries
+    with exponential backoff while offline. Each batch carries an ID derived
+    from its content, and the server merges marks idempotently, so a batch
+    that is re-sent after a lost response does no harm. Marks the server
+    rejects as invalid (400 or 422) are quarantined instead of retried, so
+    they don't block the marks queued behind them.
+    """
+
+    def __init__(self, path="attendance_outbox.db", endpoint=None, node_id=None, batch_size=200,
+                 interval=30.0, retry_delay=5.0, max_backoff=600.0, timeout=10.0):
+        """
+        Initialize the outbox.
+
+        Args:
+            path (str): SQLite database file
+            endpoint (str, optional): URL of the central bulk ingest endpoint (no upload if omitted)
+            node_id (str, optional): Name of this node (default: host name)
+            batch_size (int): Maximum marks per upload
+            interval (float): Seconds between upload attempts while everything is uploaded
+            retry_delay (float): Seconds before the first retry after a failed upload (doubles each time)
+            max_backoff (float): Maximum seconds between attempts while uploads fail
+            timeout (float): HTTP timeout in seconds
+        """
+        self.path = path
+        self.endpoint = endpoint
+        self.node_id = node_id or socket.gethostname()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS marks (
+                person_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                time TEXT NOT NULL,
+                recorded_at TEXT NOT NULL,
+                uploaded INTEGER NOT NULL DEFAULT 0,  -- 0 pending, 1 uploaded, 2 rejected by the server
+                PRIMARY KEY (person_id, date, direction)
+            )
+        """)
+        self.db.commit()
+
+        # Statistics
+        self.uploaded_batches = 0
+        self.failed_attempts = 0
+        self.failed_streak = 0
+        self.last_upload = None
+        self.last_error = None
+
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.upload_thread = None
+
+    def record(self, person_id, date_str, direction, time_str):
+        """
+        Store a mark for upload.
+
+        Args:
+            person_id (str): ID of the person
+            date_str (str): Date of the mark (YYYY-MM-DD)
+            direction (str): 'entry' or 'exit'
+            time_str (str): Time of the mark (HH:MM:SS)
+        """
+        with self.lock:
+            # Keep the earliest entry and the latest exit of the day
+            self.db.execute("""
+                INSERT INTO marks (person_id, date, direction, time, recorded_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (person_id, date, direction) DO UPDATE
+                SET time = excluded.time, uploaded = 0
+                WHERE (marks.direction = 'exit' AND excluded.time > marks.time)
+                   OR (marks.direction != 'exit' AND excluded.time < marks.time)
+            """, (person_id, date_str, direction, time_str, datetime.now().isoformat()))
+            self.db.commit()
+        self.wake_event.set()
+
+    def pending(self, limit=None):
+        """
+        Get marks that were not uploaded yet, oldest first.
+
+        Args:
+            limit (int, optional): Maximum number of marks
+
+        Returns:
+            list: Marks as dicts
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT person_id, date, direction, time FROM marks WHERE uploaded = 0 "
+                "ORDER BY recorded_at LIMIT ?", (limit or -1,)
+            ).fetchall()
+        return [{"person_id": p, "date": d, "direction": c, "time": t} for p, d, c, t in rows]
+
+    def build_batch(self, marks):
+        """
+        Build the compressed upload body for a batch of marks.
+
+        Args:
+            marks (list): Marks from pending()
+
+        Returns:
+            tuple: (batch ID, gzip-compressed JSON body)
+        """
+        content = json.dumps(marks, sort_keys=True).encode("utf-8")
+        batch_id = hashlib.sha256(self.node_id.encode("utf-8") + b"\0" + content).hexdigest()[:32]
+        body = json.dumps({"node_id": self.node_id, "batch_id": batch_id, "marks": marks}).encode("utf-8")
+        return batch_id, gzip.compress(body)
+
+    def upload_batch(self, marks):
+        """
+        Upload one batch of marks and record the outcome.
+
+        A batch the server rejects as invalid is split in halves and each
+        half is sent again, so only the marks that are actually rejected end
+        up quarantined.
+
+        Args:
+            marks (list): Marks from pending()
+
+        Returns:
+            int: Number of marks uploaded
+
+        Raises:
+            OSError: If the endpoint can't be reached or fails with a retryable error
+        """
+        batch_id, body = self.build_batch(marks)
+        request = urllib.request.Request(self.endpoint, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Idempotency-Key": batch_id
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if e.code not in REJECTED_PAYLOAD_ERRORS:
+                raise
+            if len(marks) > 1:
+                half = len(marks) // 2
+                return self.upload_batch(marks[:half]) + self.upload_batch(marks[half:])
+
+            self._set_uploaded(marks, 2)
+            self.last_error = f"Rejected mark {marks[0]}: HTTP {e.code} {e.reason}"
+            print(f"[WARNING] {self.last_error}")
+            return 0
+
+        self._set_uploaded(marks, 1)
+        self.uploaded_batches += 1
+        self.last_upload = datetime.now().isoformat()
+        return len(marks)
+
+    def _set_uploaded(self, marks, state):
+        """Set the upload state of marks unchanged since they were sent."""
+        with self.lock:
+            self.db.executemany(
+                "UPDATE marks SET uploaded = ? WHERE person_id = ? AND date = ? AND direction = ? AND time = ?",
+                [(state, m["person_id"], m["date"], m["direction"], m["time"]) for m in marks]
+            )
+            self.db.commit()
+
+    def upload_pending(self):
+        """
+        Upload all pending marks in batches.
+
+        Returns:
+            int: Number of marks uploaded
+
+        Raises:
+            OSError: If the endpoint can't be reached or fails with a retryable error
+        """
+        uploaded = 0
+        while True:
+            marks = self.pending(self.batch_size)
+            if not marks:
+                return uploaded
+            uploaded += self.upload_batch(marks)
+
+    def _upload_loop(self):
+        """Background thread: upload pending marks, backing off while offline."""
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            try:
+                count = self.upload_pending()
+                if count:
+                    print(f"[INFO] Uploaded {count} attendance marks")
+                backoff = None
+            except (OSError, urllib.error.URLError) as e:
+                self.failed_attempts += 1
+                self.last_error = str(e)
+                backoff = min(self.retry_delay * 2 ** min(self.failed_streak, 16), self.max_backoff)
+
+            if backoff is not None:
+                self.failed_streak += 1
+                self.stop_event.wait(backoff)
+                continue
+
+            self.failed_streak = 0
+            # Wait for the next round or a new mark; marks arriving together share a batch
+            if self.wake_event.wait(self.interval) and not self.stop_event.is_set():
+                self.stop_event.wait(2.0)
+
+    def start(self):
+        """Start the upload thread (no-op without an endpoint)."""
+        if not self.endpoint or self.upload_thread:
+            return
+        self.upload_thread = threading.Thread(target=self._upload_loop, name="outbox-upload", daemon=True)
+        self.upload_thread.start()
+
+    def stop(self):
+        """Stop the upload thread and close the database."""
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.upload_thread:
+            self.upload_thread.join(timeout=self.timeout + 1)
+        with self.lock:
+            self.db.close()
+
+    def get_stats(self):
+        """
+        Get outbox statistics.
+
+        Returns:
+            dict: Pending, uploaded and rejected marks, batches, failures and last upload/error
+        """
+        with self.lock:
+            pending, uploaded, rejected = self.db.execute(
+                "SELECT COALESCE(SUM(uploaded = 0), 0), COALESCE(SUM(uploaded = 1), 0), "
+                "COALESCE(SUM(uploaded = 2), 0) FROM marks"
+            ).fetchone()
+        return {
+            "pending": pending,
+            "uploaded": uploaded,
+            "rejected": rejected,
+            "uploaded_batches": self.uploaded_batches,
+            "failed_attempts": self.failed_attempts,
+            "last_upload": self.last_upload,
+            "last_error": self.last_error
+        }
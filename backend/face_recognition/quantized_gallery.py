@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from utils import load_encodings
+
+QUANTIZATION_MODES = ("float16", "int8")
+
+class QuantizedGallery:
+    """
+    Face gallery scanned with compact float16 or int8 vectors.
+
+    Every query is first scored against the whole gallery using the quantized
+    vectors (int8 uses a symmetric scale per dimension). The best `rerank`
+    candidates are then re-scored with the full-precision encodings, so the
+    final match and distance are exact unless the true best template fell
+    outside the candidate list. Full-precision encodings can be memory-mapped
+    from disk, in which case only the re-ranked rows are read into RAM.
+    """
+
+    def __init__(self, encodings, names, mode="int8", rerank=8, full_precision_file=None, source_file=None,
+                 chunk_size=4096):
+        """
+        Build the quantized gallery.
+
+        Args:
+            encodings (array-like): Known face encodings, shape (m, d)
+            names (list): Names corresponding to the encodings
+            mode (str): 'float16' or 'int8'
+            rerank (int): Number of candidates re-scored with full precision
+            full_precision_file (str, optional): .npy file to keep full-precision encodings
+                on disk (memory-mapped) instead of in RAM
+            source_file (str, optional): File the encodings were loaded from; a full-precision
+                file newer than it with the same shape is reused instead of rewritten
+            chunk_size (int): Gallery rows scored at a time, bounds temporary memory
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}'. Choose from {QUANTIZATION_MODES}")
+
+        self.mode = mode
+        self.rerank = rerank
+        self.chunk_size = chunk_size
+        self.names = list(names)
+
+        full = np.asarray(encodings, dtype=np.float32).reshape(len(self.names), -1)
+        if full_precision_file:
+            full = map_full_precision(full, full_precision_file, source_file)
+        self.full = full
+
+        if mode == "float16":
+            self.scale = None
+            self.codes = full.astype(np.float16)
+        else:
+            max_abs = np.abs(full).max(axis=0) if len(full) else np.ones(full.shape[1], dtype=np.float32)
+            self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self.codes = np.clip(np.round(full / self.scale), -127, 127).astype(np.int8)
+
+        # Squared norms of the dequantized vectors for the ||a||^2 + ||b||^2 - 2ab expansion
+        self.sq_norms = np.concatenate([
+            np.sum(self._dequantize(start) ** 2, axis=1)
+            for start in range(0, len(self.codes), chunk_size)
+        ]) if len(self.codes) else np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _dequantize(self, start):
+        """Dequantize one chunk of gallery rows to float32."""
+        chunk = self.codes[start:start + self.chunk_size].astype(np.float32)
+        return chunk * self.scale if self.scale is not None else chunk
+
+    def approximate_distances(self, queries):
+        """
+        Squared distances from each query to every gallery vector, using the quantized vectors.
+
+        Args:
+            queries (numpy.ndarray): Query encodings, shape (n, d)
+
+        Returns:
+            numpy.ndarray: Approximate squared distances, shape (n, m)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        dots = np.concatenate([
+            queries @ self._dequantize(start).T
+            for start in range(0, len(self.codes), self.chunk_size)
+        ], axis=1)
+        return np.sum(queries ** 2, axis=1)[:, None] + self.sq_norms[None, :] - 2.0 * dots
+
+    def search(self, queries, exclude=None):
+        """
+        Find the closest gallery vector for each query.
+
+        Args:
+            queries (array-like): Query encodings, shape (n, d)
+            exclude (array-like, optional): Gallery index to ignore per query (e.g. the query itself)
+
+        Returns:
+            tuple: (best gallery index per query, exact Euclidean distance per query)
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        approx = self.approximate_distances(queries)
+        if exclude is not None:
+            approx[np.arange(len(queries)), exclude] = np.inf
+
+        # Candidates from the quantized scan, re-scored with full precision
+        k = min(self.rerank, approx.shape[1])
+        candidates = np.argpartition(approx, k - 1, axis=1)[:, :k]
+
+        vectors = np.asarray(self.full[candidates.ravel()], dtype=np.float64).reshape(len(queries), k, -1)
+        exact = np.linalg.norm(vectors - queries[:, None, :], axis=2)
+        exact[~np.isfinite(np.take_along_axis(approx, candidates, axis=1))] = np.inf
+
+        best = np.argmin(exact, axis=1)
+        rows = np.arange(len(queries))
+        best_indices = candidates[rows, best]
+        best_distances = exact[rows, best]
+
+        return best_indices, best_distances
+
+    def match(self, face_encodings, tolerance=0.6):
+        """
+        Match face encodings against the gallery (same result format as find_matching_faces).
+
+        Args:
+            face_encodings (array-like): Face encodings to match, shape (n, d)
+            tolerance (float): Matching tolerance (lower is stricter)
+
+        Returns:
+            list: (name, confidence) per face encoding, name is None if no match
+        """
+        if len(face_encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [(None, 0.0)] * len(face_encodings)
+
+        matches = []
+        for index, distance in zip(*self.search(face_encodings)):
+            confidence = 1.0 - min(distance, 1.0)
+            matches.append((self.names[index] if confidence >= (1.0 - tolerance) else None, confidence))
+        return matches
+
+    def memory_bytes(self):
+        """
+        Memory needed for scanning (codes, norms and scale), excluding the full-precision vectors.
+
+        Returns:
+            int: Size in bytes
+        """
+        return self.codes.nbytes + self.sq_norms.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+def map_full_precision(full, full_precision_file, source_file=None):
+    """
+    Memory-map full-precision encodings from a .npy file, writing it only if needed.
+
+    Workers loading the same gallery reuse a file that is newer than the
+    encodings it was written from. A rewrite goes through a unique temporary
+    file and an atomic rename, so concurrent writers don't collide and a
+    gallery being swapped out keeps mapping the old file.
+
+    Args:
+        full (numpy.ndarray): Full-precision encodings, shape (m, d)
+        full_precision_file (str): .npy file
+        source_file (str, optional): Encodings file the array was loaded from
+
+    Returns:
+        numpy.ndarray: Read-only memory map of the encodings
+    """
+    if (source_file and os.path.exists(source_file) and os.path.exists(full_precision_file)
+            and os.path.getmtime(full_precision_file) > os.path.getmtime(source_file)):
+        try:
+            mapped = np.load(full_precision_file, mmap_mode="r")
+            if mapped.shape == full.shape and mapped.dtype == full.dtype:
+                return mapped
+        except (OSError, ValueError):
+            pass
+
+    fd, tmp_file = tempfile.mkstemp(
+        prefix=os.path.basename(full_precision_file) + ".", suffix=".tmp",
+        dir=os.path.dirname(os.path.abspath(full_precision_file))
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, full)
+        os.replace(tmp_file, full_precision_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return np.load(full_precision_file, mmap_mode="r")
+
+def quantization_report(data, mode="int8", rerank=8, tolerance=0.6):
+    """
+    Compare a quantized gallery with exact float64 matching.
+
+    Every encoding is used as a query against the rest of the gallery
+    (leave-one-out). The report shows how often the quantized scan alone and
+    quantized scan + re-ranking pick the same template as exact search, and
+    how the memory needed for scanning changes.
+
+    Args:
+        data (dict): Encodings data {"encodings": [...], "names": [...]}
+        mode (str): 'float16' or 'int8'
+        rerank (int): Number of candidates re-scored with full precision
+        tolerance (float): Matching tolerance used for recall
+
+    Returns:
+        dict: Memory sizes, agreement with exact search, recall and timings
+    """
+    encodings = np.asarray(data["encodings"], dtype=np.float64)
+    names = list(data["names"])
+    n = len(encodings)
+    if n < 2:
+        raise ValueError("Need at least two encodings to evaluate quantization")
+
+    gallery = QuantizedGallery(encodings, names, mode=mode, rerank=rerank)
+    self_indices = np.arange(n)
+
+    # Exact leave-one-out nearest neighbour
+    start = time.time()
+    sq = np.sum(encodings ** 2, axis=1)
+    exact = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * encodings @ encodings.T, 0.0))
+    exact[self_indices, self_indices] = np.inf
+    exact_best = np.argmin(exact, axis=1)
+    exact_time = time.time() - start
+
+    # Quantized scan without re-ranking
+    approx = gallery.approximate_distances(encodings)
+    approx[self_indices, self_indices] = np.inf
+    approx_best = np.argmin(approx, axis=1)
+
+    # Quantized scan + exact re-ranking
+    start = time.time()
+    reranked_best, reranked_distances = gallery.search(encodings, exclude=self_indices)
+    quantized_time = time.time() - start
+
+    def recall(best, distances):
+        hits = [names[b] == names[i] and d <= tolerance for i, (b, d) in enumerate(zip(best, distances))]
+        return float(sum(hits) / n)
+
+    return {
+        "templates": n,
+        "mode": mode,
+        "rerank": rerank,
+        "float64_bytes": encodings.nbytes,
+        "quantized_bytes": gallery.memory_bytes(),
+        "memory_saving": 1.0 - gallery.memory_bytes() / encodings.nbytes,
+        "agreement_scan_only": float(np.mean(approx_best == exact_best)),
+        "agreement_reranked": float(np.mean(reranked_best == exact_best)),
+        "recall_exact": recall(exact_best, exact[self_indices, exact_best]),
+        "recall_quantized": recall(reranked_best, reranked_distances),
+        "exact_seconds": exact_time,
+        "quantized_seconds": quantized_time
+    }
+
+def main():
+    """Main function to report memory savings and accuracy of a quantized gallery."""
+    parser = argparse.ArgumentParser(description="Evaluate a quantized face gallery")
+    parser.add_argument("-e", "--encodings", required=True,
+                        help="Path to the face encodings file")
+    parser.add_argument("-m", "--mode", choices=QUANTIZATION_MODES, default="int8",
+                        help="Quantization of the scanned vectors")
+    parser.add_argument("-r", "--rerank", type=int, default=8,
+                        help="Number of candidates re-ranked with full precision")
+    parser.add_argument("--tolerance", type=float, default=0.6,
+                        help="Matching tolerance used for the recall report")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.encodings):
+        print(f"[ERROR] Encodings file not found: {args.encodings}")
+        return
+
+    report = quantization_report(load_encodings(args.encodings), args.mode, args.rerank, args.tolerance)
+    print(f"[INFO] {report['templates']} templates, {report['mode']} with re-ranking of top {report['rerank']}")
+    print(f"[INFO] Scan memory: {report['float64_bytes'] / 1024:.1f} KB -> "
+          f"{report['quantized_bytes'] / 1024:.1f} KB ({report['memory_saving'] * 100:.1f}% smaller)")
+    print(f"[INFO] Same best match as exact search: {report['agreement_scan_only'] * 100:.2f}% scan only, "
+          f"{report['agreement_reranked'] * 100:.2f}% with re-ranking")
+    print(f"[INFO] Recall: {report['recall_exact']:.3f} exact -> {report['recall_quantized']:.3f} quantized")
+    print(f"[INFO] Search time: {report['exact_seconds']:.3f}s exact, {report['quantized_seconds']:.3f}s quantized")
+
+
+if __name__ == "__main__":
+    main()
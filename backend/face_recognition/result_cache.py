@@ -0,0 +1,195 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import cv2
+
+def content_hash(encoded_data):
+    """
+    Hash the raw image payload of a request.
+
+    Args:
+        encoded_data (str or bytes): Base64 image data as sent by the client
+
+    Returns:
+        str: Hex digest identifying the exact image content
+    """
+    if isinstance(encoded_data, str):
+        # Ignore a data URL header so the same image always hashes the same
+        if "base64," in encoded_data:
+            encoded_data = encoded_data.split("base64,")[1]
+        encoded_data = encoded_data.encode("ascii", "ignore")
+    return hashlib.sha1(encoded_data).hexdigest()
+
+def perceptual_hash(image, hash_size=8):
+    """
+    Compute a difference hash (dHash) of an image.
+
+    Near-identical frames (re-encoded JPEGs, sensor noise on a static scene)
+    give hashes that differ in only a few bits.
+
+    Args:
+        image (numpy.ndarray): BGR image
+        hash_size (int): Hash is hash_size * hash_size bits
+
+    Returns:
+        int: Perceptual hash
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+class DetectionCache:
+    """
+    LRU cache of /api/detect results keyed by image content.
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `max_entries` is reached. When `max_phash_distance` is set,
+    a miss on the exact content hash falls back to the closest cached frame
+    whose perceptual hash differs by at most that many bits.
+    """
+
+    def __init__(self, max_entries=256, ttl=5.0, max_phash_distance=None, clock=time.monotonic):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of cached results
+            ttl (float): Seconds a result stays valid
+            max_phash_distance (int, optional): Hamming distance for near matches (None disables)
+            clock (callable): Time source, in seconds
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_phash_distance = max_phash_distance
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def uses_perceptual_hash(self):
+        """Whether near-match lookups are enabled."""
+        return self.max_phash_distance is not None
+
+    def _expire(self, now):
+        """Drop expired entries."""
+        expired = [
+            key for key, entry in self.entries.items()
+            if now - entry["created"] > self.ttl
+        ]
+        for key in expired:
+            del self.entries[key]
+
+    def get(self, key, camera_type):
+        """
+        Look up a result by exact content hash.
+
+        Args:
+            key (str): Content hash of the image
+            camera_type (str): Type of camera ('entry' or 'exit')
+
+        Returns:
+            dict: Cached result or None
+        """
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+
+            entry = self.entries.get((key, camera_type))
+            if entry is None:
+                if not self.uses_perceptual_hash:
+                    self.misses += 1
+                return None
+
+            self.entries.move_to_end((key, camera_type))
+            self.hits += 1
+            return entry["result"]
+
+    def get_similar(self, phash, camera_type):
+        """
+        Look up the closest cached result by perceptual hash.
+
+        Args:
+            phash (int): Perceptual hash of the image
+            camera_type (str): Type of camera ('entry' or 'exit')
+
+        Returns:
+            dict: Cached result or None
+        """
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+
+            best_key = None
+            best_distance = self.max_phash_distance + 1
+            for cache_key, entry in self.entries.items():
+                if cache_key[1] != camera_type or entry["phash"] is None:
+                    continue
+                distance = bin(entry["phash"] ^ phash).count("1")
+                if distance < best_distance:
+                    best_key = cache_key
+                    best_distance = distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.near_hits += 1
+            return self.entries[best_key]["result"]
+
+    def put(self, key, camera_type, result, phash=None):
+        """
+        Store a detection result.
+
+        Args:
+            key (str): Content hash of the image
+            camera_type (str): Type of camera ('entry' or 'exit')
+            result (dict): API detection result
+            phash (int, optional): Perceptual hash of the image
+        """
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+
+            self.entries[(key, camera_type)] = {
+                "result": result,
+                "phash": phash,
+                "created": now
+            }
+            self.entries.move_to_end((key, camera_type))
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_stats(self):
+        """
+        Get cache metrics.
+
+        Returns:
+            dict: Size, hits, near hits, misses, evictions and hit rate
+        """
+        with self.lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from capture import ResilientCapture
+from frame_bus import FrameBus
+from tracing import tracer
+
+class DetectionScheduler:
+    """
+    Central detection for all cameras, one batch per scheduling tick.
+
+    Camera threads only capture: each submits its newest frame and waits for
+    the result. Every tick the scheduler takes the latest submitted frame of
+    every camera (waiting up to gather_timeout for cameras that haven't
+    submitted yet), runs detection and encoding for all of them as one batch
+    (batch_face_locations with the CNN model) and resolves each camera's
+    Future. Ticks start at most every `tick` seconds. A camera that submits a
+    newer frame before its previous one was processed replaces it; the older
+    request gets the result of the newer frame.
+    """
+
+    def __init__(self, system, tick=0.1, gather_timeout=0.05):
+        """
+        Initialize the scheduler.
+
+        Args:
+            system (FaceDetectionSystem): Detection system processing the batches
+            tick (float): Minimum seconds between the starts of two ticks
+            gather_timeout (float): Seconds to wait for cameras that haven't submitted a frame yet
+        """
+        self.system = system
+        self.tick = tick
+        self.gather_timeout = gather_timeout
+
+        self.condition = threading.Condition()
+        self.cameras = set()
+        self.pending = {}
+        self.is_running = False
+        self.thread = None
+
+        # Statistics
+        self.ticks = 0
+        self.frames = 0
+        self.superseded = 0
+        self.tick_times = []
+
+    def add_camera(self, camera_type):
+        """Register a camera so ticks wait for its frame."""
+        with self.condition:
+            self.cameras.add(camera_type)
+
+    def remove_camera(self, camera_type):
+        """Unregister a camera (e.g. when its thread stops)."""
+        with self.condition:
+            self.cameras.discard(camera_type)
+            self.condition.notify_all()
+
+    def submit(self, frame, camera_type):
+        """
+        Queue a camera's newest frame for the next tick.
+
+        Args:
+            frame (numpy.ndarray): BGR frame (must stay valid until the result is set)
+            camera_type (str): Camera the frame comes from
+
+        Returns:
+            concurrent.futures.Future: Resolves to the API detection result
+        """
+        future = Future()
+        with self.condition:
+            previous = self.pending.get(camera_type)
+            if previous:
+                # The newer frame replaces the older one; both callers get its result
+                self.superseded += 1
+                future.add_done_callback(lambda done, older=previous[1]: self._chain(done, older))
+            self.pending[camera_type] = (frame, future)
+            self.condition.notify_all()
+        return future
+
+    @staticmethod
+    def _chain(done, older):
+        """Pass a superseding request's outcome on to the request it replaced."""
+        if done.cancelled():
+            older.cancel()
+        elif done.exception():
+            older.set_exception(done.exception())
+        else:
+            older.set_result(done.result())
+
+    def detect(self, frame, camera_type, timeout=None):
+        """
+        Queue a frame and wait for its detection result.
+
+        Args:
+            frame (numpy.ndarray): BGR frame
+            camera_type (str): Camera the frame comes from
+            timeout (float, optional): Maximum time to wait in seconds
+
+        Returns:
+            dict: API detection result
+        """
+        return self.submit(frame, camera_type).result(timeout=timeout)
+
+    def _collect(self):
+        """Wait for the first frame, then for the other cameras up to gather_timeout."""
+        with self.condition:
+            while self.is_running and not self.pending:
+                self.condition.wait(0.5)
+
+            deadline = time.monotonic() + self.gather_timeout
+            while self.is_running and len(self.pending.keys() & self.cameras) < len(self.cameras):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = self.pending
+            self.pending = {}
+        return batch
+
+    def _process(self, batch):
+        """Detect and encode all frames of a tick as one batch and resolve each camera's result."""
+        # Skip requests whose caller already gave up
+        camera_types = [camera_type for camera_type, (_, future) in batch.items()
+                        if future.set_running_or_notify_cancel()]
+        if not camera_types:
+            return
+        futures = [batch[camera_type][1] for camera_type in camera_types]
+        frames = [batch[camera_type][0] for camera_type in camera_types]
+
+        try:
+            with tracer.span("scheduler_tick", cameras=len(frames)):
+                results = self.system.process_frames(frames, camera_types)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for camera_type, frame, future, detection_result in zip(camera_types, frames, futures, results):
+            try:
+                self.system.handle_detection(detection_result, camera_type, frame)
+                future.set_result(self.system.to_api_result(detection_result, camera_type))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _loop(self):
+        """Scheduler thread: one batch per tick."""
+        while self.is_running:
+            tick_start = time.monotonic()
+            batch = self._collect()
+            if not batch:
+                continue
+
+            self._process(batch)
+
+            self.ticks += 1
+            self.frames += len(batch)
+            self.tick_times.append(time.monotonic() - tick_start)
+            if len(self.tick_times) > 100:
+                self.tick_times.pop(0)
+
+            time.sleep(max(0.0, tick_start + self.tick - time.monotonic()))
+
+    def start(self):
+        """Start the scheduler thread."""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._loop, name="detection-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread; frames still queued get no result."""
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=5.0)
+        with self.condition:
+            for _, future in self.pending.values():
+                future.cancel()
+            self.pending = {}
+
+    def get_stats(self):
+        """
+        Get scheduler statistics.
+
+        Returns:
+            dict: Cameras, ticks, processed frames, mean batch size, tick duration and superseded frames
+        """
+        with self.condition:
+            cameras = sorted(self.cameras)
+        return {
+            "cameras": cameras,
+            "ticks": self.ticks,
+            "frames": self.frames,
+            "mean_batch_size": self.frames / self.ticks if self.ticks else 0.0,
+            "mean_tick_ms": 1000.0 * float(np.mean(self.tick_times)) if self.tick_times else None,
+            "superseded": self.superseded
+        }
+
+def run_mode(system, sources, mode, seconds, tick=0.0):
+    """
+    Process camera sources for a while and measure throughput and latency.
+
+    In 'per_thread' mode every camera thread captures and runs detection on
+    its own frame, as each FaceDetectionSystem detection loop does. In
+    'scheduled' mode camera threads only capture and a DetectionScheduler
+    batches the newest frame of all cameras per tick.
+
+    Args:
+        system (FaceDetectionSystem): Detection system
+        sources (list): Camera IDs, RTSP URLs or video files, one per camera
+        mode (str): 'per_thread' or 'scheduled'
+        seconds (float): How long to run
+        tick (float): Minimum seconds between ticks in scheduled mode
+
+    Returns:
+        dict: Processed frames per second, latency from capture to result, CPU time per frame
+    """
+    frame_bus = FrameBus(prefix=f"bench_{os.getpid()}_{mode}")
+    scheduler = DetectionScheduler(system, tick=tick) if mode == "scheduled" else None
+    latencies = []
+    latencies_lock = threading.Lock()
+    stop_event = threading.Event()
+
+    def camera_loop(camera_type, source):
+        cap = ResilientCapture(source, name=camera_type)
+        if scheduler:
+            scheduler.add_camera(camera_type)
+        try:
+            while not stop_event.is_set():
+                captured = time.perf_counter()
+                ret, seq = frame_bus.capture(camera_type, cap)
+                if not ret:
+                    time.sleep(0.05)
+                    continue
+                with frame_bus.hold(camera_type, seq) as held:
+                    if held.frame is None:
+                        continue
+                    if scheduler:
+                        scheduler.detect(held.frame, camera_type)
+                    else:
+                        detection_result = system.process_frames([held.frame], [camera_type])[0]
+                        if held.is_valid():
+                            system.handle_detection(detection_result, camera_type, held.frame)
+                with latencies_lock:
+                    latencies.append((time.perf_counter() - captured) * 1000.0)
+        finally:
+            if scheduler:
+                scheduler.remove_camera(camera_type)
+            cap.release()
+
+    if scheduler:
+        scheduler.start()
+    threads = [
+        threading.Thread(target=camera_loop, args=(f"camera{i}", source), daemon=True)
+        for i, source in enumerate(sources)
+    ]
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop_event.set()
+    for thread in threads:
+        thread.join(timeout=30.0)
+    cpu_seconds, wall_seconds = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    if scheduler:
+        scheduler.stop()
+    frame_bus.close()
+
+    return {
+        "mode": mode,
+        "cameras": len(sources),
+        "frames": len(latencies),
+        "fps": len(latencies) / wall_seconds,
+        "latency_ms_mean": float(np.mean(latencies)) if latencies else None,
+        "latency_ms_p95": float(np.percentile(latencies, 95)) if latencies else None,
+        "cpu_ms_per_frame": 1000.0 * cpu_seconds / len(latencies) if latencies else None,
+        "mean_batch_size": scheduler.get_stats()["mean_batch_size"] if scheduler else 1.0
+    }
+
+def main():
+    """Main function to compare per-thread detection with the batched scheduler."""
+    from detect_and_mark import FaceDetectionSystem
+
+    parser = argparse.ArgumentParser(description="Compare per-thread detection with cross-camera batching")
+    parser.add_argument("-e", "--encodings", required=True,
+                        help="Path to the face encodings file")
+    parser.add_argument("-s", "--sources", required=True,
+                        help="Comma-separated camera IDs, RTSP URLs or video files (one per camera)")
+    parser.add_argument("-n", "--cameras", type=int,
+                        help="Replicate the sources up to this many cameras (e.g. one clip as 4 cameras)")
+    parser.add_argument("-d", "--detection", type=str, default="cnn", choices=["hog", "cnn"],
+                        help="Face detection model to use")
+    parser.add_argument("--seconds", type=float, default=30,
+                        help="How long to run each mode")
+    parser.add_argument("--tick", type=float, default=0.0,
+                        help="Minimum seconds between scheduler ticks (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    sources = args.sources.split(",")
+    if args.cameras:
+        sources = [sources[i % len(sources)] for i in range(args.cameras)]
+
+    system = FaceDetectionSystem(
+        encodings_file=args.encodings,
+        attendance_file=os.devnull,
+        detection_method=args.detection,
+        mark_attendance=False
+    )
+
+    reports = [run_mode(system, sources, mode, args.seconds, args.tick) for mode in ("per_thread", "scheduled")]
+
+    print(f"[INFO] {len(sources)} cameras, {args.detection} detection, {args.seconds:.0f}s per mode")
+    print(f"{'mode':<12}{'fps':>8}{'mean ms':>10}{'p95 ms':>10}{'cpu ms/frame':>14}{'batch':>8}")
+    for report in reports:
+        if not report["frames"]:
+            print(f"{report['mode']:<12}{'no frames processed':>36}")
+            continue
+        print(f"{report['mode']:<12}{report['fps']:>8.2f}{report['latency_ms_mean']:>10.1f}"
+              f"{report['latency_ms_p95']:>10.1f}{report['cpu_ms_per_frame']:>14.1f}"
+              f"{report['mean_batch_size']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+class SharedState:
+    """
+    State shared by the worker processes of one API deployment.
+
+    With several gunicorn/uvicorn workers, module globals only describe the
+    worker that happens to serve a request. This SQLite database (WAL mode,
+    so readers never block the writer) holds what all workers must agree on:
+
+    - leases for leader election: exactly one worker holds e.g. the "cameras"
+      lease and runs the cameras; it renews the lease periodically, and when
+      it dies the lease expires and another worker takes over
+    - JSON values (desired state such as the requested cameras, latest
+      detections and status published by the camera owner)
+    - binary blobs (the latest annotated JPEG of each camera for streams)
+
+    Each process opens its own connection, so the object may be created
+    before workers are forked.
+    """
+
+    def __init__(self, path="api_state.db", worker_id=None, lease_ttl=10.0):
+        """
+        Initialize the shared state.
+
+        Args:
+            path (str): SQLite database file, shared by all workers on this host
+            worker_id (str, optional): Name of this worker (default: host:pid)
+            lease_ttl (float): Seconds a lease stays valid without renewal
+        """
+        self.path = path
+        self.worker_id_override = worker_id
+        self.lease_ttl = lease_ttl
+        self.lock = threading.Lock()
+        self.db = None
+        self.db_pid = None
+
+    @property
+    def worker_id(self):
+        """Name of this worker process."""
+        return self.worker_id_override or f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connection(self):
+        """Connection of the current process (reopened after a fork)."""
+        if self.db is None or self.db_pid != os.getpid():
+            self.db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS kv (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS blobs (
+                    key TEXT PRIMARY KEY,
+                    value BLOB,
+                    version INTEGER NOT NULL,
+                    updated REAL NOT NULL
+                );
+            """)
+            self.db.commit()
+            self.db_pid = os.getpid()
+        return self.db
+
+    def execute(self, sql, params=(), commit=False):
+        """
+        Run one statement on this process's connection.
+
+        Args:
+            sql (str): SQL statement
+            params (tuple): Statement parameters
+            commit (bool): Commit after the statement
+
+        Returns:
+            list: Fetched rows
+        """
+        with self.lock:
+            db = self._connection()
+            cursor = db.execute(sql, params)
+            rows = cursor.fetchall()
+            if commit:
+                db.commit()
+            return rows
+
+    def executemany_changes(self, statements):
+        """
+        Run several statements in one transaction.
+
+        Args:
+            statements (list): (sql, params) pairs
+
+        Returns:
+            int: Total number of rows changed
+        """
+        with self.lock:
+            db = self._connection()
+            changed = 0
+            with db:
+                for sql, params in statements:
+                    changed += db.execute(sql, params).rowcount
+            return changed
+
+    def try_acquire(self, lease):
+        """
+        Acquire or renew a lease.
+
+        Args:
+            lease (str): Lease name
+
+        Returns:
+            bool: True if this worker holds the lease now
+        """
+        now = time.time()
+        # One atomic statement: take the lease if it is free, expired or already ours
+        self.execute("""
+            INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+            WHERE leases.owner = excluded.owner OR leases.expires < ?
+        """, (lease, self.worker_id, now + self.lease_ttl, now), commit=True)
+        return self.owner(lease) == self.worker_id
+
+    def release(self, lease):
+        """Give up a lease held by this worker so another can take it at once."""
+        self.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (lease, self.worker_id), commit=True)
+
+    def owner(self, lease):
+        """
+        Get the current holder of a lease.
+
+        Args:
+            lease (str): Lease name
+
+        Returns:
+            str: Worker ID of the holder, or None if the lease is free or expired
+        """
+        rows = self.execute("SELECT owner FROM leases WHERE name = ? AND expires >= ?", (lease, time.time()))
+        return rows[0][0] if rows else None
+
+    def set(self, key, value):
+        """
+        Store a JSON-serializable value (None deletes it).
+
+        Args:
+            key (str): Key
+            value: Value
+        """
+        if value is None:
+            self.execute("DELETE FROM kv WHERE key = ?", (key,), commit=True)
+            return
+        self.execute(
+            "INSERT INTO kv (key, value, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+            (key, json.dumps(value), time.time()), commit=True
+        )
+
+    def get(self, key, max_age=None):
+        """
+        Get a stored value.
+
+        Args:
+            key (str): Key
+            max_age (float, optional): Ignore values older than this many seconds
+
+        Returns:
+            Value, or None if missing or too old
+        """
+        rows = self.execute("SELECT value, updated FROM kv WHERE key = ?", (key,))
+        if not rows or (max_age is not None and time.time() - rows[0][1] > max_age):
+            return None
+        return json.loads(rows[0][0])
+
+    def scan(self, prefix):
+        """
+        Get all values under a key prefix.
+
+        Args:
+            prefix (str): Key prefix (e.g. 'enroll/')
+
+        Returns:
+            dict: Values by key, most recently updated first
+        """
+        rows = self.execute("SELECT key, value FROM kv WHERE substr(key, 1, ?) = ? ORDER BY updated DESC",
+                            (len(prefix), prefix))
+        return {key: json.loads(value) for key, value in rows}
+
+    def prune(self, prefix, max_age):
+        """
+        Delete values under a key prefix that weren't updated for a while.
+
+        Args:
+            prefix (str): Key prefix (e.g. 'ingest/')
+            max_age (float): Age in seconds above which values are deleted
+        """
+        self.execute("DELETE FROM kv WHERE substr(key, 1, ?) = ? AND updated < ?",
+                     (len(prefix), prefix, time.time() - max_age), commit=True)
+
+    def set_blob(self, key, value):
+        """
+        Store binary data under a key, bumping its version.
+
+        Args:
+            key (str): Key
+            value (bytes): Data
+        """
+        self.execute(
+            "INSERT INTO blobs (key, value, version, updated) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = blobs.version + 1, "
+            "updated = excluded.updated",
+            (key, sqlite3.Binary(value), time.time()), commit=True
+        )
+
+    def get_blob(self, key, newer_than=0):
+        """
+        Get binary data if it changed.
+
+        Args:
+            key (str): Key
+            newer_than (int): Version the caller already has
+
+        Returns:
+            tuple: (version, bytes), or (newer_than, None) if there is nothing newer
+        """
+        rows = self.execute("SELECT version, value FROM blobs WHERE key = ? AND version > ?", (key, newer_than))
+        return (rows[0][0], bytes(rows[0][1])) if rows else (newer_than, None)
+
+class AttendanceStore:
+    """
+    Attendance records in the shared database, one row per person and day.
+
+    Marks are single SQL statements, so workers can record them concurrently
+    without overwriting each other: an entry is only set once per day, an exit
+    only after an entry. Merged uploads keep the earliest entry and the
+    latest exit.
+    """
+
+    def __init__(self, state):
+        """
+        Initialize the store.
+
+        Args:
+            state (SharedState): Shared database
+        """
+        self.state = state
+        self.state.execute("""
+            CREATE TABLE IF NOT EXISTS attendance (
+                person_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                entry_time TEXT,
+                exit_time TEXT,
+                PRIMARY KEY (person_id, date)
+            )
+        """, commit=True)
+
+    def mark(self, person_id, date_str, direction, time_str):
+        """
+        Record a mark from a camera.
+
+        Args:
+            person_id (str): ID of the person
+            date_str (str): Date (YYYY-MM-DD)
+            direction (str): 'entry' or 'exit'
+            time_str (str): Time (HH:MM:SS)
+
+        Returns:
+            bool: True if the entry or exit time was recorded
+        """
+        if direction == "entry":
+            statement = ("INSERT INTO attendance (person_id, date, entry_time) VALUES (?, ?, ?) "
+                         "ON CONFLICT (person_id, date) DO UPDATE SET entry_time = excluded.entry_time "
+                         "WHERE attendance.entry_time IS NULL", (person_id, date_str, time_str))
+        else:
+            statement = ("UPDATE attendance SET exit_time = ? "
+                         "WHERE person_id = ? AND date = ? AND entry_time IS NOT NULL",
+                         (time_str, person_id, date_str))
+        return self.state.executemany_changes([statement]) > 0
+
+    def merge(self, marks):
+        """
+        Merge marks idempotently (earliest entry and latest exit win).
+
+        Args:
+            marks (list): Dicts with person_id, date, direction and time
+
+        Returns:
+            int: Number of marks that changed a record
+        """
+        statements = []
+        for mark in marks:
+            field = "exit_time" if mark["direction"] == "exit" else "entry_time"
+            comparison = ">" if field == "exit_time" else "<"
+            statements.append((
+                f"INSERT INTO attendance (person_id, date, {field}) VALUES (?, ?, ?) "
+                f"ON CONFLICT (person_id, date) DO UPDATE SET {field} = excluded.{field} "
+                f"WHERE attendance.{field} IS NULL OR excluded.{field} {comparison} attendance.{field}",
+                (mark["person_id"], mark["date"], mark["time"])
+            ))
+        return self.state.executemany_changes(statements)
+
+    def records(self, date_filter=None, person_filter=None):
+        """
+        Get attendance records.
+
+        Args:
+            date_filter (str, optional): Only this date (YYYY-MM-DD)
+            person_filter (str, optional): Only this person
+
+        Returns:
+            list: Records {"person_id", "date", "entry_time", "exit_time"}, newest day first
+        """
+        rows = self.state.execute(
+            "SELECT person_id, date, entry_time, exit_time FROM attendance "
+            "WHERE (? IS NULL OR date = ?) AND (? IS NULL OR person_id = ?) ORDER BY date DESC, person_id",
+            (date_filter, date_filter, person_filter, person_filter)
+        )
+        return [{"person_id": p, "date": d, "entry_time": e, "exit_time": x} for p, d, e, x in rows]
+
+    def import_file(self, attendance_file):
+        """
+        Import an attendance.json file once, if the store is still empty.
+
+        Args:
+            attendance_file (str): JSON file with {"records": [...]}
+
+        Returns:
+            int: Number of records imported
+        """
+        if not os.path.exists(attendance_file) or self.state.execute("SELECT 1 FROM attendance LIMIT 1"):
+            return 0
+        try:
+            with open(attendance_file, "r") as f:
+                records = json.load(f).get("records", [])
+        except (ValueError, AttributeError):
+            return 0
+
+        marks = []
+        for record in records:
+            for direction in ("entry", "exit"):
+                if record.get(f"{direction}_time"):
+                    marks.append({"person_id": record["person_id"], "date": record["date"],
+                                  "direction": direction, "time": record[f"{direction}_time"]})
+        self.merge(marks)
+        print(f"[INFO] Imported {len(records)} attendance records from {attendance_file}")
+        return len(records)
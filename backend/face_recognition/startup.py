@@ -0,0 +1,93 @@
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+class WarmUp:
+    """
+    Track a background warm-up task (model and gallery loading) and time each phase.
+
+    The API can answer /api/status while the heavy imports and loading happen on
+    a background thread; `state` goes from 'pending' to 'warming_up' to 'ready'
+    (or 'error').
+    """
+
+    def __init__(self):
+        """Start the startup clock."""
+        self.started_at = time.time()
+        self.state = "pending"
+        self.error = None
+        self.phases = []
+        self.ready_event = threading.Event()
+        self.thread = None
+
+    @property
+    def is_ready(self):
+        """Whether the warm-up task finished successfully."""
+        return self.state == "ready"
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a named startup phase.
+
+        Args:
+            name (str): Name of the phase shown in the startup report
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            self.phases.append({"phase": name, "seconds": round(seconds, 3)})
+            print(f"[INFO] Startup phase '{name}' took {seconds:.2f}s")
+
+    def start(self, target):
+        """
+        Run the warm-up function on a daemon thread.
+
+        Args:
+            target (callable): Function taking this WarmUp object, using phase() for timing
+        """
+        def run():
+            self.state = "warming_up"
+            try:
+                target(self)
+                self.state = "ready"
+                print(f"[INFO] System ready after {time.time() - self.started_at:.2f}s")
+            except Exception as e:
+                self.state = "error"
+                self.error = str(e)
+                traceback.print_exc()
+            finally:
+                self.ready_event.set()
+
+        self.thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        self.thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Block until the warm-up task finishes.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds
+
+        Returns:
+            bool: True if the system is ready
+        """
+        self.ready_event.wait(timeout)
+        return self.is_ready
+
+    def report(self):
+        """
+        Get the readiness state and the startup-time breakdown.
+
+        Returns:
+            dict: State, error, per-phase timings and total elapsed time
+        """
+        return {
+            "state": self.state,
+            "error": self.error,
+            "phases": list(self.phases),
+            "elapsed_seconds": round(time.time() - self.started_at, 3)
+        }
@@ -0,0 +1,43 @@
+import threading
+import time
+import capture
+from capture import ResilientCapture
+
+class UnreachableCamera:
+    """cv2.VideoCapture of a camera that never opens."""
+
+    def __init__(self, *args):
+        pass
+
+    def isOpened(self):
+        return False
+
+    def release(self):
+        pass
+
+def test_should_stop_ends_a_pending_reconnect(monkeypatch):
+    monkeypatch.setattr(capture.cv2, "VideoCapture", UnreachableCamera)
+    stop = threading.Event()
+    cap = ResilientCapture(0, backoff_initial=30.0, should_stop=stop.is_set)
+
+    reader = threading.Thread(target=cap.read)
+    reader.start()
+    time.sleep(0.2)
+    assert reader.is_alive()
+
+    stop.set()
+    reader.join(timeout=2)
+    assert not reader.is_alive()
+    assert cap.read() == (False, None)
+
+def test_release_ends_a_pending_reconnect(monkeypatch):
+    monkeypatch.setattr(capture.cv2, "VideoCapture", UnreachableCamera)
+    cap = ResilientCapture(0, backoff_initial=30.0)
+
+    reader = threading.Thread(target=cap.read)
+    reader.start()
+    time.sleep(0.2)
+    cap.release()
+    reader.join(timeout=2)
+
+    assert not reader.is_alive()
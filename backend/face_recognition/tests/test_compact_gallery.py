@@ -0,0 +1,80 @@
+import numpy as np
+from compact_gallery import cluster_templates, compact_gallery, compaction_report, remove_near_duplicates, split_probes
+
+def make_gallery(people=4, per_person=10, dimension=128, seed=0):
+    rng = np.random.default_rng(seed)
+    encodings, names = [], []
+    for person in range(people):
+        center = rng.normal(size=dimension) * 0.1
+        for _ in range(per_person):
+            encodings.append(center + rng.normal(size=dimension) * 0.01)
+            names.append(f"person_{person}")
+    return {"encodings": encodings, "names": names}
+
+def test_remove_near_duplicates_keeps_first_of_each_group():
+    a = np.zeros(4)
+    b = np.ones(4)
+    templates = np.array([a, a + 0.01, b, b + 0.01, a + 0.02])
+
+    kept = remove_near_duplicates(templates, threshold=0.1)
+
+    np.testing.assert_array_equal(kept, [a, b])
+
+def test_cluster_templates_finds_separated_groups():
+    rng = np.random.default_rng(1)
+    centers = np.eye(3, 8) * 5
+    templates = np.vstack([center + rng.normal(size=(6, 8)) * 0.01 for center in centers])
+
+    representatives = cluster_templates(templates, k=3)
+
+    assert representatives.shape == (3, 8)
+    for center in centers:
+        assert np.min(np.linalg.norm(representatives - center, axis=1)) < 0.05
+
+def test_cluster_templates_is_deterministic_and_keeps_small_sets():
+    templates = np.random.default_rng(2).normal(size=(20, 8))
+
+    np.testing.assert_array_equal(cluster_templates(templates, k=3), cluster_templates(templates, k=3))
+    np.testing.assert_array_equal(cluster_templates(templates[:2], k=3), templates[:2])
+
+def test_compact_gallery_limits_templates_per_person_in_first_seen_order():
+    data = make_gallery()
+    data["names"] = data["names"][10:20] + data["names"][:10] + data["names"][20:]
+
+    compacted = compact_gallery(data, k=3)
+
+    assert len(compacted["encodings"]) == len(compacted["names"]) == 12
+    assert list(dict.fromkeys(compacted["names"])) == ["person_1", "person_0", "person_2", "person_3"]
+
+def test_compact_gallery_of_empty_gallery():
+    assert compact_gallery({"encodings": [], "names": []}) == {"encodings": [], "names": []}
+
+def test_split_probes_holds_out_templates_of_people_with_several():
+    data = make_gallery(people=2, per_person=7)
+    data["encodings"].append(np.zeros(128))
+    data["names"].append("single")
+
+    gallery, probes = split_probes(data, every=5)
+
+    assert sorted(probes["names"]) == ["person_0", "person_0", "person_1", "person_1"]
+    assert gallery["names"].count("single") == 1
+    assert len(gallery["names"]) + len(probes["names"]) == len(data["names"])
+
+def test_compaction_report_uses_the_same_probes_for_both_recalls():
+    data = make_gallery()
+    compacted = compact_gallery(data, k=3)
+
+    report = compaction_report(data, compacted, k=3)
+
+    assert report["templates_before"] == 40
+    assert report["templates_after"] == 12
+    assert report["probes"] == 8
+    assert report["recall_before"] == report["recall_after"] == 1.0
+
+def test_compaction_report_without_probes():
+    data = {"encodings": [np.zeros(128)], "names": ["single"]}
+
+    report = compaction_report(data, data)
+
+    assert report["probes"] == 0
+    assert report["recall_before"] is None and report["recall_after"] is None
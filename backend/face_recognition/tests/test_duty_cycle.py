@@ -0,0 +1,64 @@
+import time
+import pytest
+from duty_cycle import DutyCycle, SharedTriggerLog
+from shared_state import SharedState
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "state.db")
+
+def worker(state_path, name):
+    duty_cycle = DutyCycle(linger=30, pulse=60, idle_interval=0.5)
+    return duty_cycle, SharedTriggerLog(SharedState(state_path, worker_id=name), duty_cycle)
+
+def test_door_holds_full_rate_until_linger_ends():
+    duty_cycle = DutyCycle(linger=30)
+    now = time.time()
+
+    duty_cycle.trigger("door_open", at=now - 100)
+    assert duty_cycle.is_active()
+
+    duty_cycle.trigger("door_close", at=now - 40)
+    assert not duty_cycle.is_active()
+
+def test_malformed_messages_are_rejected_before_logging(state_path):
+    _, log = worker(state_path, "a")
+
+    for message in ({"speed": 3}, {"lat": "north", "lon": 1}, 42):
+        with pytest.raises((ValueError, TypeError)):
+            log.handle(message)
+    assert log.state.scan("trigger/") == {}
+
+def test_owner_applies_triggers_received_by_another_worker(state_path):
+    owner_cycle, owner_log = worker(state_path, "owner")
+    _, other_log = worker(state_path, "other")
+
+    other_log.handle({"event": "door_open"})
+
+    assert not owner_cycle.is_active()
+    assert owner_log.poll(force=True) == ["door_open"]
+    assert owner_cycle.is_active()
+    assert owner_log.poll(force=True) == []
+
+def test_new_owner_rebuilds_state_from_the_log(state_path):
+    _, log = worker(state_path, "a")
+    log.handle({"at_stop": True, "stop": "Main St"})
+    log.handle("motion")
+
+    new_cycle, new_log = worker(state_path, "b")
+    events = new_log.poll(force=True)
+
+    assert events == ["arrive", "motion"]
+    assert new_cycle.get_stats()["holds"] == ["stop"]
+
+def test_wait_idle_wakes_up_on_a_logged_trigger(state_path):
+    owner_cycle, owner_log = worker(state_path, "owner")
+    owner_cycle.idle_interval = 5.0
+    _, other_log = worker(state_path, "other")
+    other_log.handle("motion")
+
+    start = time.time()
+    owner_log.wait_idle()
+
+    assert time.time() - start < 1.0
+    assert owner_cycle.is_active()
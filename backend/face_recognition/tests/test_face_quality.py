@@ -0,0 +1,66 @@
+import sys
+import types
+import numpy as np
+from face_quality import FaceTracker, QualityGate, box_iou
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def passed(score):
+    return {"passed": True, "score": score}
+
+def test_box_iou():
+    assert box_iou((0, 10, 10, 0), (0, 10, 10, 0)) == 1.0
+    assert box_iou((0, 10, 10, 0), (0, 15, 10, 5)) == 50 / 150
+    assert box_iou((0, 10, 10, 0), (20, 30, 30, 20)) == 0.0
+
+def test_overlapping_boxes_continue_a_track_per_camera():
+    tracker = FaceTracker(clock=Clock())
+
+    track = tracker.update("entry", (100, 180, 180, 100))
+
+    assert tracker.update("entry", (100, 185, 180, 105)) is track
+    assert tracker.update("entry", (100, 480, 180, 400)) is not track
+    assert tracker.update("exit", (100, 180, 180, 100)) is not track
+
+def test_track_expires_after_max_age():
+    clock = Clock()
+    tracker = FaceTracker(max_age=1.0, clock=clock)
+    track = tracker.update("entry", (100, 180, 180, 100))
+
+    clock.now = 1.5
+
+    assert tracker.update("entry", (100, 180, 180, 100)) is not track
+
+def test_encoded_again_only_for_a_better_or_stale_frame():
+    clock = Clock()
+    tracker = FaceTracker(min_gain=0.05, max_reuse=3.0, clock=clock)
+    track = tracker.update("entry", (100, 180, 180, 100))
+
+    assert tracker.needs_encoding(track, passed(0.5))
+    assert not tracker.remember(track, {"name": "alice"}, passed(0.5))
+    assert not tracker.needs_encoding(track, passed(0.52))
+    assert not tracker.needs_encoding(track, {"passed": False, "score": 0.9})
+    assert tracker.needs_encoding(track, passed(0.6))
+    assert tracker.remember(track, {"name": "alice"}, passed(0.6))
+
+    clock.now = 4.0
+    assert tracker.needs_encoding(track, passed(0.1))
+
+def test_yaw_from_landmarks(monkeypatch):
+    def face_landmarks(rgb_frame, locations, model):
+        nose_x = rgb_frame[0, 0, 0]
+        return [{"left_eye": [(28, 40), (32, 40)], "right_eye": [(68, 40), (72, 40)], "nose_tip": [(nose_x, 60)]}]
+
+    monkeypatch.setitem(sys.modules, "face_recognition", types.SimpleNamespace(face_landmarks=face_landmarks))
+    gate = QualityGate()
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+
+    frame[0, 0, 0] = 50
+    assert gate._estimate_yaw(frame, (0, 100, 100, 0)) == 0.0
+    frame[0, 0, 0] = 65
+    assert gate._estimate_yaw(frame, (0, 100, 100, 0)) > gate.max_yaw
@@ -0,0 +1,111 @@
+import uuid
+import numpy as np
+import pytest
+from frame_bus import FrameBus, FrameRing, HeldFrame
+
+SHAPE = (4, 6, 3)
+
+def frame(value, shape=SHAPE):
+    return np.full(shape, value, dtype=np.uint8)
+
+class FakeCapture:
+    """Capture returning queued frames, decoding into the given buffer like cv2.VideoCapture.read."""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self, image=None):
+        if not self.frames:
+            return False, None
+        next_frame = self.frames.pop(0)
+        if image is not None and image.shape == next_frame.shape:
+            np.copyto(image, next_frame)
+            return True, image
+        return True, next_frame.copy()
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(f"test_ring_{uuid.uuid4().hex[:8]}", SHAPE, slots=3)
+    yield ring
+    ring.close()
+
+@pytest.fixture
+def bus():
+    bus = FrameBus(prefix=f"test_bus_{uuid.uuid4().hex[:8]}", slots=3)
+    yield bus
+    bus.close()
+
+def test_frames_are_valid_until_the_writer_laps_them(ring):
+    seqs = [ring.write(frame(i)) for i in range(3)]
+
+    assert seqs == [0, 1, 2]
+    assert all(ring.is_valid(seq) for seq in seqs)
+
+    ring.write(frame(3))
+
+    assert not ring.is_valid(0)
+    assert ring.get(0) is None
+    assert ring.latest_seq == 3
+    assert ring.get(3)[0, 0, 0] == 3
+
+def test_slot_being_written_is_invalid(ring):
+    ring.write(frame(0))
+    ring.write(frame(1))
+    ring.write(frame(2))
+
+    seq, slot = ring.acquire()
+    assert seq == 3 and not ring.is_valid(0)
+    np.copyto(slot, frame(3))
+    ring.commit(seq)
+    assert ring.is_valid(3)
+
+def test_views_are_read_only(ring):
+    seq = ring.write(frame(7))
+
+    with pytest.raises(ValueError):
+        ring.get(seq)[0, 0, 0] = 1
+
+def test_held_frame_detects_being_lapped(ring):
+    ring.write(frame(1))
+
+    with HeldFrame(ring) as held:
+        assert held.seq == 0 and held.is_valid()
+        assert held.copy()[0, 0, 0] == 1
+        for i in range(3):
+            ring.write(frame(10 + i))
+        assert not held.is_valid()
+        assert held.copy() is None
+
+def test_closed_ring_stays_mapped_until_released():
+    ring = FrameRing(f"test_ring_{uuid.uuid4().hex[:8]}", SHAPE, slots=3)
+    ring.write(frame(5))
+
+    held = HeldFrame(ring)
+    ring.close()
+    assert held.copy()[0, 0, 0] == 5
+    assert HeldFrame(ring).frame is None
+
+    held.release()
+    assert ring.holders == 0
+
+def test_bus_captures_into_the_ring_and_replaces_it_on_resize(bus):
+    cap = FakeCapture([frame(1), frame(2), frame(3, shape=(8, 6, 3))])
+
+    assert bus.capture("entry", cap) == (True, 0)
+    old = bus.hold("entry")
+    assert bus.capture("entry", cap) == (True, 1)
+    assert old.seq == 0 and old.is_valid()
+
+    assert bus.capture("entry", cap) == (True, 0)
+    with bus.hold("entry") as held:
+        assert held.frame.shape == (8, 6, 3)
+
+    # The frame held before the resize is still readable
+    assert old.copy()[0, 0, 0] == 1
+    old.release()
+
+    assert bus.capture("entry", cap) == (False, None)
+
+def test_hold_of_unknown_camera_has_no_frame(bus):
+    with bus.hold("missing") as held:
+        assert held.frame is None and not held.is_valid() and held.copy() is None
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pytest
+from gallery_sync import (GalleryRepository, apply_delta, compute_delta, gallery_digest, read_gallery,
+                          read_node_version, sync_gallery, write_gallery)
+
+def templates(*values, dimension=4):
+    return [np.full(dimension, value, dtype=np.float32) for value in values]
+
+@pytest.fixture
+def repository(tmp_path):
+    return GalleryRepository(str(tmp_path / "repository"))
+
+def test_compute_and_apply_delta():
+    old = {"alice": templates(1), "bob": templates(2), "carol": templates(3)}
+    new = {"alice": templates(1), "bob": templates(2, 2.5), "dave": templates(4)}
+
+    delta = compute_delta(old, new)
+
+    assert list(delta["add"]) == ["dave"]
+    assert delta["remove"] == ["carol"]
+    assert list(delta["update"]) == ["bob"]
+    assert gallery_digest(apply_delta(old, delta)) == gallery_digest(new)
+    assert "carol" in old
+
+def test_digest_ignores_insertion_order():
+    a = {"alice": templates(1), "bob": templates(2)}
+    b = {"bob": templates(2), "alice": templates(1)}
+
+    assert gallery_digest(a) == gallery_digest(b)
+    assert gallery_digest(a) != gallery_digest({"alice": templates(1), "bob": templates(3)})
+
+def test_publish_skips_unchanged_gallery(repository):
+    gallery = {"alice": templates(1)}
+
+    assert repository.publish(gallery)[0] == 1
+    assert repository.publish(dict(gallery)) == (1, None)
+
+def test_node_follows_delta_chain(repository, tmp_path):
+    node_file = str(tmp_path / "node.json")
+    repository.publish({"alice": templates(1)})
+    assert sync_gallery(node_file, repository.directory)["method"] == "snapshot"
+
+    repository.publish({"alice": templates(1), "bob": templates(2)})
+    final = {"alice": templates(1.5), "bob": templates(2), "carol": templates(3)}
+    repository.publish(final)
+
+    report = sync_gallery(node_file, repository.directory)
+
+    assert (report["from"], report["to"], report["method"]) == (1, 3, "delta")
+    assert gallery_digest(read_gallery(node_file)) == gallery_digest(final)
+    assert read_node_version(node_file)["version"] == 3
+    assert sync_gallery(node_file, repository.directory)["method"] == "up_to_date"
+
+def test_locally_modified_node_falls_back_to_snapshot(repository, tmp_path):
+    node_file = str(tmp_path / "node.json")
+    repository.publish({"alice": templates(1)})
+    sync_gallery(node_file, repository.directory)
+    write_gallery({"alice": templates(9)}, node_file)
+
+    latest = {"alice": templates(1), "bob": templates(2)}
+    repository.publish(latest)
+    report = sync_gallery(node_file, repository.directory)
+
+    assert report["method"] == "snapshot"
+    assert gallery_digest(read_gallery(node_file)) == gallery_digest(latest)
+
+def test_corrupted_delta_falls_back_to_snapshot(repository, tmp_path):
+    node_file = str(tmp_path / "node.json")
+    repository.publish({"alice": templates(1)})
+    sync_gallery(node_file, repository.directory)
+    repository.publish({"alice": templates(1), "bob": templates(2)})
+
+    delta_file = os.path.join(repository.directory, repository.load_manifest()["deltas"]["1"]["file"])
+    with open(delta_file, "ab") as f:
+        f.write(b"garbage")
+
+    assert sync_gallery(node_file, repository.directory)["method"] == "snapshot"
@@ -0,0 +1,110 @@
+import gzip
+import io
+import json
+import urllib.error
+import urllib.request
+import pytest
+from outbox import AttendanceOutbox
+
+class FakeEndpoint:
+    """Stands in for urlopen: records uploaded batches and answers with the next queued status."""
+
+    def __init__(self, reject=()):
+        self.batches = []
+        self.statuses = []
+        self.reject = set(reject)
+
+    def __call__(self, request, timeout=None):
+        document = json.loads(gzip.decompress(request.data))
+        people = [mark["person_id"] for mark in document["marks"]]
+        self.batches.append(people)
+
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 200 and self.reject & set(people):
+            status = 400
+        if status != 200:
+            raise urllib.error.HTTPError(request.full_url, status, "error", {}, io.BytesIO())
+        return io.BytesIO(b"{}")
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    fake = FakeEndpoint()
+    monkeypatch.setattr(urllib.request, "urlopen", fake)
+    return fake
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = AttendanceOutbox(str(tmp_path / "outbox.db"), endpoint="http://ingest.invalid/marks",
+                              node_id="node", batch_size=2)
+    yield outbox
+    outbox.stop()
+
+def record(outbox, people, direction="entry"):
+    for i, person in enumerate(people):
+        outbox.record(person, "2026-01-05", direction, f"08:00:{i:02d}")
+
+def test_record_keeps_earliest_entry_and_latest_exit(outbox):
+    outbox.record("alice", "2026-01-05", "entry", "08:00:00")
+    outbox.record("alice", "2026-01-05", "entry", "09:00:00")
+    outbox.record("alice", "2026-01-05", "exit", "16:00:00")
+    outbox.record("alice", "2026-01-05", "exit", "17:00:00")
+
+    times = {mark["direction"]: mark["time"] for mark in outbox.pending()}
+
+    assert times == {"entry": "08:00:00", "exit": "17:00:00"}
+
+def test_batch_id_depends_only_on_content(outbox):
+    marks = [{"person_id": "alice", "date": "2026-01-05", "direction": "entry", "time": "08:00:00"}]
+
+    assert outbox.build_batch(marks)[0] == outbox.build_batch(list(marks))[0]
+    assert outbox.build_batch(marks)[0] != outbox.build_batch([dict(marks[0], time="08:00:01")])[0]
+
+def test_upload_pending_sends_batches_oldest_first(outbox, endpoint):
+    record(outbox, ["a", "b", "c", "d", "e"])
+
+    assert outbox.upload_pending() == 5
+    assert endpoint.batches == [["a", "b"], ["c", "d"], ["e"]]
+    assert outbox.get_stats()["pending"] == 0
+    assert outbox.get_stats()["uploaded_batches"] == 3
+
+@pytest.mark.parametrize("status", [500, 503, 401, 403, 404, 405, 408, 429])
+def test_retryable_errors_keep_marks_pending(outbox, endpoint, status):
+    record(outbox, ["a", "b", "c"])
+    endpoint.statuses = [200, status]
+
+    with pytest.raises(OSError):
+        outbox.upload_pending()
+    assert [mark["person_id"] for mark in outbox.pending()] == ["c"]
+
+    # The next attempt picks up where the failed one stopped
+    assert outbox.upload_pending() == 1
+    assert endpoint.batches[-1] == ["c"]
+
+def test_rejected_marks_are_quarantined_and_the_rest_uploaded(outbox, endpoint):
+    endpoint.reject = {"bad"}
+    record(outbox, ["a", "bad", "c", "d"])
+
+    assert outbox.upload_pending() == 3
+
+    stats = outbox.get_stats()
+    assert (stats["pending"], stats["uploaded"], stats["rejected"]) == (0, 3, 1)
+    assert "bad" in stats["last_error"]
+
+def test_a_changed_mark_is_uploaded_again(outbox, endpoint):
+    outbox.record("alice", "2026-01-05", "exit", "16:00:00")
+    outbox.upload_pending()
+
+    outbox.record("alice", "2026-01-05", "exit", "17:00:00")
+
+    assert [mark["time"] for mark in outbox.pending()] == ["17:00:00"]
+
+def test_misconfigured_endpoint_quarantines_nothing(outbox, endpoint):
+    record(outbox, ["a", "b", "c", "d"])
+    endpoint.statuses = [404] * 10
+
+    with pytest.raises(OSError):
+        outbox.upload_pending()
+
+    assert len(endpoint.batches) == 1
+    assert outbox.get_stats()["pending"] == 4
+    assert outbox.get_stats()["rejected"] == 0
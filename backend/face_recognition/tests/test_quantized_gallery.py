@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+from quantized_gallery import QuantizedGallery, map_full_precision
+
+def make_encodings(count=200, dimension=128, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(count, dimension)).astype(np.float32) * 0.1
+
+def test_int8_round_trip_error_is_within_half_a_step():
+    encodings = make_encodings()
+
+    gallery = QuantizedGallery(encodings, [str(i) for i in range(len(encodings))], mode="int8")
+    restored = gallery.codes.astype(np.float32) * gallery.scale
+
+    assert gallery.codes.dtype == np.int8
+    assert np.all(np.abs(restored - encodings) <= gallery.scale / 2 + 1e-7)
+
+def test_zero_dimension_does_not_divide_by_zero():
+    encodings = make_encodings(count=10, dimension=4)
+    encodings[:, 2] = 0
+
+    gallery = QuantizedGallery(encodings, [str(i) for i in range(10)], mode="int8")
+
+    assert np.all(np.isfinite(gallery.codes.astype(np.float32) * gallery.scale))
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_search_returns_exact_distance_after_reranking(mode):
+    encodings = make_encodings()
+    queries = encodings[[3, 50, 199]] + 0.001
+
+    gallery = QuantizedGallery(encodings, [str(i) for i in range(len(encodings))], mode=mode, rerank=8)
+    best, distances = gallery.search(queries)
+
+    exact = np.linalg.norm(encodings[None, :, :] - queries[:, None, :], axis=2)
+    np.testing.assert_array_equal(best, [3, 50, 199])
+    np.testing.assert_allclose(distances, exact.min(axis=1), rtol=1e-5)
+
+def test_match_applies_tolerance():
+    encodings = make_encodings(count=5)
+    gallery = QuantizedGallery(encodings, ["a", "b", "c", "d", "e"])
+
+    matches = gallery.match([encodings[1], encodings[1] + 10.0])
+
+    assert matches[0][0] == "b"
+    assert matches[1] == (None, 0.0)
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        QuantizedGallery(make_encodings(count=2), ["a", "b"], mode="int4")
+
+def test_full_precision_file_is_reused_when_newer_than_source(tmp_path):
+    encodings = make_encodings(count=20)
+    source = tmp_path / "encodings.pkl"
+    sidecar = tmp_path / "encodings.f32.npy"
+    source.write_bytes(b"")
+
+    mapped = map_full_precision(encodings, str(sidecar), str(source))
+    np.testing.assert_array_equal(mapped, encodings)
+    os.utime(sidecar, (os.path.getmtime(source) + 10,) * 2)
+    written = os.path.getmtime(sidecar)
+
+    # Same shape and newer than the source: reused as-is, even with other content
+    map_full_precision(np.zeros_like(encodings), str(sidecar), str(source))
+    assert os.path.getmtime(sidecar) == written
+
+    # Different shape: rewritten
+    remapped = map_full_precision(encodings[:5], str(sidecar), str(source))
+    np.testing.assert_array_equal(remapped, encodings[:5])
@@ -0,0 +1,192 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+class Tracer:
+    """
+    Opt-in tracing of the detection pipeline.
+
+    While enabled, span() records how long each pipeline stage took, per
+    thread, as Chrome trace "complete" events that open in chrome://tracing or
+    https://ui.perfetto.dev. Optionally a sampler thread periodically records
+    the Python stack of every thread, written as collapsed stacks for
+    flamegraph tools (flamegraph.pl, speedscope). While disabled, span() is a
+    no-op, so instrumentation can stay in the hot path.
+    """
+
+    def __init__(self, max_events=200000):
+        """
+        Initialize the tracer (disabled).
+
+        Args:
+            max_events (int): Maximum buffered span events (oldest are dropped)
+        """
+        self.max_events = max_events
+        self.enabled = False
+        self.events = deque(maxlen=max_events)
+        self.stacks = Counter()
+        self.thread_names = {}
+        self.samples = 0
+        self.origin_ns = 0
+        self.started_at = None
+        self.sample_interval = None
+        self.sampler_thread = None
+        self.stop_sampling = threading.Event()
+        self.lock = threading.Lock()
+
+    def span(self, name, **args):
+        """
+        Context manager timing one stage.
+
+        Args:
+            name (str): Stage name
+            **args: Extra values shown with the span (e.g. batch size)
+
+        Returns:
+            Context manager recording the span if tracing is enabled
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._record(name, args)
+
+    @contextmanager
+    def _record(self, name, args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            thread_id = threading.get_ident()
+            if thread_id not in self.thread_names:
+                self.thread_names[thread_id] = threading.current_thread().name
+            self.events.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.origin_ns) / 1000.0,
+                "dur": (end - start) / 1000.0,
+                "pid": os.getpid(),
+                "tid": thread_id,
+                "args": args
+            })
+
+    def start(self, sample_interval=None):
+        """
+        Start tracing, discarding previously recorded data.
+
+        Args:
+            sample_interval (float, optional): Seconds between stack samples (no sampling if omitted)
+        """
+        with self.lock:
+            self._stop_sampler()
+            self.events.clear()
+            self.stacks.clear()
+            self.thread_names.clear()
+            self.samples = 0
+            self.origin_ns = time.perf_counter_ns()
+            self.started_at = datetime.now()
+            self.sample_interval = sample_interval
+            self.enabled = True
+
+            if sample_interval:
+                self.stop_sampling.clear()
+                self.sampler_thread = threading.Thread(target=self._sample_loop, name="trace-sampler", daemon=True)
+                self.sampler_thread.start()
+
+    def _stop_sampler(self):
+        self.stop_sampling.set()
+        if self.sampler_thread:
+            self.sampler_thread.join(timeout=1.0)
+            self.sampler_thread = None
+
+    def _sample_loop(self):
+        """Sampler thread: record the collapsed Python stack of every other thread."""
+        own_id = threading.get_ident()
+        while not self.stop_sampling.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        """Stop recording spans and stack samples (recorded data is kept until the next start)."""
+        with self.lock:
+            self.enabled = False
+            self._stop_sampler()
+
+    def chrome_trace(self):
+        """
+        Build the Chrome trace / Perfetto JSON document of the recorded spans.
+
+        Returns:
+            dict: Trace document with thread name metadata
+        """
+        events = list(self.events)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+             "args": {"name": self.thread_names.get(tid, str(tid))}}
+            for tid in {event["tid"] for event in events}
+        ]
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def collapsed_stacks(self):
+        """
+        Render stack samples in collapsed format ("frame;frame;frame count" per line).
+
+        Returns:
+            str: Collapsed stacks
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def export(self, directory="traces"):
+        """
+        Write the trace (and stack samples, if any) to files.
+
+        Args:
+            directory (str): Output directory
+
+        Returns:
+            dict: Paths of the written files
+        """
+        os.makedirs(directory, exist_ok=True)
+        stamp = (self.started_at or datetime.now()).strftime("%Y%m%d_%H%M%S")
+        files = {"trace": os.path.join(directory, f"trace_{stamp}.json")}
+        with open(files["trace"], "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+        if self.stacks:
+            files["stacks"] = os.path.join(directory, f"stacks_{stamp}.collapsed")
+            with open(files["stacks"], "w") as f:
+                f.write(self.collapsed_stacks())
+        return files
+
+    def get_stats(self):
+        """
+        Get tracing state.
+
+        Returns:
+            dict: Whether tracing is on, since when, and how much was recorded
+        """
+        return {
+            "enabled": self.enabled,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "events": len(self.events),
+            "dropped_events": len(self.events) == self.max_events,
+            "sample_interval": self.sample_interval,
+            "stack_samples": self.samples
+        }
+
+# Shared tracer used by the instrumented pipeline
+tracer = Tracer()
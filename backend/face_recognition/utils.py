@@ -2,10 +2,19 @@ import face_recognition
 import cv2
 import pickle
 import os
+import json
+import socket
 import numpy as np
 from pathlib import Path
+from contextlib import contextmanager
 import glob
 
+try:
+    import fcntl
+except ImportError:
+    # Windows: no inter-process lock, merges are only serialized within a process
+    fcntl = None
+
 def load_encodings(encodings_file):
     """
     Load face encodings from a pickle file.
@@ -38,6 +47,48 @@ def save_encodings(encodings_data, encodings_file):
     with open(encodings_file, "wb") as f:
         pickle.dump(encodings_data, f)
 
+@contextmanager
+def encodings_lock(encodings_file):
+    """
+    Hold an exclusive lock on an encodings file across processes (e.g. API workers merging enrollments).
+    
+    Args:
+        encodings_file (str): Path to the encodings file (the lock is '<file>.lock')
+    """
+    with open(encodings_file + ".lock", "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Settings tuned per host by autotune.py, passed straight to FaceDetectionSystem
+TUNED_SETTINGS = ("detection_method", "max_frame_size", "upsample", "frame_stride")
+
+def load_host_config(config_file):
+    """
+    Load the detection settings of a host config written by autotune.py.
+    
+    Args:
+        config_file (str): Path to the host config
+        
+    Returns:
+        dict: FaceDetectionSystem keyword arguments (empty if the file doesn't exist)
+    """
+    if not config_file or not os.path.exists(config_file):
+        return {}
+    
+    with open(config_file, "r") as f:
+        config = json.load(f)
+    
+    settings = {key: config["settings"][key] for key in TUNED_SETTINGS if key in config["settings"]}
+    if config.get("host") != socket.gethostname():
+        print(f"[WARNING] {config_file} was tuned on {config.get('host')}, not on this host")
+    print(f"[INFO] Loaded host config {config_file}: {settings}")
+    return settings
+
 def find_matching_face(face_encoding, known_encodings, known_names, tolerance=0.6):
     """
     Find a matching face in the known encodings.
@@ -71,6 +122,48 @@ def find_matching_face(face_encoding, known_encodings, known_names, tolerance=0.
     else:
         return None, confidence
 
+def find_matching_faces(face_encodings, known_encodings, known_names, tolerance=0.6):
+    """
+    Find matching faces for several encodings at once.
+    
+    Args:
+        face_encodings (numpy.ndarray): Face encodings to match, shape (n, 128)
+        known_encodings (numpy.ndarray): Known face encodings, shape (m, 128)
+        known_names (list): List of names corresponding to known encodings
+        tolerance (float): Matching tolerance (lower is stricter)
+        
+    Returns:
+        list: (name, confidence) per face encoding, name is None if no match
+    """
+    face_encodings = np.asarray(face_encodings, dtype=np.float64)
+    if len(face_encodings) == 0:
+        return []
+    if len(known_encodings) == 0:
+        return [(None, 0.0)] * len(face_encodings)
+    
+    # Distances between every face and every known encoding, shape (n, m), from
+    # ||a - b||^2 = ||a||^2 + ||b||^2 - 2ab so no (n, m, 128) difference array is built
+    known_encodings = np.asarray(known_encodings, dtype=np.float64)
+    squared = (
+        np.sum(face_encodings * face_encodings, axis=1)[:, None]
+        + np.sum(known_encodings * known_encodings, axis=1)[None, :]
+        - 2.0 * face_encodings @ known_encodings.T
+    )
+    face_distances = np.sqrt(np.maximum(squared, 0.0))
+    
+    best_match_indices = np.argmin(face_distances, axis=1)
+    best_match_distances = face_distances[np.arange(len(face_encodings)), best_match_indices]
+    
+    matches = []
+    for index, distance in zip(best_match_indices, best_match_distances):
+        confidence = 1.0 - min(distance, 1.0)
+        if confidence >= (1.0 - tolerance):
+            matches.append((known_names[index], confidence))
+        else:
+            matches.append((None, confidence))
+    
+    return matches
+
 def encode_faces_from_directory(images_dir, encodings_file=None, detection_method="hog"):
     """
     Create face encodings from all images in a directory.
@@ -11,6 +11,38 @@ export interface AttendanceRecord {
   camera: 'entry' | 'exit';
 }
 
+// Marks of one child on one day
+export interface DailyMarks {
+  entry: string | null;
+  exit: string | null;
+}
+
+// Precomputed summary of one day
+export interface DaySummary {
+  date: string;
+  present: number;
+  entries: number;
+  exits: number;
+  people: Record<string, DailyMarks>;
+  absent?: string[];
+}
+
+// Precomputed summary of one month
+export interface MonthSummary {
+  month: string;
+  school_days: number;
+  days: Record<string, { present: number; absent?: number }>;
+  children: Record<string, number>;
+}
+
+// Attendance history of one child
+export interface ChildSummary {
+  name: string;
+  days_present: number;
+  school_days: number;
+  history: Record<string, DailyMarks>;
+}
+
 // Interface for system status
 export interface SystemStatus {
   system_ready: boolean;
@@ -42,6 +74,48 @@ export async function getAttendanceRecords(): Promise<AttendanceRecord[]> {
   return response.json();
 }
 
+/**
+ * Get precomputed attendance rollups for the calendar view
+ * @param month Month to summarise (YYYY-MM), defaults to the current month
+ */
+export async function getMonthSummary(month?: string): Promise<MonthSummary> {
+  const query = month ? `?month=${encodeURIComponent(month)}` : '';
+  const response = await fetch(`${API_BASE_URL}/attendance/summary${query}`);
+  if (!response.ok) {
+    throw new Error(`Failed to get attendance summary: ${response.statusText}`);
+  }
+  return response.json();
+}
+
+/**
+ * Get the precomputed summary of a single day
+ * @param date Day to summarise (YYYY-MM-DD)
+ */
+export async function getDaySummary(date: string): Promise<DaySummary> {
+  const response = await fetch(`${API_BASE_URL}/attendance/summary?date=${encodeURIComponent(date)}`);
+  if (!response.ok) {
+    throw new Error(`Failed to get attendance summary: ${response.statusText}`);
+  }
+  return response.json();
+}
+
+/**
+ * Get the attendance history of one child
+ * @param name Name of the child
+ * @param month Optional month (YYYY-MM) to restrict the history to
+ */
+export async function getChildSummary(name: string, month?: string): Promise<ChildSummary> {
+  const params = new URLSearchParams({ person: name });
+  if (month) {
+    params.set('month', month);
+  }
+  const response = await fetch(`${API_BASE_URL}/attendance/summary?${params}`);
+  if (!response.ok) {
+    throw new Error(`Failed to get attendance summary: ${response.statusText}`);
+  }
+  return response.json();
+}
+
 /**
  * Start the face recognition system
  * @param cameraType Which camera to use - 'entry', 'exit', or 'both'
@@ -99,6 +173,9 @@ export async function encodeFaces(): Promise<{ success: boolean; message: string
 const FaceRecognitionAPI = {
   getSystemStatus,
   getAttendanceRecords,
+  getMonthSummary,
+  getDaySummary,
+  getChildSummary,
   startFaceRecognition,
   stopFaceRecognition,
   encodeFaces,
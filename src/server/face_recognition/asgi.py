@@ -0,0 +1,67 @@
+# Async (ASGI) serving mode for the face recognition server.
+#
+# Status and attendance are served by async handlers that do their file and
+# shared-state (SQLite) reads in the default executor, so polling dashboards
+# never wait behind heavy work and never stall the event loop; /api/encode
+# only starts a background enrollment job. Other routes fall through to the
+# Flask app.
+#
+# Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+import asyncio
+import os
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+import server
+
+async def status(request):
+    """Get the status of the face recognition system (shared-state reads happen off the event loop)"""
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(None, server.status_payload)
+    return JSONResponse(payload)
+
+async def attendance(request):
+    """Get the attendance data (file reads happen off the event loop)"""
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(
+        None, server.attendance_payload, request.query_params.get('date')
+    )
+    return JSONResponse(payload)
+
+async def attendance_summary(request):
+    """Get precomputed attendance rollups (catching up on new marks happens off the event loop)"""
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(
+        None,
+        server.summary_payload,
+        request.query_params.get('date'),
+        request.query_params.get('month'),
+        request.query_params.get('person')
+    )
+    return JSONResponse(payload)
+
+async def encode(request):
+    """Start re-encoding the dataset directory (runs as an enrollment job in a child process)"""
+    loop = asyncio.get_running_loop()
+    payload, code = await loop.run_in_executor(None, server.encode_payload)
+    return JSONResponse(payload, status_code=code)
+
+app = Starlette(middleware=[
+    # Same cross-origin policy as the Flask app
+    Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+], routes=[
+    Route('/api/status', status, methods=['GET']),
+    Route('/api/attendance', attendance, methods=['GET']),
+    Route('/api/attendance/summary', attendance_summary, methods=['GET']),
+    Route('/api/encode', encode, methods=['POST']),
+    # Everything else (start/stop, enrollment uploads) is served by the Flask app
+    Mount('/', app=WSGIMiddleware(server.app))
+])
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get("PORT", 5000)))
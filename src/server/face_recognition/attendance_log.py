@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+class DailyAttendanceLog:
+    """
+    Append-only attendance writer partitioned by day.
+
+    Each mark is appended as one JSON line to attendance_{date}.jsonl instead of
+    rewriting the whole day on every mark. Only the most recent entries of the
+    current day are kept in memory, and the per-camera "already marked" sets are
+    reset automatically when the date changes, so a process left running over
+    midnight starts marking children again on the next day.
+
+    Listeners are called as listener(entry, offset) after each mark is written,
+    where offset is the size of the day's log file including that mark.
+    """
+
+    def __init__(self, directory=".", max_recent=500, clock=datetime.now, listeners=None):
+        self.directory = directory
+        self.clock = clock
+        self.listeners = list(listeners or [])
+        self.recent = deque(maxlen=max_recent)
+        self.marked = {"entry": set(), "exit": set()}
+        self.current_date = None
+        self._file = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._roll_over(self.clock().strftime("%Y-%m-%d"))
+
+    def path_for(self, date_str):
+        """Path of the log file for a given YYYY-MM-DD date"""
+        return os.path.join(self.directory, f"attendance_{date_str}.jsonl")
+
+    def _roll_over(self, date_str):
+        """Switch to a new day: close the old file and reset in-memory state"""
+        if self._file:
+            self._file.close()
+
+        self.current_date = date_str
+        self.recent.clear()
+        for marked_set in self.marked.values():
+            marked_set.clear()
+
+        # Restore today's state if the process restarted during the day
+        for entry in self.read_day(date_str):
+            self.recent.append(entry)
+            self.marked.setdefault(entry["camera"], set()).add(entry["name"])
+
+        self._file = open(self.path_for(date_str), "a", buffering=1)
+
+    def _check_date(self, now):
+        date_str = now.strftime("%Y-%m-%d")
+        if date_str != self.current_date:
+            self._roll_over(date_str)
+
+    def reload(self):
+        """Re-read today's log from disk, e.g. after another process wrote to it"""
+        with self._lock:
+            self._roll_over(self.clock().strftime("%Y-%m-%d"))
+
+    def is_marked(self, name, camera_type):
+        """Whether a person was already marked today on this camera"""
+        with self._lock:
+            self._check_date(self.clock())
+            return name in self.marked.setdefault(camera_type, set())
+
+    def marked_today(self, camera_type):
+        """Set of names marked today on this camera"""
+        with self._lock:
+            self._check_date(self.clock())
+            return set(self.marked.setdefault(camera_type, set()))
+
+    def record(self, name, camera_type):
+        """
+        Record a mark unless the person was already marked today on this camera.
+        Returns the log entry, or None if it was a duplicate.
+        """
+        with self._lock:
+            now = self.clock()
+            self._check_date(now)
+
+            marked_set = self.marked.setdefault(camera_type, set())
+            if name in marked_set:
+                return None
+
+            log_entry = {
+                "name": name,
+                "date": self.current_date,
+                "time": now.strftime("%H:%M:%S"),
+                "camera": camera_type
+            }
+
+            self._file.write(json.dumps(log_entry) + "\n")
+            marked_set.add(name)
+            self.recent.append(log_entry)
+
+            offset = self._file.tell()
+            for listener in self.listeners:
+                listener(log_entry, offset)
+
+        print(f"{name} marked {camera_type} at {log_entry['time']}")
+        return log_entry
+
+    def today(self):
+        """Most recent entries of the current day (bounded by max_recent)"""
+        with self._lock:
+            self._check_date(self.clock())
+            return list(self.recent)
+
+    def read_day(self, date_str):
+        """Yield all entries of a given day from disk"""
+        path = self.path_for(date_str)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                # Stop at a mark the camera owner is still writing
+                if not line.endswith("\n"):
+                    break
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,244 @@
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+class AttendanceSummary:
+    """
+    Materialized daily and monthly attendance rollups.
+
+    The rollups are updated incrementally as marks are written by
+    DailyAttendanceLog and persisted per month to attendance_summary_YYYY-MM.json,
+    so the calendar view never has to re-aggregate raw records and a flush only
+    rewrites the months that changed. The summary also stores how far into each
+    day's .jsonl log it has read; on startup only the unread tail of each log
+    is applied, which recovers any marks written after the last flush.
+    """
+
+    FILE_PATTERN = re.compile(r"attendance_(\d{4}-\d{2}-\d{2})\.jsonl$")
+    MONTH_FILE_PATTERN = re.compile(r"attendance_summary_(\d{4}-\d{2})\.json$")
+
+    def __init__(self, directory=".", flush_interval=5.0):
+        self.directory = directory
+        # Single-file summary of earlier versions, split into month files on the first flush
+        self.legacy_path = os.path.join(directory, "attendance_summary.json")
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # Held while writing files, so marks (which only need _lock) never wait for the disk
+        self._write_lock = threading.Lock()
+        self._dirty_months = set()
+        self._last_flush = 0.0
+        self._migrate = False
+
+        # offsets: bytes of each day's log already applied
+        # daily:   date -> name -> {"entry": time, "exit": time}
+        # monthly: month -> {"days": {date: present}, "children": {name: days present}}
+        self.state = {"offsets": {}, "daily": {}, "monthly": {}}
+        self._load()
+
+        self.catch_up()
+
+    def _month_path(self, month):
+        return os.path.join(self.directory, f"attendance_summary_{month}.json")
+
+    def _load(self):
+        """Read the persisted month files (and a single-file summary of earlier versions)"""
+        if os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path) as f:
+                    self.state = json.load(f)
+                self._dirty_months.update(self.state["monthly"])
+                self._migrate = True
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Could not read {self.legacy_path}, rebuilding summary: {e}")
+
+        for path in sorted(glob.glob(os.path.join(self.directory, "attendance_summary_*.json"))):
+            match = self.MONTH_FILE_PATTERN.search(path)
+            if not match:
+                continue
+            try:
+                with open(path) as f:
+                    part = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                # Without its offsets the month's logs are read again by catch_up()
+                print(f"Could not read {path}, rebuilding that month: {e}")
+                continue
+            self.state["offsets"].update(part["offsets"])
+            self.state["daily"].update(part["daily"])
+            self.state["monthly"][match.group(1)] = part["monthly"]
+
+    def _apply(self, entry):
+        """Fold one attendance entry into the rollups"""
+        date, name, camera = entry["date"], entry["name"], entry["camera"]
+        month = date[:7]
+
+        day = self.state["daily"].setdefault(date, {})
+        monthly = self.state["monthly"].setdefault(month, {"days": {}, "children": {}})
+
+        if name not in day:
+            # First mark of the day for this child: they count as present
+            day[name] = {"entry": None, "exit": None}
+            monthly["days"][date] = monthly["days"].get(date, 0) + 1
+            monthly["children"][name] = monthly["children"].get(name, 0) + 1
+
+        if day[name].get(camera) is None:
+            day[name][camera] = entry["time"]
+
+        self._dirty_months.add(month)
+
+    def catch_up(self, persist=True):
+        """
+        Apply log lines written since the summary was last persisted.
+        With persist=False the result is only kept in memory (e.g. in workers
+        that don't write the logs, so only the writer's process persists).
+        """
+        with self._lock:
+            for path in sorted(glob.glob(os.path.join(self.directory, "attendance_*.jsonl"))):
+                match = self.FILE_PATTERN.search(path)
+                if not match:
+                    continue
+                date = match.group(1)
+                offset = self.state["offsets"].get(date, 0)
+                if os.path.getsize(path) <= offset:
+                    continue
+
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    for line in f:
+                        # Stop at a partially written last line
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        if line.strip():
+                            self._apply(json.loads(line))
+                self.state["offsets"][date] = offset
+                self._dirty_months.add(date[:7])
+
+        if persist:
+            self._flush(force=True)
+
+    def on_record(self, entry, offset):
+        """Listener for DailyAttendanceLog: apply a new mark written up to offset"""
+        with self._lock:
+            self._apply(entry)
+            self.state["offsets"][entry["date"]] = offset
+        self._flush()
+
+    def _month_state(self, month):
+        """The part of the state persisted in one month's file"""
+        return {
+            "offsets": {date: offset for date, offset in self.state["offsets"].items() if date.startswith(month)},
+            "daily": {date: people for date, people in self.state["daily"].items() if date.startswith(month)},
+            "monthly": self.state["monthly"].get(month, {"days": {}, "children": {}})
+        }
+
+    def _write(self, path, document):
+        """Replace a file atomically via a unique temporary file (several processes may flush)"""
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                        dir=self.directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(document)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _flush(self, force=False):
+        """
+        Write the months changed since the last flush, at most every flush_interval
+        seconds. An unforced flush is skipped while another one is writing; the
+        changes stay pending for the next one.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        if not self._write_lock.acquire(blocking=force):
+            return
+        try:
+            with self._lock:
+                months = sorted(self._dirty_months)
+                self._dirty_months.clear()
+                documents = {month: json.dumps(self._month_state(month)) for month in months}
+                self._last_flush = now
+            try:
+                for month, document in documents.items():
+                    self._write(self._month_path(month), document)
+            except OSError:
+                with self._lock:
+                    self._dirty_months.update(months)
+                raise
+
+            if self._migrate:
+                self._migrate = False
+                try:
+                    os.remove(self.legacy_path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            self._write_lock.release()
+
+    def flush(self):
+        self._flush(force=True)
+
+    def day(self, date, roster=None):
+        """Present/absent counts and marks for one day"""
+        with self._lock:
+            people = dict(self.state["daily"].get(date, {}))
+
+        summary = {
+            "date": date,
+            "present": len(people),
+            "entries": sum(1 for p in people.values() if p.get("entry")),
+            "exits": sum(1 for p in people.values() if p.get("exit")),
+            "people": people
+        }
+        if roster is not None:
+            summary["absent"] = sorted(set(roster) - set(people))
+        return summary
+
+    def month(self, month, roster=None):
+        """Per-day present counts and per-child days present for a YYYY-MM month"""
+        with self._lock:
+            monthly = self.state["monthly"].get(month, {"days": {}, "children": {}})
+            days = dict(monthly["days"])
+            children = dict(monthly["children"])
+
+        summary = {
+            "month": month,
+            "school_days": len(days),
+            "days": {
+                date: {"present": present} for date, present in sorted(days.items())
+            },
+            "children": children
+        }
+        if roster is not None:
+            for date, counts in summary["days"].items():
+                counts["absent"] = max(0, len(roster) - counts["present"])
+            for name in roster:
+                children.setdefault(name, 0)
+        return summary
+
+    def child(self, name, month=None):
+        """Attendance history of one child, optionally restricted to a month"""
+        with self._lock:
+            history = {
+                date: dict(people[name])
+                for date, people in self.state["daily"].items()
+                if name in people and (month is None or date.startswith(month))
+            }
+            school_days = [
+                date for date in self.state["daily"]
+                if month is None or date.startswith(month)
+            ]
+
+        return {
+            "name": name,
+            "days_present": len(history),
+            "school_days": len(school_days),
+            "history": dict(sorted(history.items()))
+        }
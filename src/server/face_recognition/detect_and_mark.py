@@ -1,20 +1,47 @@
 import cv2
-from mtcnn.mtcnn import MTCNN
-from deepface import DeepFace
 import numpy as np
 import json
-from datetime import datetime
 import os
+import threading
 import time
+from embedder import FacenetEmbedder
+from attendance_log import DailyAttendanceLog
+from attendance_summary import AttendanceSummary
+from detectors import create_detector, detect_scaled
+from face_quality import QualityGate, FaceTracker
+from quantized_gallery import QuantizedGallery
+from utils import encodings_lock
 
 class FaceRecognitionSystem:
-    def __init__(self, encodings_file="encodings.json", threshold=10):
+    def __init__(self, encodings_file="encodings.json", threshold=10, attendance_dir=".",
+                 detector="mtcnn", detection_size=640, camera_detectors=None, summary=None,
+                 check_quality=True, gallery_mode=None, rerank=8):
         self.threshold = threshold
-        self.detector = MTCNN()
+        self.encodings_file = encodings_file
+        # Optional 'float16'/'int8' gallery scan with exact re-ranking of the top candidates
+        self.gallery_mode = gallery_mode
+        self.rerank = rerank
+        # Skip embedding blurry, tiny, badly exposed or side-on faces, and
+        # keep the best-quality match of each tracked face
+        self.quality_gate = QualityGate() if check_quality else None
+        self.tracker = FaceTracker() if check_quality else None
+        self.quality_stats = {"embedded": 0, "skipped": 0, "reused": 0}
+        # Both camera threads update the counters
+        self.quality_stats_lock = threading.Lock()
+        # Detector used by default, and optional per-camera overrides
+        # e.g. camera_detectors={"exit": "haar"}
+        self.detector_name = detector
+        self.detection_size = detection_size
+        self.camera_detectors = camera_detectors or {}
+        self._detectors = {}
+        self.embedder = FacenetEmbedder()
         self.known_faces = {}
-        self.entry_marked = set()  # For entry camera
-        self.exit_marked = set()   # For exit camera
-        self.attendance_log = []
+        # Held while matching and while enrollment swaps in a new gallery
+        self.gallery_lock = threading.Lock()
+        # Day-partitioned, append-only log; marked sets reset at midnight.
+        # Daily/monthly rollups are updated as each mark is written.
+        self.summary = summary or AttendanceSummary(attendance_dir)
+        self.attendance = DailyAttendanceLog(attendance_dir, listeners=[self.summary.on_record])
         
         # Create encodings directory if it doesn't exist
         os.makedirs(os.path.dirname(encodings_file), exist_ok=True)
@@ -26,41 +53,211 @@ class FaceRecognitionSystem:
             print(f"Loaded {len(self.known_faces)} known faces")
         else:
             print(f"No encodings file found at {encodings_file}")
-    
-    def find_match(self, face_embedding):
-        """Find the closest matching person for a face embedding"""
-        best_match = "Unknown"
-        min_distance = float('inf')
         
+        self.build_gallery()
+    
+    def build_gallery(self):
+        """Precompute the gallery matrix used for matching from known_faces"""
+        templates = []
+        names = []
         for name, embedding in self.known_faces.items():
-            distance = np.linalg.norm(np.array(embedding) - np.array(face_embedding))
-            if distance < min_distance:
-                min_distance = distance
-                best_match = name
+            # A person may be stored as one embedding or a list of representatives
+            for template in np.atleast_2d(np.array(embedding, dtype=np.float32)):
+                templates.append(template)
+                names.append(name)
         
-        # Return match only if below threshold
-        return best_match if min_distance < self.threshold else "Unknown", min_distance
+        self.gallery_names = names
+        self.quantized_gallery = None
+        if self.gallery_mode and templates:
+            # Compact vectors in RAM, full precision memory-mapped from disk for re-ranking
+            self.quantized_gallery = QuantizedGallery(
+                templates, names, mode=self.gallery_mode, rerank=self.rerank,
+                full_precision_file=os.path.splitext(self.encodings_file)[0] + ".f32.npy",
+                source_file=self.encodings_file
+            )
+            self.gallery_matrix = self.gallery_sq_norms = None
+            # Only the names are needed from here on
+            self.known_faces = dict.fromkeys(self.known_faces)
+            return
+        
+        self.gallery_matrix = np.array(templates, dtype=np.float32) if templates else None
+        self.gallery_sq_norms = (
+            np.sum(self.gallery_matrix ** 2, axis=1) if templates else None
+        )
     
-    def record_attendance(self, name, camera_type):
-        """Record attendance for a person"""
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        timestamp = datetime.now().strftime("%H:%M:%S")
+    def merge_faces(self, new_faces, replace=False):
+        """
+        Add templates ({name: [template, ...]}) to the live gallery and encodings file.
+        With replace=True the gallery is rebuilt from new_faces only, like encode_faces.
+        Merges start from a fresh read of the file under an inter-process lock, so
+        jobs finishing together in different server workers keep each other's templates.
+        """
+        with self.gallery_lock, encodings_lock(self.encodings_file):
+            faces = {}
+            if not replace and os.path.exists(self.encodings_file):
+                with open(self.encodings_file) as f:
+                    # A person may be stored as one embedding or a list of representatives
+                    faces = {name: np.atleast_2d(np.array(embedding, dtype=np.float32)).tolist()
+                             for name, embedding in json.load(f).items()}
+            for name, templates in new_faces.items():
+                faces[name] = faces.get(name, []) + list(templates)
+            # Same format as encode_faces: one vector, or a list of representatives
+            faces = {name: templates[0] if len(templates) == 1 else templates for name, templates in faces.items()}
+            
+            tmp_file = self.encodings_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(faces, f)
+            os.replace(tmp_file, self.encodings_file)
+            
+            self.known_faces = faces
+            self.build_gallery()
+        print(f"Merged {len(new_faces)} people into the gallery ({len(faces)} total)")
+    
+    def reload_gallery(self):
+        """Reload known faces from the encodings file (after another process merged templates)"""
+        with self.gallery_lock, encodings_lock(self.encodings_file):
+            with open(self.encodings_file) as f:
+                faces = json.load(f)
+            self.known_faces = faces
+            self.build_gallery()
+        print(f"Reloaded {len(faces)} known faces")
+    
+    def find_matches(self, face_embeddings):
+        """Find the closest matching person for each row of an (n, d) embedding array"""
+        with self.gallery_lock:
+            return self._find_matches(face_embeddings)
+    
+    def _find_matches(self, face_embeddings):
+        face_embeddings = np.atleast_2d(np.asarray(face_embeddings, dtype=np.float32))
+        if self.quantized_gallery is not None and len(face_embeddings):
+            best, best_distances = self.quantized_gallery.search(face_embeddings)
+            return [
+                (self.gallery_names[i] if d < self.threshold else "Unknown", float(d))
+                for i, d in zip(best, best_distances)
+            ]
+        if self.gallery_matrix is None or len(face_embeddings) == 0:
+            return [("Unknown", float('inf')) for _ in range(len(face_embeddings))]
         
-        log_entry = {
-            "name": name,
-            "date": current_date,
-            "time": timestamp,
-            "camera": camera_type
-        }
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2ab, for all pairs at once
+        sq = (
+            np.sum(face_embeddings ** 2, axis=1)[:, None]
+            + self.gallery_sq_norms[None, :]
+            - 2.0 * face_embeddings @ self.gallery_matrix.T
+        )
+        distances = np.sqrt(np.maximum(sq, 0.0))
+        best = np.argmin(distances, axis=1)
+        best_distances = distances[np.arange(len(face_embeddings)), best]
         
-        self.attendance_log.append(log_entry)
+        # Return match only if below threshold
+        return [
+            (self.gallery_names[i] if d < self.threshold else "Unknown", float(d))
+            for i, d in zip(best, best_distances)
+        ]
+    
+    def find_match(self, face_embedding):
+        """Find the closest matching person for a face embedding"""
+        return self.find_matches([face_embedding])[0]
+    
+    def get_detector(self, camera_type="entry"):
+        """Return the (cached) detector configured for a camera"""
+        name = self.camera_detectors.get(camera_type, self.detector_name)
+        if name not in self._detectors:
+            self._detectors[name] = create_detector(name)
+        return self._detectors[name]
+    
+    @property
+    def detector(self):
+        """Default detector"""
+        return self.get_detector(None)
+    
+    def recognize_faces(self, frame, camera_type="entry"):
+        """
+        Detect faces in a frame and recognise them in a single batched pass.
+        Detection runs on a copy downscaled to detection_size; boxes are in
+        full-resolution coordinates so crops keep their original detail.
+        With the quality gate on, only faces that pass it and improve on their
+        track's best frame are embedded; the rest reuse the track's best match
+        (flagged 'reused', and not to be marked). Faces failing the gate stay Unknown.
+        Returns a list of dicts with 'box' (x, y, w, h), 'name', 'distance', 'quality' and 'reused'.
+        """
+        faces = []
+        pending = []
+        crops = []
+        skipped = reused = 0
+        detector = self.get_detector(camera_type)
+        for (x, y, w, h), landmarks in detect_scaled(detector, frame, self.detection_size, landmarks=True):
+            # Ensure positive dimensions (MTCNN can sometimes give negative values)
+            x, y = max(0, x), max(0, y)
+            
+            face_crop = frame[y:y+h, x:x+w]
+            if face_crop.size == 0:
+                continue
+            
+            face = {"box": (x, y, w, h), "name": "Unknown", "distance": float('inf'), "quality": None,
+                    "reused": False}
+            if self.quality_gate is None:
+                # Skip if face is too small
+                if w < 50 or h < 50:
+                    continue
+                faces.append(face)
+                pending.append((face, None, None))
+                crops.append(face_crop)
+                continue
+            
+            faces.append(face)
+            quality = self.quality_gate.assess(face_crop, landmarks)
+            face["quality"] = quality["score"]
+            track = self.tracker.update(camera_type, face["box"])
+            if not quality["passed"]:
+                # Failed the gate: no match, whatever the track matched before
+                skipped += 1
+            elif self.tracker.needs_embedding(track, quality):
+                pending.append((face, track, quality))
+                crops.append(face_crop)
+            else:
+                # Shown, but never marked: another child may have stepped into the track's box
+                face["name"], face["distance"] = track["match"]
+                face["reused"] = True
+                reused += 1
         
-        # Save to JSON file
-        with open(f"attendance_{current_date}.json", "w") as f:
-            json.dump(self.attendance_log, f, indent=2)
+        if crops:
+            embeddings = self.embedder.embed(crops)
+            matches = self.find_matches(embeddings)
+            
+            for (face, track, quality), (name, distance) in zip(pending, matches):
+                face["name"], face["distance"] = name, distance
+                if track is not None:
+                    self.tracker.remember(track, (name, distance), quality)
         
-        print(f"{name} marked {camera_type} at {timestamp}")
-        return log_entry
+        with self.quality_stats_lock:
+            self.quality_stats["embedded"] += len(crops)
+            self.quality_stats["skipped"] += skipped
+            self.quality_stats["reused"] += reused
+        return faces
+    
+    def get_quality_stats(self):
+        """Counts of embedded, skipped and reused faces"""
+        with self.quality_stats_lock:
+            return dict(self.quality_stats)
+    
+    @property
+    def entry_marked(self):
+        """Names marked today on the entry camera"""
+        return self.attendance.marked_today("entry")
+    
+    @property
+    def exit_marked(self):
+        """Names marked today on the exit camera"""
+        return self.attendance.marked_today("exit")
+    
+    @property
+    def attendance_log(self):
+        """Most recent attendance entries of the current day"""
+        return self.attendance.today()
+    
+    def record_attendance(self, name, camera_type):
+        """Record attendance for a person, returns None if already marked today"""
+        return self.attendance.record(name, camera_type)
     
     def process_camera(self, camera_id=0, camera_type="entry"):
         """Process video from a specific camera"""
@@ -69,11 +266,12 @@ class FaceRecognitionSystem:
             print(f"Error: Could not open camera {camera_id}")
             return
         
-        marked_set = self.entry_marked if camera_type == "entry" else self.exit_marked
-        
         print(f"Starting {camera_type} camera (ID: {camera_id})")
         print("Press 'q' to quit")
         
+        # Load the model before the first frame arrives
+        self.embedder.warm_up()
+        
         while True:
             ret, frame = cap.read()
             if not ret:
@@ -83,48 +281,30 @@ class FaceRecognitionSystem:
             cv2.putText(frame, f"{camera_type.capitalize()} Camera", 
                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 165, 255), 2)
             
-            # Detect faces
-            results = self.detector.detect_faces(frame)
+            try:
+                # Detect, embed and match all faces in one batch
+                faces = self.recognize_faces(frame, camera_type)
+            except Exception as e:
+                print(f"Recognition failed: {e}")
+                faces = []
             
-            for face in results:
+            for face in faces:
                 x, y, w, h = face['box']
+                name, confidence = face['name'], face['distance']
+                confidence_text = f"Conf: {100-confidence:.1f}%" if name != "Unknown" else ""
                 
-                # Ensure positive dimensions (MTCNN can sometimes give negative values)
-                x, y = max(0, x), max(0, y)
-                
-                # Skip if face is too small
-                if w < 50 or h < 50:
-                    continue
-                
-                face_crop = frame[y:y+h, x:x+w]
-                if face_crop.size == 0:
-                    continue
+                # Record attendance if it's a known person (duplicates are ignored)
+                if name != "Unknown" and not face['reused']:
+                    self.record_attendance(name, camera_type)
                 
-                try:
-                    # Get face embedding
-                    embedding = DeepFace.represent(img_path=face_crop, model_name="Facenet", enforce_detection=False)[0]["embedding"]
-                    
-                    # Find best match
-                    name, confidence = self.find_match(embedding)
-                    confidence_text = f"Conf: {100-confidence:.1f}%" if name != "Unknown" else ""
-                    
-                    # Record attendance if not already marked and it's a known person
-                    if name != "Unknown" and name not in marked_set:
-                        self.record_attendance(name, camera_type)
-                        marked_set.add(name)
-                    
-                    # Draw rectangle and name
-                    color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                    cv2.putText(frame, name, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                    
-                    if confidence_text:
-                        cv2.putText(frame, confidence_text, (x, y + h + 20), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+                # Draw rectangle and name
+                color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
+                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+                cv2.putText(frame, name, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
                 
-                except Exception as e:
-                    # Just draw the face without recognition
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
+                if confidence_text:
+                    cv2.putText(frame, confidence_text, (x, y + h + 20), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
             
             # Show the frame
             cv2.imshow(f"Face Recognition - {camera_type.capitalize()} Camera", frame)
@@ -156,8 +336,6 @@ if __name__ == "__main__":
     elif camera_type == "exit":
         face_system.process_exit_camera()
     elif camera_type == "both":
-        import threading
-        
         # Use threading to run both cameras simultaneously
         entry_thread = threading.Thread(target=face_system.process_entry_camera, args=(0,))
         exit_thread = threading.Thread(target=face_system.process_exit_camera, args=(1,))
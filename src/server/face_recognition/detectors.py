@@ -0,0 +1,239 @@
+import argparse
+import importlib.util
+import os
+import time
+import cv2
+
+class FaceDetector:
+    """
+    Interface for face detectors used by FaceRecognitionSystem.
+    detect() takes a BGR frame and returns a list of (x, y, w, h) boxes.
+    detect_landmarks() returns (box, landmarks) pairs, where landmarks maps
+    'left_eye', 'right_eye' and 'nose' to (x, y) points, or is None for
+    detectors that only find boxes.
+    """
+    name = "base"
+
+    @classmethod
+    def check_available(cls):
+        """Raise ValueError if the detector's dependencies or model files are missing"""
+
+    def detect(self, frame):
+        raise NotImplementedError
+
+    def detect_landmarks(self, frame):
+        return [(box, None) for box in self.detect(frame)]
+
+class MTCNNDetector(FaceDetector):
+    """Accurate but expensive MTCNN detector (TensorFlow)"""
+    name = "mtcnn"
+
+    @classmethod
+    def check_available(cls):
+        if importlib.util.find_spec("mtcnn") is None:
+            raise ValueError("MTCNN detector needs the mtcnn package")
+
+    def __init__(self, min_confidence=0.9):
+        # Imported here so cheaper detectors don't pull in TensorFlow
+        from mtcnn.mtcnn import MTCNN
+        self.detector = MTCNN()
+        self.min_confidence = min_confidence
+
+    def detect(self, frame):
+        return [box for box, _ in self.detect_landmarks(frame)]
+
+    def detect_landmarks(self, frame):
+        # MTCNN is trained on RGB images
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        faces = []
+        for face in self.detector.detect_faces(rgb):
+            if face.get('confidence', 1.0) < self.min_confidence:
+                continue
+            keypoints = face.get('keypoints') or {}
+            landmarks = {k: tuple(keypoints[k]) for k in ('left_eye', 'right_eye', 'nose') if k in keypoints}
+            faces.append((tuple(face['box']), landmarks if len(landmarks) == 3 else None))
+        return faces
+
+class HaarDetector(FaceDetector):
+    """Very cheap OpenCV Haar cascade detector, frontal faces only"""
+    name = "haar"
+
+    @staticmethod
+    def default_cascade_file():
+        return os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+
+    @classmethod
+    def check_available(cls):
+        if not os.path.exists(cls.default_cascade_file()):
+            raise ValueError(f"Haar cascade not found: {cls.default_cascade_file()}")
+
+    def __init__(self, cascade_file=None, scale_factor=1.1, min_neighbors=5):
+        cascade_file = cascade_file or self.default_cascade_file()
+        self.detector = cv2.CascadeClassifier(cascade_file)
+        if self.detector.empty():
+            raise ValueError(f"Could not load Haar cascade from {cascade_file}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        boxes = self.detector.detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors
+        )
+        return [tuple(int(v) for v in box) for box in boxes]
+
+class DnnSsdDetector(FaceDetector):
+    """
+    OpenCV DNN ResNet-10 SSD face detector, a good CPU trade-off.
+    Needs deploy.prototxt and res10_300x300_ssd_iter_140000.caffemodel.
+    """
+    name = "ssd"
+    prototxt_file = "models/deploy.prototxt"
+    model_file = "models/res10_300x300_ssd_iter_140000.caffemodel"
+
+    @classmethod
+    def check_available(cls):
+        if not os.path.exists(cls.prototxt_file) or not os.path.exists(cls.model_file):
+            raise ValueError(f"SSD model files not found: {cls.prototxt_file}, {cls.model_file}")
+
+    def __init__(self, prototxt=None, model=None, min_confidence=0.6):
+        prototxt = prototxt or self.prototxt_file
+        model = model or self.model_file
+        if not os.path.exists(prototxt) or not os.path.exists(model):
+            raise ValueError(f"SSD model files not found: {prototxt}, {model}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.min_confidence = min_confidence
+
+    def detect(self, frame):
+        h, w = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0)
+        )
+        self.net.setInput(blob)
+        detections = self.net.forward()
+
+        boxes = []
+        for i in range(detections.shape[2]):
+            if detections[0, 0, i, 2] < self.min_confidence:
+                continue
+            x1, y1, x2, y2 = detections[0, 0, i, 3:7] * [w, h, w, h]
+            boxes.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+        return boxes
+
+DETECTORS = {
+    MTCNNDetector.name: MTCNNDetector,
+    HaarDetector.name: HaarDetector,
+    DnnSsdDetector.name: DnnSsdDetector
+}
+
+def create_detector(name="mtcnn", **kwargs):
+    """Create a detector by name ('mtcnn', 'haar' or 'ssd')"""
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}'. Choose from {list(DETECTORS)}")
+    return DETECTORS[name](**kwargs)
+
+def check_detector(name):
+    """Raise ValueError if a detector name is unknown or the detector can't be loaded on this host"""
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}'. Choose from {list(DETECTORS)}")
+    DETECTORS[name].check_available()
+
+def detect_scaled(detector, frame, detection_size=640, landmarks=False):
+    """
+    Run a detector on a copy of the frame downscaled so its longest side is
+    at most detection_size, and map the boxes back to full-resolution pixels.
+    With landmarks=True, returns (box, landmarks) pairs with the landmark
+    points mapped back as well (landmarks is None for box-only detectors).
+    """
+    height, width = frame.shape[:2]
+    ratio = detection_size / max(width, height) if detection_size else 1.0
+    if ratio < 1:
+        small_frame = cv2.resize(frame, (0, 0), fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+    else:
+        ratio = 1.0
+        small_frame = frame
+
+    if not landmarks:
+        return [scale_box(box, ratio) for box in detector.detect(small_frame)]
+
+    faces = []
+    for box, points in detector.detect_landmarks(small_frame):
+        if points is not None:
+            points = {k: (x / ratio, y / ratio) for k, (x, y) in points.items()}
+        faces.append((scale_box(box, ratio), points))
+    return faces
+
+def scale_box(box, ratio):
+    """Map an (x, y, w, h) box found on a frame resized by ratio back to the original frame"""
+    x, y, w, h = box
+    return int(x / ratio), int(y / ratio), int(w / ratio), int(h / ratio)
+
+def benchmark(frames, detector_names=("mtcnn", "haar", "ssd"), sizes=(None, 640, 320)):
+    """
+    Time every detector at every detection size over the same frames.
+    Returns a list of dicts with mean milliseconds per frame and faces found.
+    """
+    results = []
+    for name in detector_names:
+        try:
+            detector = create_detector(name)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            continue
+
+        # Warm up (model loading, first-call allocations)
+        detect_scaled(detector, frames[0], sizes[0])
+
+        for size in sizes:
+            faces = 0
+            start_time = time.time()
+            for frame in frames:
+                faces += len(detect_scaled(detector, frame, size))
+            elapsed = time.time() - start_time
+
+            results.append({
+                "detector": name,
+                "detection_size": size or "full",
+                "ms_per_frame": 1000.0 * elapsed / len(frames),
+                "faces": faces
+            })
+    return results
+
+def read_frames(source, count):
+    """Read up to count frames from a camera index, video file or image"""
+    if os.path.isfile(source) and cv2.haveImageReader(source):
+        frame = cv2.imread(source)
+        return [frame] * count
+
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark face detectors and detection sizes")
+    parser.add_argument("-s", "--source", type=str, default="0",
+                        help="Camera ID, video file or image to benchmark on")
+    parser.add_argument("-n", "--frames", type=int, default=30,
+                        help="Number of frames to time")
+    parser.add_argument("--detectors", type=str, default="mtcnn,haar,ssd",
+                        help="Comma-separated detectors to compare")
+    parser.add_argument("--sizes", type=str, default="0,640,320",
+                        help="Comma-separated detection sizes (0 = full resolution)")
+    args = parser.parse_args()
+
+    frames = read_frames(args.source, args.frames)
+    if not frames:
+        print(f"Error: Could not read frames from {args.source}")
+    else:
+        sizes = [int(s) or None for s in args.sizes.split(",")]
+        print(f"Benchmarking on {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+        print(f"{'detector':<10}{'size':>8}{'ms/frame':>12}{'faces':>8}")
+        for row in benchmark(frames, args.detectors.split(","), sizes):
+            print(f"{row['detector']:<10}{str(row['detection_size']):>8}"
+                  f"{row['ms_per_frame']:>12.1f}{row['faces']:>8}")
@@ -0,0 +1,66 @@
+import threading
+import cv2
+import numpy as np
+
+class FacenetEmbedder:
+    """
+    Keeps a single Facenet model in memory and embeds face crops in batches.
+
+    DeepFace.represent re-runs detection and preprocessing and calls the model
+    once per crop. Crops coming from MTCNN are already faces, so here they are
+    only resized/padded to the model input and pushed through one forward pass.
+    """
+
+    _model = None
+    _model_lock = threading.Lock()
+
+    def __init__(self, model_name="Facenet"):
+        self.model_name = model_name
+        self._predict_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Load the model on first use and share it between instances"""
+        if FacenetEmbedder._model is None:
+            with FacenetEmbedder._model_lock:
+                if FacenetEmbedder._model is None:
+                    # Imported here so importing this module doesn't load TensorFlow
+                    from deepface import DeepFace
+                    FacenetEmbedder._model = DeepFace.build_model(self.model_name)
+        return FacenetEmbedder._model
+
+    @property
+    def target_size(self):
+        """Input (height, width) expected by the model"""
+        return tuple(self.model.input_shape[1:3])
+
+    def warm_up(self):
+        """Run a dummy forward pass so the first real frame isn't slow"""
+        height, width = self.target_size
+        self.embed([np.zeros((height, width, 3), dtype=np.uint8)])
+
+    def preprocess(self, face_crop):
+        """Resize a crop to the model input keeping aspect ratio, pad and scale to [0, 1]"""
+        target_h, target_w = self.target_size
+        h, w = face_crop.shape[:2]
+        factor = min(target_h / h, target_w / w)
+        resized = cv2.resize(face_crop, (max(1, int(w * factor)), max(1, int(h * factor))))
+
+        pad_h = target_h - resized.shape[0]
+        pad_w = target_w - resized.shape[1]
+        padded = np.pad(
+            resized,
+            ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)),
+            "constant"
+        )
+        return padded.astype(np.float32) / 255.0
+
+    def embed(self, face_crops):
+        """Embed a list of BGR face crops in one batch, returns an (n, d) array"""
+        if len(face_crops) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+
+        batch = np.stack([self.preprocess(crop) for crop in face_crops])
+        with self._predict_lock:
+            embeddings = self.model.predict(batch, verbose=0)
+        return np.asarray(embeddings, dtype=np.float32)
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import resource
+import time
+import cv2
+import numpy as np
+from detectors import create_detector, detect_scaled
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+def read_labeled_set(labels_dir, video_stride=10, max_video_frames=30):
+    """(image, person ID) pairs from <labels_dir>/<person_id>/<image or video>, every n-th video frame"""
+    samples = []
+    for person_id in sorted(os.listdir(labels_dir)):
+        person_dir = os.path.join(labels_dir, person_id)
+        if not os.path.isdir(person_dir):
+            continue
+
+        for file_name in sorted(os.listdir(person_dir)):
+            path = os.path.join(person_dir, file_name)
+            extension = os.path.splitext(file_name)[1].lower()
+            if extension in IMAGE_EXTENSIONS:
+                image = cv2.imread(path)
+                if image is not None:
+                    samples.append((image, person_id))
+            elif extension in VIDEO_EXTENSIONS:
+                cap = cv2.VideoCapture(path)
+                index = used = 0
+                while used < max_video_frames:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if index % video_stride == 0:
+                        samples.append((frame, person_id))
+                        used += 1
+                    index += 1
+                cap.release()
+    return samples
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def stage_summary(times):
+    """Mean and p95 of stage latencies in milliseconds"""
+    if not times:
+        return {"mean_ms": None, "p95_ms": None}
+    return {"mean_ms": float(np.mean(times)), "p95_ms": float(np.percentile(times, 95))}
+
+def run_benchmark(samples, detector_name="mtcnn", detection_size=640):
+    """
+    Run the MTCNN + Facenet pipeline (detect, embed the largest face) over labeled samples.
+    Returns timings per stage, throughput, memory and one embedding (or None) per sample.
+    """
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    from embedder import FacenetEmbedder
+    detector = create_detector(detector_name)
+    embedder = FacenetEmbedder()
+
+    # Load the models with one dummy pass so load time isn't counted per image
+    detect_scaled(detector, np.zeros((160, 160, 3), dtype=np.uint8), detection_size)
+    embedder.warm_up()
+    load_seconds = time.perf_counter() - start
+    model_rss_mb = peak_rss_mb() - rss_before
+
+    stages = {"detect": [], "embed": [], "total": []}
+    embeddings = []
+    run_start = time.perf_counter()
+    for image, _ in samples:
+        t0 = time.perf_counter()
+        boxes = [(max(0, x), max(0, y), w, h) for x, y, w, h in detect_scaled(detector, image, detection_size)]
+        boxes = [box for box in boxes if box[2] > 0 and box[3] > 0]
+
+        t1 = time.perf_counter()
+        embedding = None
+        if boxes:
+            x, y, w, h = max(boxes, key=lambda box: box[2] * box[3])
+            embedding = embedder.embed([image[y:y+h, x:x+w]])[0].tolist()
+        t2 = time.perf_counter()
+
+        stages["detect"].append((t1 - t0) * 1000.0)
+        if embedding is not None:
+            stages["embed"].append((t2 - t1) * 1000.0)
+        stages["total"].append((t2 - t0) * 1000.0)
+        embeddings.append(embedding)
+    run_seconds = time.perf_counter() - run_start
+
+    return {
+        "engine": "facenet",
+        "settings": {"detector": detector_name, "detection_size": detection_size},
+        "samples": len(samples),
+        "faces": sum(1 for embedding in embeddings if embedding is not None),
+        "load_seconds": load_seconds,
+        "stages": {name: stage_summary(times) for name, times in stages.items()},
+        "throughput_fps": len(samples) / run_seconds if run_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "model_rss_mb": model_rss_mb,
+        "match_threshold": 10,
+        "labels": [person_id for _, person_id in samples],
+        "embeddings": embeddings
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the MTCNN + Facenet pipeline (used by compare_engines.py)")
+    parser.add_argument("--labels", required=True, help="Labeled set: one directory per person ID with images or videos")
+    parser.add_argument("-o", "--output", required=True, help="Where to write the results (JSON)")
+    parser.add_argument("--detector", type=str, default="mtcnn", choices=["mtcnn", "haar", "ssd"],
+                        help="Face detector to use")
+    parser.add_argument("--detection_size", type=int, default=640,
+                        help="Longest side frames are downscaled to for detection (0 = full resolution)")
+    parser.add_argument("--video_stride", type=int, default=10, help="Use every n-th frame of videos")
+    args = parser.parse_args()
+
+    samples = read_labeled_set(args.labels, video_stride=args.video_stride)
+    print(f"Facenet: benchmarking {len(samples)} labeled samples")
+    results = run_benchmark(samples, args.detector, args.detection_size or None)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f)
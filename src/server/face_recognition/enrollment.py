@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from utils import cluster_embeddings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Job states after which nothing changes any more
+FINISHED_STATES = ("completed", "cancelled", "failed", "interrupted")
+
+def clean_relative_path(name):
+    """Safe relative path of an uploaded file or zip member, None for non-images and paths leaving the job"""
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or any(part == ".." or part.startswith(".") or part == "__MACOSX" for part in parts):
+        return None
+    if os.path.splitext(parts[-1])[1].lower() not in IMAGE_EXTENSIONS:
+        return None
+    return os.path.join(*parts)
+
+def extract_zip(zip_file, images_dir, max_bytes):
+    """Extract the images of an uploaded zip file, refusing archives that expand beyond max_bytes"""
+    with zipfile.ZipFile(zip_file) as archive:
+        members = [(member, clean_relative_path(member.filename))
+                   for member in archive.infolist() if not member.is_dir()]
+        members = [(member, path) for member, path in members if path]
+        if sum(member.file_size for member, _ in members) > max_bytes:
+            raise ValueError(f"Zip file expands to more than {max_bytes // (1024 * 1024)} MB")
+
+        for member, path in members:
+            target = os.path.join(images_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.open(member) as source, open(target, "wb") as f:
+                shutil.copyfileobj(source, f)
+    return len(members)
+
+def has_subdirectories(path):
+    """Whether path is a directory containing directories (a wrapper around person folders)"""
+    return os.path.isdir(path) and any(entry.is_dir() for entry in os.scandir(path))
+
+def list_images(images_dir):
+    """
+    (image path, person) pairs laid out like the dataset (<person>/<image>) or named
+    after the person (<person>.jpg), skipping one wrapping directory
+    """
+    entries = sorted(os.listdir(images_dir))
+    if len(entries) == 1 and has_subdirectories(os.path.join(images_dir, entries[0])):
+        return list_images(os.path.join(images_dir, entries[0]))
+
+    images = []
+    for entry in entries:
+        path = os.path.join(images_dir, entry)
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                images.extend((os.path.join(root, f), entry) for f in sorted(files)
+                              if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+        elif os.path.splitext(entry)[1].lower() in IMAGE_EXTENSIONS:
+            images.append((path, os.path.splitext(entry)[0]))
+    return images
+
+def represent_image(path):
+    """Facenet embedding of one photo (runs in a pool process), as {"embedding", "error"}"""
+    # Imported here so only the pool processes load TensorFlow
+    from deepface import DeepFace
+
+    try:
+        embedding = DeepFace.represent(img_path=path, model_name="Facenet")[0]["embedding"]
+    except Exception as e:
+        return {"embedding": None, "error": str(e)}
+    return {"embedding": list(embedding), "error": None}
+
+def encode_directory(images_dir, results_file, workers=1):
+    """Embed an enrollment set with a process pool, one JSON line per photo as it completes (first line: total)"""
+    images = list_images(images_dir)
+    with open(results_file, "w", buffering=1) as f:
+        f.write(json.dumps({"total": len(images)}) + "\n")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(represent_image, path): (path, person) for path, person in images}
+            for future in as_completed(futures):
+                path, person = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"embedding": None, "error": str(e)}
+                result.update(file=os.path.relpath(path, images_dir), person=person)
+                f.write(json.dumps(result) + "\n")
+
+class EnrollmentJobs:
+    """
+    Bulk enrollment jobs running outside the HTTP request.
+
+    Each job embeds its photos in a child process running encode_directory
+    with a process pool, so large enrollments neither time out a request nor
+    block the server. The job thread follows the results file for progress
+    and partial results and kills the child's process group on cancel. When
+    all photos are processed, each person's embeddings are reduced like
+    encode_faces does (mean or cluster centroids) and merged into the live
+    gallery. Job status and cancel requests live in the shared state, so any
+    worker can report or cancel a job, and other workers reload the gallery
+    when its version changes.
+    """
+
+    def __init__(self, face_system, state, jobs_dir="enrollment", workers=1, representatives=1,
+                 max_upload_bytes=500 * 1024 * 1024):
+        self.face_system = face_system
+        self.state = state
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.representatives = representatives
+        self.max_upload_bytes = max_upload_bytes
+        self.gallery_version = state.get("gallery/version")
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def create(self, files):
+        """Store an upload (one zip file, or photos named <person>/<image>) and start a job merging it"""
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.abspath(os.path.join(self.jobs_dir, job_id))
+        images_dir = os.path.join(job_dir, "images")
+        os.makedirs(images_dir)
+
+        zip_file = None
+        saved = 0
+        try:
+            for name, stream in files:
+                if len(files) == 1 and name.lower().endswith(".zip"):
+                    zip_file = os.path.join(job_dir, "upload.zip")
+                    target = zip_file
+                else:
+                    path = clean_relative_path(name)
+                    if path is None:
+                        continue
+                    target = os.path.join(images_dir, path)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    shutil.copyfileobj(stream, f)
+                saved += 1
+            if not saved:
+                raise ValueError("No photos or zip file in the upload")
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        return self._start(job_id, job_dir, images_dir, zip_file, replace=False)
+
+    def create_from_directory(self, dataset_path, replace=True):
+        """Start a job embedding a directory on the server (the photos are kept); replace=True rebuilds the gallery"""
+        if not os.path.isdir(dataset_path):
+            raise ValueError(f"Dataset directory not found: {dataset_path}")
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.abspath(os.path.join(self.jobs_dir, job_id))
+        os.makedirs(job_dir)
+        return self._start(job_id, job_dir, os.path.abspath(dataset_path), None, replace=replace)
+
+    def _start(self, job_id, job_dir, images_dir, zip_file, replace):
+        job = {
+            "job_id": job_id,
+            "state": "queued",
+            "worker": self.state.worker_id,
+            "replace": replace,
+            "created": time.time(),
+            "total": None,
+            "processed": 0,
+            "embedded": 0,
+            "people": {},
+            "failures": [],
+            "failed": 0,
+            "merged": False,
+            "error": None
+        }
+        self._publish(job)
+        self.state.prune("enroll/", 7 * 24 * 3600)
+        threading.Thread(target=self._run, args=(job, job_dir, images_dir, zip_file), daemon=True).start()
+        return job
+
+    def _publish(self, job):
+        job["updated"] = time.time()
+        self.state.set(f"enroll/{job['job_id']}", job)
+
+    def _run(self, job, job_dir, images_dir, zip_file):
+        """Job thread: extract, embed in a child process, follow its results and merge them"""
+        results_file = os.path.join(job_dir, "results.jsonl")
+        uploaded = images_dir.startswith(job_dir)
+        embeddings = {}
+
+        try:
+            if zip_file:
+                job["state"] = "extracting"
+                self._publish(job)
+                extract_zip(zip_file, images_dir, self.max_upload_bytes)
+                os.remove(zip_file)
+
+            job["state"] = "running"
+            self._publish(job)
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(HERE, "enrollment.py"),
+                 "-i", images_dir, "-o", results_file, "-w", str(self.workers)],
+                cwd=HERE,
+                # Own process group, so cancelling also stops the pool processes
+                start_new_session=True
+            )
+
+            offset = 0
+            last_publish = 0.0
+            while True:
+                finished = process.poll() is not None
+                offset = self._read_results(job, results_file, offset, embeddings)
+
+                if not finished and self.state.get(f"enroll_cancel/{job['job_id']}"):
+                    os.killpg(process.pid, signal.SIGTERM)
+                    process.wait()
+                    job["state"] = "cancelled"
+                    break
+                if finished:
+                    if process.returncode != 0:
+                        raise RuntimeError(f"Embedding process exited with code {process.returncode}")
+                    job["state"] = "merging"
+                    break
+
+                # Progress at most twice a second, doubling as a heartbeat
+                if time.time() - last_publish > 0.5:
+                    self._publish(job)
+                    last_publish = time.time()
+                time.sleep(0.2)
+
+            if job["state"] == "merging":
+                self._publish(job)
+                if embeddings or job["replace"]:
+                    self.face_system.merge_faces(self.reduce(embeddings), replace=job["replace"])
+                    self.gallery_version = uuid.uuid4().hex
+                    self.state.set("gallery/version", self.gallery_version)
+                job["merged"] = True
+                job["state"] = "completed"
+        except Exception as e:
+            print(f"Enrollment job {job['job_id']} failed: {e}")
+            job["state"] = "failed"
+            job["error"] = str(e)
+        finally:
+            # Keep the results, not uploaded photos (photos of a server directory stay)
+            if uploaded:
+                shutil.rmtree(images_dir, ignore_errors=True)
+            if zip_file and os.path.exists(zip_file):
+                os.remove(zip_file)
+            self.state.set(f"enroll_cancel/{job['job_id']}", None)
+            self._publish(job)
+
+        print(f"Enrollment job {job['job_id']} {job['state']}: {job['processed']}/{job['total']} photos, "
+              f"{job['embedded']} embedded, {job['failed']} failed")
+
+    @staticmethod
+    def _read_results(job, results_file, offset, embeddings):
+        """Apply complete lines written since offset, returns the new offset"""
+        if not os.path.exists(results_file):
+            return offset
+        with open(results_file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                # Stop at a partially written last line
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                result = json.loads(line)
+                if "total" in result:
+                    job["total"] = result["total"]
+                    continue
+
+                job["processed"] += 1
+                if result["embedding"] is None:
+                    job["failed"] += 1
+                    if len(job["failures"]) < 100:
+                        job["failures"].append({"file": result["file"], "error": result["error"]})
+                    continue
+                embeddings.setdefault(result["person"], []).append(result["embedding"])
+                job["embedded"] += 1
+                job["people"][result["person"]] = job["people"].get(result["person"], 0) + 1
+        return offset
+
+    def reduce(self, embeddings):
+        """Templates per person from their embeddings: the mean, or cluster centroids (as encode_faces)"""
+        if self.representatives > 1:
+            return {person: cluster_embeddings(e, self.representatives).tolist() for person, e in embeddings.items()}
+        return {person: [np.mean(e, axis=0).tolist()] for person, e in embeddings.items()}
+
+    def get(self, job_id):
+        """Status of a job (from any worker), None if unknown"""
+        job = self.state.get(f"enroll/{job_id}")
+        if job is not None and job["state"] not in FINISHED_STATES and time.time() - job["updated"] > 30:
+            # The worker running the job died
+            job["state"] = "interrupted"
+        return job
+
+    def list(self):
+        """Status of all jobs, most recently updated first"""
+        jobs = [self.get(key.split("/", 1)[1]) for key in self.state.scan("enroll/")]
+        return [job for job in jobs if job is not None]
+
+    def cancel(self, job_id):
+        """Ask the worker running a job to cancel it; nothing is merged"""
+        job = self.get(job_id)
+        if job is not None and job["state"] not in FINISHED_STATES:
+            self.state.set(f"enroll_cancel/{job_id}", True)
+        return job
+
+    def sync_gallery(self):
+        """Reload the gallery if a job in another worker merged templates since the last check"""
+        version = self.state.get("gallery/version")
+        if version is not None and version != self.gallery_version:
+            self.face_system.reload_gallery()
+            # Only after a successful reload, so a failed one is retried on the next check
+            self.gallery_version = version
+
+if __name__ == "__main__":
+    # Run by EnrollmentJobs in a child process
+    parser = argparse.ArgumentParser(description="Embed an enrollment set with a process pool")
+    parser.add_argument("-i", "--images_dir", required=True, help="Directory with <person>/<image> or <person>.jpg photos")
+    parser.add_argument("-o", "--output", required=True, help="Results file (one JSON line per photo)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Pool processes (each loads Facenet)")
+    args = parser.parse_args()
+
+    encode_directory(args.images_dir, args.output, args.workers)
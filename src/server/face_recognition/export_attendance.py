@@ -0,0 +1,156 @@
+import argparse
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+
+FIELDS = ["date", "time", "name", "camera"]
+
+def iter_dates(start, end):
+    """Yield every YYYY-MM-DD date from start to end (inclusive)"""
+    day = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    while day <= last:
+        yield day.strftime("%Y-%m-%d")
+        day += timedelta(days=1)
+
+def iter_records(start, end, directory="."):
+    """
+    Yield attendance entries for a date range straight from the daily logs,
+    one line at a time, so memory use does not depend on the range length
+    """
+    for day in iter_dates(start, end):
+        path = os.path.join(directory, f"attendance_{day}.jsonl")
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for line in f:
+                # Stop at a mark the camera owner is still writing
+                if not line.endswith("\n"):
+                    break
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+def iter_csv(records):
+    """Yield CSV text chunks (header first) for a stream of entries"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS, extrasaction="ignore")
+
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes out in chunks"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _require_pyarrow():
+    """Import pyarrow, which is only needed for Parquet export"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+    return pa, pq
+
+def iter_parquet(records, row_group_size=10000):
+    """
+    Yield Parquet bytes for a stream of entries, one row group at a time.
+    Requires pyarrow (pip install pyarrow).
+    """
+    pa, pq = _require_pyarrow()
+
+    schema = pa.schema([(field, pa.string()) for field in FIELDS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+
+    def write_rows(rows):
+        columns = {field: [row.get(field) for row in rows] for field in FIELDS}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    rows = []
+    for record in records:
+        rows.append(record)
+        if len(rows) >= row_group_size:
+            write_rows(rows)
+            rows = []
+            yield sink.drain()
+
+    if rows:
+        write_rows(rows)
+    writer.close()
+    yield sink.drain()
+
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet")
+}
+
+def export_attendance(start, end, export_format="csv", directory="."):
+    """
+    Stream an attendance export for a date range.
+    Returns (chunk generator, mimetype); raises ValueError for bad arguments.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{export_format}'. Choose from {list(EXPORT_FORMATS)}")
+    try:
+        if datetime.strptime(start, "%Y-%m-%d") > datetime.strptime(end, "%Y-%m-%d"):
+            raise ValueError("start must not be after end")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid date range {start}..{end}: {e}")
+
+    if export_format == "parquet":
+        # Fail before streaming starts rather than mid-response
+        _require_pyarrow()
+
+    iter_format, mimetype = EXPORT_FORMATS[export_format]
+    return iter_format(iter_records(start, end, directory)), mimetype
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export attendance for a date range")
+    parser.add_argument("-s", "--start", required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument("-e", "--end", default=date.today().strftime("%Y-%m-%d"),
+                        help="Last day (YYYY-MM-DD), default today")
+    parser.add_argument("-f", "--format", choices=list(EXPORT_FORMATS), default="csv",
+                        help="Output format")
+    parser.add_argument("-d", "--dir", default=".", help="Directory with attendance_*.jsonl logs")
+    parser.add_argument("-o", "--output", required=True, help="Output file")
+    args = parser.parse_args()
+
+    chunks, _ = export_attendance(args.start, args.end, args.format, args.dir)
+    mode = "w" if args.format == "csv" else "wb"
+    with open(args.output, mode, newline="" if mode == "w" else None) as f:
+        for chunk in chunks:
+            f.write(chunk)
+    print(f"Exported attendance {args.start}..{args.end} to {args.output}")
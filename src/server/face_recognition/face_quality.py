@@ -0,0 +1,145 @@
+import itertools
+import threading
+import time
+import cv2
+import numpy as np
+
+class QualityGate:
+    """
+    Cheap face quality check run before the Facenet embedding.
+
+    Faces are scored on size, sharpness (variance of the Laplacian), exposure
+    and pose. With landmarks (MTCNN keypoints) pose is the yaw estimated from
+    the nose position between the eyes, as in the backend gate. Box-only
+    detectors (Haar, SSD) fall back to the left/right asymmetry of the face
+    crop, which grows as the head turns but also with uneven lighting.
+    Faces failing a hard threshold are not embedded; the combined score in
+    [0, 1] is used to keep the best frame of each person.
+    """
+
+    def __init__(self, min_size=50, min_sharpness=30.0, min_brightness=40, max_brightness=215,
+                 max_yaw=0.5, max_asymmetry=0.35):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_yaw = max_yaw
+        self.max_asymmetry = max_asymmetry
+
+    @staticmethod
+    def estimate_yaw(landmarks):
+        """Yaw from the horizontal nose offset between the eyes (0 frontal, 1 profile)"""
+        nose_x = landmarks["nose"][0]
+        left_distance = abs(nose_x - landmarks["left_eye"][0])
+        right_distance = abs(landmarks["right_eye"][0] - nose_x)
+        total = left_distance + right_distance
+        return abs(left_distance - right_distance) / total if total > 0 else 1.0
+
+    def assess(self, face_crop, landmarks=None):
+        """Score a BGR face crop (and its landmarks, if the detector found them); returns score, passed, failure reasons and measurements"""
+        size = min(face_crop.shape[:2]) if face_crop.size else 0
+        quality = {"score": 0.0, "passed": False, "reasons": [], "size": int(size),
+                   "sharpness": 0.0, "brightness": 0.0, "yaw": None, "asymmetry": None}
+        if size < self.min_size:
+            quality["reasons"].append("too_small")
+            return quality
+
+        # Fixed-size grey crop so the measurements don't depend on face size
+        gray = cv2.cvtColor(cv2.resize(face_crop, (96, 96), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        brightness = float(gray.mean())
+        quality["sharpness"] = round(sharpness, 1)
+        quality["brightness"] = round(brightness, 1)
+
+        if sharpness < self.min_sharpness:
+            quality["reasons"].append("blurry")
+        if brightness < self.min_brightness:
+            quality["reasons"].append("underexposed")
+        elif brightness > self.max_brightness:
+            quality["reasons"].append("overexposed")
+
+        if landmarks is not None:
+            pose = self.estimate_yaw(landmarks)
+            quality["yaw"] = round(pose, 3)
+            side_on = pose > self.max_yaw
+        else:
+            # Frontal faces are roughly mirror-symmetric; normalise by contrast
+            gray = gray.astype(np.float32)
+            pose = float(np.abs(gray - gray[:, ::-1]).mean() / (gray.std() * 2.0 + 1e-6))
+            quality["asymmetry"] = round(pose, 3)
+            side_on = pose > self.max_asymmetry
+        if side_on:
+            quality["reasons"].append("side_on")
+
+        # Geometric mean of the normalised components
+        components = [
+            min(1.0, size / (2.0 * self.min_size)),
+            min(1.0, sharpness / (4.0 * self.min_sharpness)),
+            1.0 - min(1.0, abs(brightness - 128.0) / 128.0),
+            1.0 - min(1.0, pose)
+        ]
+        quality["score"] = round(float(np.prod(components) ** (1.0 / len(components))), 3)
+        quality["passed"] = not quality["reasons"]
+        return quality
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right, bottom = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+class FaceTracker:
+    """
+    Follows faces across consecutive frames of a camera by box overlap.
+
+    Each track keeps the match of its best-quality frame. A face is embedded
+    again only when its quality improves by min_gain or the match is older
+    than max_reuse seconds; other frames reuse the track's best match.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=1.0, min_gain=0.05, max_reuse=3.0, clock=time.monotonic):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_gain = min_gain
+        self.max_reuse = max_reuse
+        self.clock = clock
+        self.tracks = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def update(self, camera_type, box):
+        """Find or start the track of a face detected on a camera"""
+        with self.lock:
+            now = self.clock()
+            tracks = [t for t in self.tracks.get(camera_type, []) if now - t["last_seen"] <= self.max_age]
+
+            track = max(tracks, key=lambda t: box_iou(t["box"], box), default=None)
+            if track is None or box_iou(track["box"], box) < self.iou_threshold:
+                track = {"id": next(self.ids), "best_score": -1.0, "match": None, "match_time": None}
+                tracks.append(track)
+
+            track["box"] = box
+            track["last_seen"] = now
+            self.tracks[camera_type] = tracks
+            return track
+
+    def needs_embedding(self, track, quality):
+        """Whether a face should be embedded rather than reuse its track's best match (callers skip gate failures first)"""
+        if not quality["passed"]:
+            return False
+        if track["match"] is None or self.clock() - track["match_time"] > self.max_reuse:
+            return True
+        return quality["score"] >= track["best_score"] + self.min_gain
+
+    def remember(self, track, match, quality):
+        """Store the match of a newly embedded frame on its track; returns True if it beats the track's current best"""
+        with self.lock:
+            now = self.clock()
+            improved = (track["match"] is not None and now - track["match_time"] <= self.max_reuse
+                        and quality["score"] > track["best_score"])
+            track["best_score"] = quality["score"]
+            track["match"] = match
+            track["match_time"] = now
+            return improved
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+
+QUANTIZATION_MODES = ("float16", "int8")
+
+class QuantizedGallery:
+    """
+    Facenet gallery scanned with compact float16 or int8 vectors.
+
+    Queries are scored against the whole gallery with the quantized vectors
+    (int8 with a symmetric scale per dimension), then the best `rerank`
+    candidates are re-scored with the full-precision embeddings, so returned
+    distances are exact. Full precision can be memory-mapped from a .npy file
+    so only the re-ranked rows are read into RAM.
+    """
+
+    def __init__(self, embeddings, names, mode="int8", rerank=8, full_precision_file=None, source_file=None,
+                 chunk_size=4096):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}'. Choose from {QUANTIZATION_MODES}")
+        self.mode = mode
+        self.rerank = rerank
+        self.chunk_size = chunk_size
+        self.names = list(names)
+
+        full = np.asarray(embeddings, dtype=np.float32).reshape(len(self.names), -1)
+        if full_precision_file:
+            # Reused if another worker already wrote it from the same encodings file
+            full = map_full_precision(full, full_precision_file, source_file)
+        self.full = full
+
+        if mode == "float16":
+            self.scale = None
+            self.codes = full.astype(np.float16)
+        else:
+            max_abs = np.abs(full).max(axis=0) if len(full) else np.ones(full.shape[1], dtype=np.float32)
+            self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self.codes = np.clip(np.round(full / self.scale), -127, 127).astype(np.int8)
+
+        self.sq_norms = np.concatenate([
+            np.sum(self._dequantize(start) ** 2, axis=1)
+            for start in range(0, len(self.codes), chunk_size)
+        ]) if len(self.codes) else np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _dequantize(self, start):
+        """One chunk of gallery rows as float32"""
+        chunk = self.codes[start:start + self.chunk_size].astype(np.float32)
+        return chunk * self.scale if self.scale is not None else chunk
+
+    def approximate_distances(self, queries):
+        """(n, m) squared distances computed with the quantized vectors"""
+        queries = np.asarray(queries, dtype=np.float32)
+        dots = np.concatenate([
+            queries @ self._dequantize(start).T
+            for start in range(0, len(self.codes), self.chunk_size)
+        ], axis=1)
+        return np.sum(queries ** 2, axis=1)[:, None] + self.sq_norms[None, :] - 2.0 * dots
+
+    def search(self, queries, exclude=None):
+        """Best gallery index and exact distance per query, optionally ignoring one index per query"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        approx = self.approximate_distances(queries)
+        if exclude is not None:
+            approx[np.arange(len(queries)), exclude] = np.inf
+
+        # Candidates from the quantized scan, re-scored with full precision
+        k = min(self.rerank, approx.shape[1])
+        candidates = np.argpartition(approx, k - 1, axis=1)[:, :k]
+        vectors = np.asarray(self.full[candidates.ravel()], dtype=np.float64).reshape(len(queries), k, -1)
+        exact = np.linalg.norm(vectors - queries[:, None, :], axis=2)
+        exact[~np.isfinite(np.take_along_axis(approx, candidates, axis=1))] = np.inf
+
+        best = np.argmin(exact, axis=1)
+        rows = np.arange(len(queries))
+        return candidates[rows, best], exact[rows, best]
+
+    def memory_bytes(self):
+        """Bytes needed for scanning (codes, norms, scale), excluding full precision"""
+        return self.codes.nbytes + self.sq_norms.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+def map_full_precision(full, full_precision_file, source_file=None):
+    """
+    Memory-map full-precision embeddings from a .npy file, rewriting it only if it is
+    not newer than source_file or has another shape. Rewrites go through a unique
+    temporary file and an atomic rename, so workers starting together don't collide.
+    """
+    if (source_file and os.path.exists(source_file) and os.path.exists(full_precision_file)
+            and os.path.getmtime(full_precision_file) > os.path.getmtime(source_file)):
+        try:
+            mapped = np.load(full_precision_file, mmap_mode="r")
+            if mapped.shape == full.shape and mapped.dtype == full.dtype:
+                return mapped
+        except (OSError, ValueError):
+            pass
+
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(full_precision_file) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(full_precision_file)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, full)
+        os.replace(tmp_file, full_precision_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return np.load(full_precision_file, mmap_mode="r")
+
+def load_gallery(encodings_file):
+    """Flatten encodings.json into (embeddings, names); a person may have several representatives"""
+    with open(encodings_file) as f:
+        known_faces = json.load(f)
+    embeddings, names = [], []
+    for name, embedding in known_faces.items():
+        for template in np.atleast_2d(np.array(embedding, dtype=np.float32)):
+            embeddings.append(template)
+            names.append(name)
+    return embeddings, names
+
+def quantization_report(embeddings, names, mode="int8", rerank=8, threshold=10):
+    """
+    Leave-one-out comparison of a quantized gallery with exact float32 matching:
+    memory, agreement of the best match with exact search, and recall
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n = len(embeddings)
+    if n < 2:
+        raise ValueError("Need at least two embeddings to evaluate quantization")
+
+    gallery = QuantizedGallery(embeddings, names, mode=mode, rerank=rerank)
+    self_indices = np.arange(n)
+
+    start = time.time()
+    sq = np.sum(embeddings ** 2, axis=1)
+    exact = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * embeddings @ embeddings.T, 0.0))
+    exact[self_indices, self_indices] = np.inf
+    exact_best = np.argmin(exact, axis=1)
+    exact_time = time.time() - start
+
+    approx = gallery.approximate_distances(embeddings)
+    approx[self_indices, self_indices] = np.inf
+    approx_best = np.argmin(approx, axis=1)
+
+    start = time.time()
+    reranked_best, reranked_distances = gallery.search(embeddings, exclude=self_indices)
+    quantized_time = time.time() - start
+
+    def recall(best, distances):
+        return float(np.mean([names[b] == names[i] and d <= threshold
+                              for i, (b, d) in enumerate(zip(best, distances))]))
+
+    return {
+        "templates": n,
+        "mode": mode,
+        "rerank": rerank,
+        "float32_bytes": embeddings.nbytes,
+        "quantized_bytes": gallery.memory_bytes(),
+        "memory_saving": 1.0 - gallery.memory_bytes() / embeddings.nbytes,
+        "agreement_scan_only": float(np.mean(approx_best == exact_best)),
+        "agreement_reranked": float(np.mean(reranked_best == exact_best)),
+        "recall_exact": recall(exact_best, exact[self_indices, exact_best]),
+        "recall_quantized": recall(reranked_best, reranked_distances),
+        "exact_seconds": exact_time,
+        "quantized_seconds": quantized_time
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a quantized Facenet gallery")
+    parser.add_argument("-e", "--encodings", default="encodings.json", help="Path to encodings.json")
+    parser.add_argument("-m", "--mode", choices=QUANTIZATION_MODES, default="int8",
+                        help="Quantization of the scanned vectors")
+    parser.add_argument("-r", "--rerank", type=int, default=8,
+                        help="Number of candidates re-ranked with full precision")
+    parser.add_argument("-t", "--threshold", type=float, default=10, help="Match distance threshold")
+    args = parser.parse_args()
+
+    embeddings, names = load_gallery(args.encodings)
+    report = quantization_report(embeddings, names, args.mode, args.rerank, args.threshold)
+    print(f"{report['templates']} templates, {report['mode']} with re-ranking of top {report['rerank']}")
+    print(f"Scan memory: {report['float32_bytes'] / 1024:.1f} KB -> {report['quantized_bytes'] / 1024:.1f} KB "
+          f"({report['memory_saving'] * 100:.1f}% smaller)")
+    print(f"Same best match as exact search: {report['agreement_scan_only'] * 100:.2f}% scan only, "
+          f"{report['agreement_reranked'] * 100:.2f}% with re-ranking")
+    print(f"Recall: {report['recall_exact']:.3f} exact -> {report['recall_quantized']:.3f} quantized")
+    print(f"Search time: {report['exact_seconds']:.3f}s exact, {report['quantized_seconds']:.3f}s quantized")
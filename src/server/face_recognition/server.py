@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import os
 import json
@@ -6,176 +6,445 @@ from datetime import datetime
 import cv2
 import threading
 import time
-from detect_and_mark import FaceRecognitionSystem
-from utils import encode_faces
+from startup import WarmUp
+from attendance_summary import AttendanceSummary
+from export_attendance import export_attendance
+from shared_state import SharedState
+from enrollment import EnrollmentJobs, FINISHED_STATES
+from detectors import check_detector
 
 app = Flask(__name__)
 CORS(app)  # Allow cross-origin requests
 
 # Global variables
 face_system = None
+enrollment_jobs = None
 camera_threads = {}
 is_processing = False
-attendance_data = []
+warm_up = WarmUp()
 
-@app.route('/api/status', methods=['GET'])
-def get_status():
-    """Get the status of the face recognition system"""
-    global face_system, is_processing
+# Materialized attendance rollups, available before the models finish loading
+attendance_summary = AttendanceSummary()
+
+# State shared by all worker processes (e.g. gunicorn -w 4): the requested processing options
+# and the status of the one worker holding the camera lease, which runs the cameras
+shared_state = SharedState(
+    os.environ.get("SHARED_STATE_DB", "server_state.db"),
+    lease_ttl=float(os.environ.get("CAMERA_LEASE_TTL", 10))
+)
+CAMERA_LEASE = "cameras"
+# Local time until which this worker's camera lease is valid; camera threads stop after it
+lease_valid_until = 0.0
+ownership_lock = threading.Lock()
+
+# Largest accepted enrollment upload (zip files are also limited to this once extracted)
+ENROLL_MAX_UPLOAD_MB = int(os.environ.get("ENROLL_MAX_UPLOAD_MB", 500))
+app.config['MAX_CONTENT_LENGTH'] = ENROLL_MAX_UPLOAD_MB * 1024 * 1024
+
+def load_system(warm_up):
+    """Load the gallery, detector and Facenet model in the background"""
+    global face_system, enrollment_jobs
     
-    return jsonify({
-        'system_ready': face_system is not None,
+    with warm_up.phase("import"):
+        from detect_and_mark import FaceRecognitionSystem
+    
+    with warm_up.phase("load_gallery"):
+        system = FaceRecognitionSystem(
+            summary=attendance_summary,
+            gallery_mode=os.environ.get("GALLERY_QUANTIZATION") or None
+        )
+    
+    with warm_up.phase("load_detector"):
+        system.get_detector()
+    
+    with warm_up.phase("load_embedder"):
+        system.embedder.warm_up()
+    
+    # Bulk enrollment runs in child processes; any worker can start, report or cancel a job
+    enrollment_jobs = EnrollmentJobs(
+        system, shared_state,
+        jobs_dir=os.environ.get("ENROLL_DIR", "enrollment"),
+        workers=int(os.environ.get("ENROLL_WORKERS", 1)),
+        representatives=int(os.environ.get("ENROLL_REPRESENTATIVES", 1)),
+        max_upload_bytes=ENROLL_MAX_UPLOAD_MB * 1024 * 1024
+    )
+    face_system = system
+
+def owns_cameras():
+    """True while this worker holds the camera lease"""
+    return time.time() < lease_valid_until
+
+def processing_status():
+    """Processing state and today's marks of this worker"""
+    return {
         'is_processing': is_processing,
-        'known_faces': list(face_system.known_faces.keys()) if face_system else [],
         'entry_marked': list(face_system.entry_marked) if face_system else [],
-        'exit_marked': list(face_system.exit_marked) if face_system else []
-    })
+        'exit_marked': list(face_system.exit_marked) if face_system else [],
+        'quality': face_system.get_quality_stats() if face_system else None
+    }
 
-@app.route('/api/attendance', methods=['GET'])
-def get_attendance():
-    """Get the current attendance data"""
-    global attendance_data
+def status_payload():
+    """Build the /api/status response"""
+    # Processing state comes from the worker owning the cameras
+    processing = None if owns_cameras() else shared_state.get('status/processing', max_age=3 * shared_state.lease_ttl)
+    return dict({
+        'system_ready': face_system is not None,
+        'startup': warm_up.report(),
+        'worker': shared_state.worker_id,
+        'camera_owner': shared_state.owner(CAMERA_LEASE),
+        'known_faces': list(face_system.known_faces.keys()) if face_system else []
+    }, **(processing or processing_status()))
+
+def attendance_payload(date=None):
+    """Attendance entries for today (or a given YYYY-MM-DD date)"""
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    # The whole day comes from its log; only the most recent marks are kept in memory
+    if face_system:
+        return list(face_system.attendance.read_day(date))
     
-    # Try to load attendance data from today's file
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    filename = f"attendance_{current_date}.json"
+    filename = f"attendance_{date}.jsonl"
     
+    attendance_data = []
     if os.path.exists(filename):
         with open(filename, 'r') as f:
-            attendance_data = json.load(f)
+            attendance_data = [json.loads(line) for line in f if line.strip()]
+    
+    return attendance_data
+
+def summary_payload(date=None, month=None, person=None):
+    """
+    Precomputed attendance summary: one day (?date=), one child (?person=,
+    optionally with ?month=) or one month (?month=, default current month)
+    """
+    roster = list(face_system.known_faces.keys()) if face_system else None
+    
+    # Marks are written (and the summary persisted) by the camera owner; other
+    # workers apply the new tail of its logs in memory only
+    if not owns_cameras():
+        attendance_summary.catch_up(persist=False)
     
-    return jsonify(attendance_data)
+    if person:
+        return attendance_summary.child(person, month)
+    if date:
+        return attendance_summary.day(date, roster)
+    return attendance_summary.month(month or datetime.now().strftime("%Y-%m"), roster)
+
+def encode_payload():
+    """Start a job re-encoding the whole dataset directory, returns (payload, status code)"""
+    if enrollment_jobs is None:
+        return {'error': 'System is starting up', 'startup': warm_up.report()}, 503
+    try:
+        job = enrollment_jobs.create_from_directory("dataset", replace=True)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return {'success': True, 'message': 'Encoding started', 'job': job}, 202
+
+def enroll_payload(files):
+    """Start an enrollment job for uploaded (name, stream) files, returns (payload, status code)"""
+    if enrollment_jobs is None:
+        return {'error': 'System is starting up', 'startup': warm_up.report()}, 503
+    if not files:
+        return {'error': 'Upload a zip file (file) or photos named <person>/<image> (files)'}, 400
+    try:
+        job = enrollment_jobs.create(files)
+    except (ValueError, OSError) as e:
+        return {'error': str(e)}, 400
+    return {'success': True, 'message': 'Enrollment started', 'job': job}, 202
+
+def enroll_status_payload(job_id=None):
+    """Status of one enrollment job, or of all jobs, returns (payload, status code)"""
+    if enrollment_jobs is None:
+        return {'error': 'System is starting up', 'startup': warm_up.report()}, 503
+    if job_id is None:
+        return {'jobs': enrollment_jobs.list()}, 200
+    job = enrollment_jobs.get(job_id)
+    if job is None:
+        return {'error': f'Unknown enrollment job {job_id}'}, 404
+    return job, 200
+
+def enroll_cancel_payload(job_id):
+    """Cancel an enrollment job, returns (payload, status code)"""
+    if enrollment_jobs is None:
+        return {'error': 'System is starting up', 'startup': warm_up.report()}, 503
+    job = enrollment_jobs.cancel(job_id)
+    if job is None:
+        return {'error': f'Unknown enrollment job {job_id}'}, 404
+    if job['state'] in FINISHED_STATES:
+        return {'error': f"Enrollment job {job_id} already {job['state']}"}, 409
+    return {'success': True, 'message': 'Cancelling enrollment job', 'job': job}, 202
+
+@app.route('/api/status', methods=['GET'])
+def get_status():
+    """Get the status of the face recognition system"""
+    return jsonify(status_payload())
+
+@app.route('/api/attendance', methods=['GET'])
+def get_attendance():
+    """Get the attendance data for today (or ?date=YYYY-MM-DD)"""
+    return jsonify(attendance_payload(request.args.get('date')))
+
+@app.route('/api/attendance/summary', methods=['GET'])
+def get_attendance_summary():
+    """Get daily/monthly attendance rollups for the calendar view"""
+    return jsonify(summary_payload(
+        request.args.get('date'),
+        request.args.get('month'),
+        request.args.get('person')
+    ))
+
+@app.route('/api/attendance/export', methods=['GET'])
+def export_attendance_api():
+    """Stream attendance for ?start=YYYY-MM-DD&end=YYYY-MM-DD as CSV or Parquet (?format=)"""
+    start = request.args.get('start')
+    end = request.args.get('end', datetime.now().strftime("%Y-%m-%d"))
+    export_format = request.args.get('format', 'csv')
+    
+    if not start:
+        return jsonify({'error': 'start date is required'}), 400
+    
+    try:
+        chunks, mimetype = export_attendance(start, end, export_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    
+    filename = f"attendance_{start}_{end}.{export_format}"
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def start_cameras(options):
+    """Apply the requested detector options and start the camera threads in this worker"""
+    global is_processing, camera_threads
+    
+    camera_type = options.get('camera_type', 'both')
+    
+    # Apply detector options to the warmed-up system
+    face_system.detector_name = options.get('detector', face_system.detector_name)
+    face_system.detection_size = options.get('detection_size', face_system.detection_size)
+    face_system.camera_detectors = options.get('camera_detectors', face_system.camera_detectors)
+    
+    is_processing = True
+    
+    if camera_type in ['entry', 'both']:
+        # Start entry camera in a separate thread
+        entry_thread = threading.Thread(
+            target=process_camera_headless,
+            args=(face_system, 0, 'entry')
+        )
+        entry_thread.daemon = True
+        entry_thread.start()
+        camera_threads['entry'] = entry_thread
+    
+    if camera_type in ['exit', 'both']:
+        # Start exit camera in a separate thread
+        exit_thread = threading.Thread(
+            target=process_camera_headless,
+            args=(face_system, 1, 'exit')
+        )
+        exit_thread.daemon = True
+        exit_thread.start()
+        camera_threads['exit'] = exit_thread
+
+def refresh_ownership():
+    """
+    Acquire or renew the camera lease; the holder runs the cameras requested
+    through /api/start and publishes its status for the other workers
+    """
+    global lease_valid_until, is_processing, camera_threads
+    
+    with ownership_lock:
+        if not warm_up.is_ready:
+            return
+        
+        attempt = time.time()
+        had_lease = owns_cameras()
+        if not shared_state.try_acquire(CAMERA_LEASE):
+            if had_lease:
+                print(f"Worker {shared_state.worker_id} lost the camera lease")
+            return
+        
+        if not had_lease:
+            # Threads of an expired lease see it has lapsed; let them finish before restarting
+            for thread in camera_threads.values():
+                thread.join(timeout=5)
+            camera_threads = {}
+            is_processing = False
+            # Continue from the marks the previous owner wrote
+            face_system.attendance.reload()
+            face_system.summary.catch_up()
+            print(f"Worker {shared_state.worker_id} now owns the cameras")
+        lease_valid_until = attempt + shared_state.lease_ttl
+        
+        options = shared_state.get('processing/desired')
+        if options and not is_processing:
+            start_cameras(options)
+        elif not options and is_processing:
+            is_processing = False
+            camera_threads = {}
+        
+        shared_state.set('status/processing', processing_status())
+
+def ownership_loop():
+    """Renew the camera lease well before it expires"""
+    while True:
+        try:
+            refresh_ownership()
+        except Exception as e:
+            print(f"Camera lease error: {e}")
+        try:
+            # Pick up templates merged by enrollment jobs in other workers
+            if enrollment_jobs:
+                enrollment_jobs.sync_gallery()
+        except Exception as e:
+            print(f"Gallery reload error: {e}")
+        time.sleep(shared_state.lease_ttl / 3)
+
+def validate_start_options(data):
+    """
+    Check /api/start options before they reach the camera owner, where a bad
+    detector would only fail inside the camera threads. Returns an error or None.
+    """
+    if not isinstance(data, dict):
+        return 'Expected a JSON object'
+    if data.get('camera_type', 'both') not in ('entry', 'exit', 'both'):
+        return "camera_type must be 'entry', 'exit' or 'both'"
+    
+    detection_size = data.get('detection_size')
+    if detection_size is not None and (
+            isinstance(detection_size, bool) or not isinstance(detection_size, int) or detection_size < 0):
+        return 'detection_size must be a non-negative integer or null'
+    
+    camera_detectors = data.get('camera_detectors', {})
+    if not isinstance(camera_detectors, dict):
+        return 'camera_detectors must be an object mapping a camera to a detector'
+    unknown_cameras = set(camera_detectors) - {'entry', 'exit'}
+    if unknown_cameras:
+        return f"camera_detectors: unknown camera(s) {sorted(unknown_cameras)}"
+    
+    names = set(camera_detectors.values())
+    if 'detector' in data:
+        names.add(data['detector'])
+    for name in names:
+        if not isinstance(name, str):
+            return f'Detector names must be strings, got {name!r}'
+        try:
+            check_detector(name)
+        except ValueError as e:
+            return str(e)
+    return None
 
 @app.route('/api/start', methods=['POST'])
 def start_recognition():
-    """Start the face recognition system"""
-    global face_system, is_processing, camera_threads
-    
-    if is_processing:
+    """Start the face recognition system (in whichever worker owns the cameras)"""
+    if shared_state.get('processing/desired'):
         return jsonify({'error': 'Face recognition is already running'}), 400
     
-    # Initialize the face recognition system if needed
-    if not face_system:
-        face_system = FaceRecognitionSystem()
+    if not warm_up.is_ready:
+        return jsonify({'error': 'System is starting up', 'startup': warm_up.report()}), 503
     
     # Get camera options from request
-    data = request.json
+    data = request.get_json(silent=True)
+    error = validate_start_options(data)
+    if error:
+        return jsonify({'error': error}), 400
     camera_type = data.get('camera_type', 'both')
     
     try:
-        is_processing = True
-        
-        if camera_type in ['entry', 'both']:
-            # Start entry camera in a separate thread
-            entry_thread = threading.Thread(
-                target=process_camera_headless,
-                args=(face_system, 0, 'entry')
-            )
-            entry_thread.daemon = True
-            entry_thread.start()
-            camera_threads['entry'] = entry_thread
-        
-        if camera_type in ['exit', 'both']:
-            # Start exit camera in a separate thread
-            exit_thread = threading.Thread(
-                target=process_camera_headless,
-                args=(face_system, 1, 'exit')
-            )
-            exit_thread.daemon = True
-            exit_thread.start()
-            camera_threads['exit'] = exit_thread
+        shared_state.set('processing/desired', {
+            key: data[key] for key in ('camera_type', 'detector', 'detection_size', 'camera_detectors')
+            if key in data
+        })
+        refresh_ownership()
         
         return jsonify({'success': True, 'message': f'Started {camera_type} camera(s)'})
     
     except Exception as e:
-        is_processing = False
+        shared_state.set('processing/desired', None)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/stop', methods=['POST'])
 def stop_recognition():
-    """Stop the face recognition system"""
-    global is_processing, camera_threads
-    
-    if not is_processing:
+    """Stop the face recognition system (in whichever worker owns the cameras)"""
+    if not shared_state.get('processing/desired'):
         return jsonify({'error': 'Face recognition is not running'}), 400
     
     try:
-        is_processing = False
+        shared_state.set('processing/desired', None)
+        refresh_ownership()
         # Let the threads stop gracefully
         time.sleep(1)
-        camera_threads = {}
         return jsonify({'success': True, 'message': 'Face recognition stopped'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/encode', methods=['POST'])
 def encode_faces_api():
-    """Encode faces from the dataset directory"""
-    try:
-        result = encode_faces()
-        return jsonify({
-            'success': True, 
-            'message': 'Face encodings created successfully',
-            'encoded_faces': list(result.keys()) if result else []
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    """Re-encode the dataset directory in the background (poll /api/enroll/<job_id>)"""
+    payload, code = encode_payload()
+    return jsonify(payload), code
+
+@app.route('/api/enroll', methods=['POST'])
+def enroll_api():
+    """Enroll a zip file (field 'file') or photos named <person>/<image> (field 'files') in the background"""
+    uploads = request.files.getlist('file') or request.files.getlist('files')
+    payload, code = enroll_payload([(f.filename, f.stream) for f in uploads if f.filename])
+    return jsonify(payload), code
+
+@app.route('/api/enroll', methods=['GET'])
+def list_enrollments_api():
+    """List enrollment jobs"""
+    payload, code = enroll_status_payload()
+    return jsonify(payload), code
+
+@app.route('/api/enroll/<job_id>', methods=['GET'])
+def enrollment_status_api(job_id):
+    """Progress, per-person counts and failures of an enrollment job"""
+    payload, code = enroll_status_payload(job_id)
+    return jsonify(payload), code
+
+@app.route('/api/enroll/<job_id>/cancel', methods=['POST'])
+def cancel_enrollment_api(job_id):
+    """Cancel a running enrollment job (nothing is merged)"""
+    payload, code = enroll_cancel_payload(job_id)
+    return jsonify(payload), code
 
 def process_camera_headless(face_system, camera_id, camera_type):
     """Process camera without displaying UI (headless operation)"""
-    global is_processing, attendance_data
+    global is_processing
     
     cap = cv2.VideoCapture(camera_id)
     if not cap.isOpened():
         print(f"Error: Could not open camera {camera_id}")
         return
     
-    marked_set = face_system.entry_marked if camera_type == "entry" else face_system.exit_marked
-    
     print(f"Starting {camera_type} camera (ID: {camera_id}) in headless mode")
     
-    while is_processing:
+    # Load the model before the first frame arrives
+    face_system.embedder.warm_up()
+    
+    # Stop as soon as the lease can't be renewed, so two workers never run the same camera
+    while is_processing and owns_cameras():
         ret, frame = cap.read()
         if not ret:
             break
         
-        # Detect faces
-        results = face_system.detector.detect_faces(frame)
+        try:
+            # Detect, embed and match all faces in one batch
+            faces = face_system.recognize_faces(frame, camera_type)
+        except Exception as e:
+            # Just continue if face processing fails
+            faces = []
         
-        for face in results:
-            x, y, w, h = face['box']
-            
-            # Ensure positive dimensions
-            x, y = max(0, x), max(0, y)
-            
-            # Skip if face is too small
-            if w < 50 or h < 50:
-                continue
+        for face in faces:
+            name = face['name']
             
-            face_crop = frame[y:y+h, x:x+w]
-            if face_crop.size == 0:
-                continue
-            
-            try:
-                # Get face embedding
-                embedding = DeepFace.represent(
-                    img_path=face_crop, 
-                    model_name="Facenet", 
-                    enforce_detection=False
-                )[0]["embedding"]
-                
-                # Find best match
-                name, confidence = face_system.find_match(embedding)
-                
-                # Record attendance if not already marked and it's a known person
-                if name != "Unknown" and name not in marked_set:
-                    log_entry = face_system.record_attendance(name, camera_type)
-                    marked_set.add(name)
-                    attendance_data.append(log_entry)
-            
-            except Exception as e:
-                # Just continue if face processing fails
-                pass
+            # Record attendance if it's a known person (duplicates are ignored)
+            if name != "Unknown" and not face['reused']:
+                face_system.record_attendance(name, camera_type)
         
         # Short sleep to reduce CPU usage
         time.sleep(0.1)
@@ -183,6 +452,12 @@ def process_camera_headless(face_system, camera_id, camera_type):
     cap.release()
     print(f"Stopped {camera_type} camera (ID: {camera_id})")
 
+# Load models and gallery in the background so /api/status answers immediately
+warm_up.start(load_system)
+
+# Compete for the camera lease with the other workers (only once this one is warmed up)
+threading.Thread(target=ownership_loop, daemon=True).start()
+
 if __name__ == '__main__':
-    # Run the Flask server
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # Run the Flask server (use asgi.py for the async serving mode)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG") == "1") 
\ No newline at end of file
@@ -0,0 +1,100 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+class SharedState:
+    """
+    SQLite state shared by the worker processes of one server deployment.
+
+    Holds leases for leader election (exactly one worker holds the "cameras"
+    lease and runs the cameras; if it dies, the lease expires and another
+    worker takes over) and JSON values such as the requested processing
+    options and the status published by the camera owner. WAL mode keeps
+    readers from blocking the writer. Connections are opened per process, so
+    the object may be created before workers are forked.
+    """
+
+    def __init__(self, path="server_state.db", worker_id=None, lease_ttl=10.0):
+        self.path = path
+        self.worker_id_override = worker_id
+        self.lease_ttl = lease_ttl
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    @property
+    def worker_id(self):
+        """Name of this worker process (host:pid unless given)"""
+        return self.worker_id_override or f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connection(self):
+        """Connection of the current process, reopened after a fork"""
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, updated REAL NOT NULL);
+            """)
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _execute(self, sql, params=(), commit=False):
+        with self._lock:
+            db = self._connection()
+            rows = db.execute(sql, params).fetchall()
+            if commit:
+                db.commit()
+            return rows
+
+    def try_acquire(self, lease):
+        """Acquire or renew a lease atomically, returns True if this worker holds it"""
+        now = time.time()
+        self._execute("""
+            INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+            WHERE leases.owner = excluded.owner OR leases.expires < ?
+        """, (lease, self.worker_id, now + self.lease_ttl, now), commit=True)
+        return self.owner(lease) == self.worker_id
+
+    def release(self, lease):
+        """Give up a lease held by this worker so another can take it at once"""
+        self._execute("DELETE FROM leases WHERE name = ? AND owner = ?", (lease, self.worker_id), commit=True)
+
+    def owner(self, lease):
+        """Worker currently holding a lease, or None if it is free or expired"""
+        rows = self._execute("SELECT owner FROM leases WHERE name = ? AND expires >= ?", (lease, time.time()))
+        return rows[0][0] if rows else None
+
+    def set(self, key, value):
+        """Store a JSON-serializable value (None deletes it)"""
+        if value is None:
+            self._execute("DELETE FROM kv WHERE key = ?", (key,), commit=True)
+            return
+        self._execute(
+            "INSERT INTO kv (key, value, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+            (key, json.dumps(value), time.time()), commit=True
+        )
+
+    def get(self, key, max_age=None):
+        """Stored value, or None if missing or older than max_age seconds"""
+        rows = self._execute("SELECT value, updated FROM kv WHERE key = ?", (key,))
+        if not rows or (max_age is not None and time.time() - rows[0][1] > max_age):
+            return None
+        return json.loads(rows[0][0])
+
+    def scan(self, prefix):
+        """All values under a key prefix, most recently updated first"""
+        rows = self._execute("SELECT key, value FROM kv WHERE substr(key, 1, ?) = ? ORDER BY updated DESC",
+                             (len(prefix), prefix))
+        return {key: json.loads(value) for key, value in rows}
+
+    def prune(self, prefix, max_age):
+        """Delete values under a key prefix not updated for max_age seconds"""
+        self._execute("DELETE FROM kv WHERE substr(key, 1, ?) = ? AND updated < ?",
+                      (len(prefix), prefix, time.time() - max_age), commit=True)
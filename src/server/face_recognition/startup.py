@@ -0,0 +1,66 @@
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+class WarmUp:
+    """
+    Runs model and gallery loading on a background thread and times each phase,
+    so the API can answer /api/status while TensorFlow is still loading.
+    State goes pending -> warming_up -> ready (or error).
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.state = "pending"
+        self.error = None
+        self.phases = []
+        self.ready_event = threading.Event()
+        self.thread = None
+
+    @property
+    def is_ready(self):
+        return self.state == "ready"
+
+    @contextmanager
+    def phase(self, name):
+        """Time a named startup phase"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            self.phases.append({"phase": name, "seconds": round(seconds, 3)})
+            print(f"Startup phase '{name}' took {seconds:.2f}s")
+
+    def start(self, target):
+        """Run target(warm_up) on a daemon thread"""
+        def run():
+            self.state = "warming_up"
+            try:
+                target(self)
+                self.state = "ready"
+                print(f"System ready after {time.time() - self.started_at:.2f}s")
+            except Exception as e:
+                self.state = "error"
+                self.error = str(e)
+                traceback.print_exc()
+            finally:
+                self.ready_event.set()
+
+        self.thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        self.thread.start()
+
+    def wait(self, timeout=None):
+        """Block until warm-up finishes, returns True if ready"""
+        self.ready_event.wait(timeout)
+        return self.is_ready
+
+    def report(self):
+        """Readiness state and startup-time breakdown by phase"""
+        return {
+            "state": self.state,
+            "error": self.error,
+            "phases": list(self.phases),
+            "elapsed_seconds": round(time.time() - self.started_at, 3)
+        }
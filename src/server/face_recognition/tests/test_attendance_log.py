@@ -0,0 +1,68 @@
+from datetime import datetime
+from attendance_log import DailyAttendanceLog
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_duplicates_are_skipped_per_camera(tmp_path):
+    log = DailyAttendanceLog(str(tmp_path), clock=Clock(datetime(2026, 3, 2, 8, 0, 0)))
+
+    assert log.record("alice", "entry")["time"] == "08:00:00"
+    assert log.record("alice", "entry") is None
+    assert log.record("alice", "exit") is not None
+    assert log.marked_today("entry") == {"alice"}
+    log.close()
+
+def test_rolls_over_at_midnight(tmp_path):
+    clock = Clock(datetime(2026, 3, 2, 23, 59, 0))
+    log = DailyAttendanceLog(str(tmp_path), clock=clock)
+    log.record("alice", "entry")
+
+    clock.now = datetime(2026, 3, 3, 0, 1, 0)
+
+    assert not log.is_marked("alice", "entry")
+    assert log.today() == []
+    assert log.record("alice", "entry")["date"] == "2026-03-03"
+    assert [e["name"] for e in log.read_day("2026-03-02")] == ["alice"]
+    assert [e["name"] for e in log.read_day("2026-03-03")] == ["alice"]
+    log.close()
+
+def test_restart_restores_the_day(tmp_path):
+    clock = Clock(datetime(2026, 3, 2, 8, 0, 0))
+    log = DailyAttendanceLog(str(tmp_path), clock=clock)
+    log.record("alice", "entry")
+    log.record("bob", "exit")
+    log.close()
+
+    restarted = DailyAttendanceLog(str(tmp_path), clock=clock)
+
+    assert restarted.is_marked("alice", "entry")
+    assert restarted.marked_today("exit") == {"bob"}
+    assert restarted.record("alice", "entry") is None
+    restarted.close()
+
+def test_reload_picks_up_marks_of_another_process(tmp_path):
+    clock = Clock(datetime(2026, 3, 2, 8, 0, 0))
+    owner = DailyAttendanceLog(str(tmp_path), clock=clock)
+    reader = DailyAttendanceLog(str(tmp_path), clock=clock)
+
+    owner.record("alice", "entry")
+    reader.reload()
+
+    assert reader.is_marked("alice", "entry")
+    owner.close()
+    reader.close()
+
+def test_listeners_get_the_entry_and_file_offset(tmp_path):
+    calls = []
+    log = DailyAttendanceLog(str(tmp_path), clock=Clock(datetime(2026, 3, 2, 8, 0, 0)),
+                             listeners=[lambda entry, offset: calls.append((entry["name"], offset))])
+
+    log.record("alice", "entry")
+    log.close()
+
+    assert calls == [("alice", (tmp_path / "attendance_2026-03-02.jsonl").stat().st_size)]
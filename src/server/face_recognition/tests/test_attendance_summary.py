@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+from datetime import datetime
+import pytest
+from attendance_log import DailyAttendanceLog
+from attendance_summary import AttendanceSummary
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock(datetime(2026, 3, 2, 8, 0, 0))
+
+def write_marks(directory, clock, summary=None):
+    log = DailyAttendanceLog(str(directory), clock=clock, listeners=[summary.on_record] if summary else [])
+    log.record("alice", "entry")
+    log.record("bob", "entry")
+    clock.now = clock.now.replace(hour=15)
+    log.record("alice", "exit")
+    clock.now = datetime(2026, 3, 3, 8, 0, 0)
+    log.record("alice", "entry")
+    log.close()
+
+def test_rollups_follow_the_marks(tmp_path, clock):
+    summary = AttendanceSummary(str(tmp_path))
+    write_marks(tmp_path, clock, summary)
+
+    day = summary.day("2026-03-02", roster=["alice", "bob", "carol"])
+    assert (day["present"], day["entries"], day["exits"]) == (2, 2, 1)
+    assert day["absent"] == ["carol"]
+    assert day["people"]["alice"] == {"entry": "08:00:00", "exit": "15:00:00"}
+
+    month = summary.month("2026-03")
+    assert month["school_days"] == 2
+    assert month["children"] == {"alice": 2, "bob": 1}
+    assert summary.child("bob")["days_present"] == 1
+
+def test_rebuilt_from_logs_written_while_not_running(tmp_path, clock):
+    write_marks(tmp_path, clock)
+
+    summary = AttendanceSummary(str(tmp_path))
+
+    assert summary.month("2026-03")["children"] == {"alice": 2, "bob": 1}
+    assert os.path.exists(tmp_path / "attendance_summary_2026-03.json")
+
+def test_persisted_per_month_and_not_applied_twice(tmp_path, clock):
+    summary = AttendanceSummary(str(tmp_path))
+    write_marks(tmp_path, clock, summary)
+    summary.flush()
+
+    clock.now = datetime(2026, 4, 1, 8, 0, 0)
+    log = DailyAttendanceLog(str(tmp_path), clock=clock)
+    log.record("bob", "entry")
+    log.close()
+
+    reloaded = AttendanceSummary(str(tmp_path))
+
+    assert reloaded.month("2026-03")["children"] == {"alice": 2, "bob": 1}
+    assert reloaded.month("2026-04")["children"] == {"bob": 1}
+    assert sorted(p.name for p in tmp_path.glob("attendance_summary_*.json")) == [
+        "attendance_summary_2026-03.json", "attendance_summary_2026-04.json"
+    ]
+
+def test_single_file_summary_is_migrated(tmp_path, clock):
+    summary = AttendanceSummary(str(tmp_path))
+    write_marks(tmp_path, clock, summary)
+    with open(tmp_path / "attendance_summary.json", "w") as f:
+        json.dump(summary.state, f)
+    for path in tmp_path.glob("attendance_summary_*.json"):
+        path.unlink()
+
+    migrated = AttendanceSummary(str(tmp_path))
+
+    assert migrated.month("2026-03")["children"] == {"alice": 2, "bob": 1}
+    assert not (tmp_path / "attendance_summary.json").exists()
+    assert (tmp_path / "attendance_summary_2026-03.json").exists()
+
+def test_catch_up_without_persisting(tmp_path, clock):
+    reader = AttendanceSummary(str(tmp_path))
+    write_marks(tmp_path, clock)
+
+    reader.catch_up(persist=False)
+
+    assert reader.month("2026-03")["children"] == {"alice": 2, "bob": 1}
+    assert not (tmp_path / "attendance_summary_2026-03.json").exists()
+
+def test_concurrent_flushes_of_several_processes(tmp_path, clock):
+    write_marks(tmp_path, clock)
+    summaries = [AttendanceSummary(str(tmp_path)) for _ in range(4)]
+    errors = []
+
+    def flush_repeatedly(summary):
+        try:
+            for _ in range(50):
+                summary._dirty_months.add("2026-03")
+                summary.flush()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=flush_repeatedly, args=(s,)) for s in summaries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [p.name for p in tmp_path.glob("*.tmp")] == []
+    assert AttendanceSummary(str(tmp_path)).month("2026-03")["children"] == {"alice": 2, "bob": 1}
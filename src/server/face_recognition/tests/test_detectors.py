@@ -0,0 +1,31 @@
+import numpy as np
+
+from detectors import FaceDetector, detect_scaled
+
+class FakeDetector(FaceDetector):
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detect(self, frame):
+        return [box for box, _ in self.faces]
+
+    def detect_landmarks(self, frame):
+        return self.faces
+
+def test_detect_scaled_maps_boxes_and_landmarks_back():
+    points = {"left_eye": (20, 30), "right_eye": (40, 30), "nose": (30, 40)}
+    detector = FakeDetector([((10, 20, 50, 60), points)])
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+    assert detect_scaled(detector, frame, 640) == [(20, 40, 100, 120)]
+    [(box, landmarks)] = detect_scaled(detector, frame, 640, landmarks=True)
+    assert box == (20, 40, 100, 120)
+    assert landmarks == {"left_eye": (40, 60), "right_eye": (80, 60), "nose": (60, 80)}
+
+def test_box_only_detectors_report_no_landmarks():
+    class BoxDetector(FaceDetector):
+        def detect(self, frame):
+            return [(1, 2, 3, 4)]
+
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    assert detect_scaled(BoxDetector(), frame, 640, landmarks=True) == [((1, 2, 3, 4), None)]
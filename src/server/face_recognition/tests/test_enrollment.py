@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import time
+import zipfile
+import pytest
+from enrollment import EnrollmentJobs, clean_relative_path, extract_zip, list_images
+from shared_state import SharedState
+
+class FakeFaceSystem:
+    def __init__(self):
+        self.reloads = 0
+
+    def reload_gallery(self):
+        self.reloads += 1
+
+@pytest.fixture
+def state(tmp_path):
+    return SharedState(str(tmp_path / "state.db"), worker_id="a")
+
+@pytest.fixture
+def jobs(tmp_path, state):
+    return EnrollmentJobs(FakeFaceSystem(), state, jobs_dir=str(tmp_path / "jobs"))
+
+def test_upload_paths_stay_inside_the_job():
+    assert clean_relative_path("alice/1.jpg") == os.path.join("alice", "1.jpg")
+    assert clean_relative_path("./alice\\2.PNG") == os.path.join("alice", "2.PNG")
+    assert clean_relative_path("../alice/1.jpg") is None
+    assert clean_relative_path("__MACOSX/alice/._1.jpg") is None
+    assert clean_relative_path("alice/notes.txt") is None
+
+def test_zip_is_extracted_within_its_size_limit(tmp_path):
+    upload = io.BytesIO()
+    with zipfile.ZipFile(upload, "w") as archive:
+        archive.writestr("class/alice/1.jpg", b"x" * 100)
+        archive.writestr("class/bob/1.jpg", b"x" * 100)
+        archive.writestr("../evil.jpg", b"x" * 100)
+    images_dir = tmp_path / "images"
+
+    with pytest.raises(ValueError):
+        extract_zip(io.BytesIO(upload.getvalue()), str(images_dir), max_bytes=150)
+    assert extract_zip(io.BytesIO(upload.getvalue()), str(images_dir), max_bytes=1000) == 2
+
+    # The wrapping "class" directory is skipped
+    assert [person for _, person in list_images(str(images_dir))] == ["alice", "bob"]
+
+def test_photos_named_after_the_person(tmp_path):
+    (tmp_path / "alice").mkdir()
+    (tmp_path / "alice" / "1.jpg").write_bytes(b"x")
+    (tmp_path / "bob.png").write_bytes(b"x")
+    (tmp_path / "notes.txt").write_text("x")
+
+    assert [(os.path.relpath(path, tmp_path), person) for path, person in list_images(str(tmp_path))] == [
+        (os.path.join("alice", "1.jpg"), "alice"), ("bob.png", "bob")
+    ]
+
+def test_results_are_applied_up_to_a_partial_line(tmp_path):
+    results_file = tmp_path / "results.jsonl"
+    results_file.write_text(
+        json.dumps({"total": 3}) + "\n"
+        + json.dumps({"file": "alice/1.jpg", "person": "alice", "embedding": [1.0, 0.0], "error": None}) + "\n"
+        + json.dumps({"file": "bob/1.jpg", "person": "bob", "embedding": None, "error": "no face"}) + "\n"
+        + '{"file": "alice/2.jpg", "per'
+    )
+    job = {"total": None, "processed": 0, "embedded": 0, "people": {}, "failures": [], "failed": 0}
+    embeddings = {}
+
+    offset = EnrollmentJobs._read_results(job, str(results_file), 0, embeddings)
+
+    assert (job["total"], job["processed"], job["embedded"], job["failed"]) == (3, 2, 1, 1)
+    assert job["failures"] == [{"file": "bob/1.jpg", "error": "no face"}]
+    assert embeddings == {"alice": [[1.0, 0.0]]}
+    assert offset == len(results_file.read_bytes()) - len('{"file": "alice/2.jpg", "per')
+
+def test_reduce_to_mean_or_clusters(jobs):
+    embeddings = {"alice": [[0.0, 0.0], [4.0, 0.0], [20.0, 20.0], [24.0, 20.0]]}
+
+    assert jobs.reduce(embeddings) == {"alice": [[12.0, 10.0]]}
+    jobs.representatives = 2
+    assert sorted(jobs.reduce(embeddings)["alice"]) == [[2.0, 0.0], [22.0, 20.0]]
+
+def test_stale_job_is_reported_interrupted_and_cannot_be_cancelled(jobs, state):
+    state.set("enroll/abc", {"job_id": "abc", "state": "running", "updated": time.time() - 60})
+
+    assert jobs.get("abc")["state"] == "interrupted"
+    jobs.cancel("abc")
+    assert state.get("enroll_cancel/abc") is None
+
+def test_cancel_is_requested_through_the_shared_state(jobs, state):
+    state.set("enroll/abc", {"job_id": "abc", "state": "running", "updated": time.time()})
+
+    assert jobs.cancel("abc")["state"] == "running"
+    assert state.get("enroll_cancel/abc") is True
+    assert [job["job_id"] for job in jobs.list()] == ["abc"]
+
+def test_gallery_is_reloaded_when_another_worker_merged(jobs, state):
+    jobs.sync_gallery()
+    assert jobs.face_system.reloads == 0
+
+    state.set("gallery/version", "v2")
+    jobs.sync_gallery()
+    jobs.sync_gallery()
+
+    assert jobs.face_system.reloads == 1
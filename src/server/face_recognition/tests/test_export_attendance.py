@@ -0,0 +1,45 @@
+import csv
+import io
+import json
+import pytest
+from export_attendance import export_attendance
+
+def write_day(directory, day, entries, partial=None):
+    with open(directory / f"attendance_{day}.jsonl", "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        if partial:
+            f.write(partial)
+
+def test_csv_covers_the_range_in_order(tmp_path):
+    write_day(tmp_path, "2026-03-01", [{"name": "alice", "date": "2026-03-01", "time": "08:00:00", "camera": "entry"}])
+    write_day(tmp_path, "2026-03-03", [
+        {"name": "bob", "date": "2026-03-03", "time": "08:05:00", "camera": "entry"},
+        {"name": "bob", "date": "2026-03-03", "time": "15:00:00", "camera": "exit"}
+    ])
+    write_day(tmp_path, "2026-03-05", [{"name": "carol", "date": "2026-03-05", "time": "08:00:00", "camera": "entry"}])
+
+    chunks, mimetype = export_attendance("2026-03-01", "2026-03-03", directory=str(tmp_path))
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+
+    assert mimetype == "text/csv"
+    assert [(r["date"], r["name"], r["camera"]) for r in rows] == [
+        ("2026-03-01", "alice", "entry"), ("2026-03-03", "bob", "entry"), ("2026-03-03", "bob", "exit")
+    ]
+
+def test_mark_still_being_written_is_left_out(tmp_path):
+    write_day(tmp_path, "2026-03-01", [{"name": "alice", "date": "2026-03-01", "time": "08:00:00", "camera": "entry"}],
+              partial='{"name": "bo')
+
+    chunks, _ = export_attendance("2026-03-01", "2026-03-01", directory=str(tmp_path))
+
+    assert [r["name"] for r in csv.DictReader(io.StringIO("".join(chunks)))] == ["alice"]
+
+@pytest.mark.parametrize("start, end, export_format", [
+    ("2026-03-05", "2026-03-01", "csv"),
+    ("2026-13-01", "2026-13-02", "csv"),
+    ("2026-03-01", "2026-03-02", "xlsx")
+])
+def test_bad_arguments_are_rejected(tmp_path, start, end, export_format):
+    with pytest.raises(ValueError):
+        export_attendance(start, end, export_format, str(tmp_path))
@@ -0,0 +1,55 @@
+from face_quality import FaceTracker, QualityGate, box_iou
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def passed(score):
+    return {"passed": True, "score": score}
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 10, 10)) == 50 / 150
+    assert box_iou((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
+
+def test_overlapping_boxes_continue_a_track_per_camera():
+    tracker = FaceTracker(clock=Clock())
+
+    track = tracker.update("entry", (100, 100, 80, 80))
+
+    assert tracker.update("entry", (105, 100, 80, 80)) is track
+    assert tracker.update("entry", (400, 100, 80, 80)) is not track
+    assert tracker.update("exit", (100, 100, 80, 80)) is not track
+
+def test_track_expires_after_max_age():
+    clock = Clock()
+    tracker = FaceTracker(max_age=1.0, clock=clock)
+    track = tracker.update("entry", (100, 100, 80, 80))
+
+    clock.now = 1.5
+
+    assert tracker.update("entry", (100, 100, 80, 80)) is not track
+
+def test_embedded_again_only_for_a_better_or_stale_frame():
+    clock = Clock()
+    tracker = FaceTracker(min_gain=0.05, max_reuse=3.0, clock=clock)
+    track = tracker.update("entry", (100, 100, 80, 80))
+
+    assert tracker.needs_embedding(track, passed(0.5))
+    assert not tracker.remember(track, ("alice", 4.0), passed(0.5))
+    assert not tracker.needs_embedding(track, passed(0.52))
+    assert not tracker.needs_embedding(track, {"passed": False, "score": 0.9})
+    assert tracker.needs_embedding(track, passed(0.6))
+    assert tracker.remember(track, ("alice", 3.5), passed(0.6))
+
+    clock.now = 4.0
+    assert tracker.needs_embedding(track, passed(0.1))
+
+def test_yaw_from_landmarks():
+    gate = QualityGate()
+
+    assert gate.estimate_yaw({"left_eye": (30, 40), "right_eye": (70, 40), "nose": (50, 60)}) == 0.0
+    assert gate.estimate_yaw({"left_eye": (30, 40), "right_eye": (70, 40), "nose": (65, 60)}) > gate.max_yaw
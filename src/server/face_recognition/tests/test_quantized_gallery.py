@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import pytest
+from quantized_gallery import QuantizedGallery, map_full_precision, quantization_report
+
+def make_embeddings(count=200, dimension=128, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(count, dimension)).astype(np.float32)
+
+def test_int8_round_trip_error_is_within_half_a_step():
+    embeddings = make_embeddings()
+
+    gallery = QuantizedGallery(embeddings, [str(i) for i in range(len(embeddings))], mode="int8")
+    restored = gallery.codes.astype(np.float32) * gallery.scale
+
+    assert gallery.codes.dtype == np.int8
+    assert np.all(np.abs(restored - embeddings) <= gallery.scale / 2 + 1e-6)
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_search_returns_exact_distance_after_reranking(mode):
+    embeddings = make_embeddings()
+    queries = embeddings[[3, 50, 199]] + 0.01
+
+    gallery = QuantizedGallery(embeddings, [str(i) for i in range(len(embeddings))], mode=mode, rerank=8)
+    best, distances = gallery.search(queries)
+
+    exact = np.linalg.norm(embeddings[None, :, :] - queries[:, None, :], axis=2)
+    np.testing.assert_array_equal(best, [3, 50, 199])
+    np.testing.assert_allclose(distances, exact.min(axis=1), rtol=1e-5)
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        QuantizedGallery(make_embeddings(count=2), ["a", "b"], mode="int4")
+
+def test_report_agrees_with_exact_search():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(5, 128)) * 3
+    embeddings = np.vstack([center + rng.normal(size=(4, 128)) * 0.1 for center in centers]).astype(np.float32)
+    names = [f"person_{i // 4}" for i in range(len(embeddings))]
+
+    report = quantization_report(embeddings, names, threshold=10)
+
+    assert report["agreement_reranked"] == 1.0
+    assert report["recall_exact"] == report["recall_quantized"] == 1.0
+    assert report["quantized_bytes"] < report["float32_bytes"]
+
+def test_full_precision_file_is_reused_when_newer_than_source(tmp_path):
+    embeddings = make_embeddings(count=20)
+    source = tmp_path / "encodings.json"
+    sidecar = tmp_path / "encodings.f32.npy"
+    source.write_text("{}")
+
+    mapped = map_full_precision(embeddings, str(sidecar), str(source))
+    np.testing.assert_array_equal(mapped, embeddings)
+    os.utime(sidecar, (os.path.getmtime(source) + 10,) * 2)
+    written = os.path.getmtime(sidecar)
+
+    # Same shape and newer than the source: reused as-is, even with other content
+    map_full_precision(np.zeros_like(embeddings), str(sidecar), str(source))
+    assert os.path.getmtime(sidecar) == written
+
+    # Different shape: rewritten
+    remapped = map_full_precision(embeddings[:5], str(sidecar), str(source))
+    np.testing.assert_array_equal(remapped, embeddings[:5])
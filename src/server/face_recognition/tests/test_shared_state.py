@@ -0,0 +1,77 @@
+import time
+import pytest
+from shared_state import SharedState
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / "state.db")
+    return SharedState(path, worker_id="a", lease_ttl=10), SharedState(path, worker_id="b", lease_ttl=10)
+
+def test_only_one_worker_holds_a_lease(clock, workers):
+    a, b = workers
+
+    assert a.try_acquire("cameras")
+    assert not b.try_acquire("cameras")
+    assert a.owner("cameras") == b.owner("cameras") == "a"
+
+def test_renewal_extends_the_lease(clock, workers):
+    a, b = workers
+    a.try_acquire("cameras")
+
+    clock[0] += 8
+    assert a.try_acquire("cameras")
+    clock[0] += 8
+
+    assert not b.try_acquire("cameras")
+
+def test_expired_lease_is_taken_over(clock, workers):
+    a, b = workers
+    a.try_acquire("cameras")
+
+    clock[0] += 10.5
+
+    assert a.owner("cameras") is None
+    assert b.try_acquire("cameras")
+    assert not a.try_acquire("cameras")
+    assert b.owner("cameras") == "b"
+
+def test_released_lease_is_free_at_once(clock, workers):
+    a, b = workers
+    a.try_acquire("cameras")
+
+    b.release("cameras")
+    assert not b.try_acquire("cameras")
+
+    a.release("cameras")
+    assert b.try_acquire("cameras")
+
+def test_values_expire_with_max_age(clock, workers):
+    a, b = workers
+    a.set("status/processing", {"running": True})
+
+    clock[0] += 5
+    assert b.get("status/processing", max_age=10) == {"running": True}
+    assert b.get("status/processing", max_age=1) is None
+
+    a.set("status/processing", None)
+    assert b.get("status/processing") is None
+
+def test_scan_and_prune_by_prefix(clock, workers):
+    a, b = workers
+    a.set("enroll/alice", {"version": 1})
+    clock[0] += 5
+    a.set("enroll/bob", {"version": 2})
+    a.set("status/processing", {"running": True})
+
+    assert list(b.scan("enroll/")) == ["enroll/bob", "enroll/alice"]
+
+    b.prune("enroll/", max_age=3)
+
+    assert list(a.scan("enroll/")) == ["enroll/bob"]
+    assert a.get("status/processing") == {"running": True}
@@ -0,0 +1,31 @@
+from startup import WarmUp
+
+def test_phases_are_timed_and_state_becomes_ready():
+    warm_up = WarmUp()
+    assert warm_up.state == "pending"
+
+    def load(w):
+        with w.phase("models"):
+            pass
+        with w.phase("gallery"):
+            pass
+
+    warm_up.start(load)
+
+    assert warm_up.wait(timeout=5)
+    report = warm_up.report()
+    assert report["state"] == "ready" and report["error"] is None
+    assert [p["phase"] for p in report["phases"]] == ["models", "gallery"]
+
+def test_failed_warm_up_reports_the_error_and_the_failed_phase():
+    def load(w):
+        with w.phase("models"):
+            raise RuntimeError("model file missing")
+
+    warm_up = WarmUp()
+    warm_up.start(load)
+
+    assert not warm_up.wait(timeout=5)
+    report = warm_up.report()
+    assert (report["state"], report["error"]) == ("error", "model file missing")
+    assert [p["phase"] for p in report["phases"]] == ["models"]
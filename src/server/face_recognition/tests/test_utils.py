@@ -0,0 +1,38 @@
+import numpy as np
+from utils import cluster_embeddings, remove_near_duplicates
+
+def test_remove_near_duplicates_keeps_first_of_each_group():
+    a = np.zeros(4)
+    b = np.ones(4) * 5
+    embeddings = np.array([a, a + 0.1, b, b + 0.1, a + 0.2])
+
+    np.testing.assert_array_equal(remove_near_duplicates(embeddings, threshold=1.0), [a, b])
+
+def test_cluster_embeddings_finds_separated_groups():
+    rng = np.random.default_rng(1)
+    centers = np.eye(3, 8) * 50
+    embeddings = np.vstack([center + rng.normal(size=(6, 8)) * 2 for center in centers])
+
+    representatives = cluster_embeddings(embeddings, k=3)
+
+    assert representatives.shape == (3, 8)
+    for center in centers:
+        assert np.min(np.linalg.norm(representatives - center, axis=1)) < 3
+
+def test_cluster_embeddings_is_deterministic_and_keeps_small_sets():
+    embeddings = np.random.default_rng(2).normal(size=(20, 8)) * 10
+
+    np.testing.assert_array_equal(cluster_embeddings(embeddings, k=3), cluster_embeddings(embeddings, k=3))
+    np.testing.assert_array_equal(cluster_embeddings(embeddings[:2], k=3), embeddings[:2])
+
+def test_duplicates_do_not_take_a_representative():
+    # Burst of near-identical photos plus two other poses: each pose keeps its own representative
+    rng = np.random.default_rng(3)
+    burst = np.zeros(8) + rng.normal(size=(10, 8)) * 0.05
+    poses = np.array([np.full(8, 10.0), np.full(8, -10.0)])
+
+    representatives = cluster_embeddings(np.vstack([burst, poses]), k=3)
+
+    assert len(representatives) == 3
+    for pose in poses:
+        assert np.min(np.linalg.norm(representatives - pose, axis=1)) < 1e-9
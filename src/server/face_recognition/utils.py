@@ -1,14 +1,96 @@
 import os
 import cv2
 import numpy as np
-from deepface import DeepFace
 import json
+from contextlib import contextmanager
 
-def encode_faces(dataset_path="dataset", output_file="encodings.json"):
+try:
+    import fcntl
+except ImportError:
+    # Windows: no inter-process lock, merges are only serialized within a process
+    fcntl = None
+
+@contextmanager
+def encodings_lock(encodings_file):
+    """Exclusive lock on an encodings file across processes (e.g. server workers merging enrollments)"""
+    with open(encodings_file + ".lock", "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def embedding_distances(a, b):
+    """(n, m) Euclidean distances between the rows of two embedding matrices"""
+    sq = np.sum(a * a, axis=1)[:, None] + np.sum(b * b, axis=1)[None, :] - 2.0 * a @ b.T
+    return np.sqrt(np.maximum(sq, 0.0))
+
+def remove_near_duplicates(embeddings, threshold=1.5):
+    """
+    Drop embeddings within threshold of an earlier kept embedding (e.g. burst
+    photos), so they don't pull a cluster towards one pose. The default is
+    well under the match threshold of 10, as the backend's 0.1 is under 0.6.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    if len(embeddings) < 2:
+        return embeddings
+
+    distances = embedding_distances(embeddings, embeddings)
+    keep = np.ones(len(embeddings), dtype=bool)
+    for i in range(1, len(embeddings)):
+        if (keep[:i] & (distances[i, :i] < threshold)).any():
+            keep[i] = False
+    return embeddings[keep]
+
+def cluster_embeddings(embeddings, k=3, max_iterations=20, dedupe_threshold=1.5):
+    """
+    Cluster a person's embeddings into at most k representative embeddings.
+    Near-duplicates are dropped first, then k-means runs seeded with
+    farthest-point initialisation, so repeated runs give the same representatives.
+    Same behaviour as remove_near_duplicates + cluster_templates in
+    backend/face_recognition/compact_gallery.py (compact_gallery per person);
+    the two servers are deployed separately and share no importable package,
+    so keep both copies in step (both have tests).
+    """
+    embeddings = remove_near_duplicates(embeddings, dedupe_threshold)
+    if len(embeddings) <= k:
+        return embeddings
+
+    mean = embeddings.mean(axis=0, keepdims=True)
+    seeds = [int(np.argmin(embedding_distances(embeddings, mean)[:, 0]))]
+    nearest = embedding_distances(embeddings, embeddings[seeds])[:, 0]
+    while len(seeds) < k:
+        seeds.append(int(np.argmax(nearest)))
+        nearest = np.minimum(nearest, embedding_distances(embeddings, embeddings[seeds[-1:]])[:, 0])
+    centroids = embeddings[seeds].copy()
+
+    assignment = None
+    for _ in range(max_iterations):
+        new_assignment = np.argmin(embedding_distances(embeddings, centroids), axis=1)
+        if assignment is not None and np.array_equal(assignment, new_assignment):
+            break
+        assignment = new_assignment
+        for c in range(k):
+            members = embeddings[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+
+    return centroids
+
+def encode_faces(dataset_path="dataset", output_file="encodings.json", representatives=1):
     """
     Process images in the dataset directory and create face encodings
     Each person should have their own subdirectory with multiple face images
+
+    With representatives=1 each person is stored as a single average embedding.
+    With representatives>1 each person is stored as a list of up to that many
+    cluster centroids, which keeps distinct poses/lighting apart.
     """
+    # Imported here so importing utils doesn't load TensorFlow
+    from deepface import DeepFace
+    
     encodings = {}
 
     for person in os.listdir(dataset_path):
@@ -26,8 +108,12 @@ def encode_faces(dataset_path="dataset", output_file="encodings.json"):
                 print(f"Failed to process {img_path}: {e}")
 
         if embeddings:
-            # Average embedding for that person
-            encodings[person] = np.mean(embeddings, axis=0).tolist()
+            if representatives > 1:
+                # A few cluster centroids for that person
+                encodings[person] = cluster_embeddings(embeddings, representatives).tolist()
+            else:
+                # Average embedding for that person
+                encodings[person] = np.mean(embeddings, axis=0).tolist()
             print(f"Successfully encoded {person} with {len(embeddings)} images")
         else:
             print(f"No successful encodings for {person}")